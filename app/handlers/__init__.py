@@ -1,9 +1,14 @@
 from aiogram import F, Router
 from aiogram.enums import ChatType
 
-from app.handlers.start import router as start_router, set_commands
+from app.handlers.start import router as start_router, COMMANDS
 from app.handlers.request import router as request_router
 from app.handlers.admin import router as admin_router
+from app.handlers.search import router as search_router
+from app.handlers.export import router as export_router
+from app.handlers.stats import router as stats_router
+from app.handlers.broadcast import router as broadcast_router
+from app.handlers.assignment import router as assignment_router
 from app.handlers.feedback import router as feedback_router
 from app.handlers.common import router as common_router
 
@@ -21,7 +26,12 @@ user_router.include_router(feedback_router)
 user_router.include_router(common_router)  # Must be last - catches all other messages
 
 # Include routers in order
+router.include_router(search_router)  # Admin commands, before admin replies catch the message
+router.include_router(export_router)
+router.include_router(stats_router)
+router.include_router(broadcast_router)
+router.include_router(assignment_router)
 router.include_router(admin_router)  # Admin works in groups
 router.include_router(user_router)   # Users only in private
 
-__all__ = ["router", "set_commands"]
+__all__ = ["router", "COMMANDS"]
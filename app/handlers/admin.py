@@ -1,188 +1,170 @@
-from typing import List, Optional
+import html
+from typing import Any, Dict, List, Optional, Union
 
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, InputMediaPhoto, InputMediaVideo
-
-from app.keyboards import get_user_response_keyboard
+from aiogram.types import Message, CallbackQuery
+
+from app.keyboards import ADMIN_CLOSE, ADMIN_REPLY, get_user_response_keyboard
+from app.settings import SUPPORT_CHAT_ID
+from app.services import (
+    Analytics,
+    Assigner,
+    AutoCloser,
+    Outbox,
+    Priority,
+    SearchIndex,
+    Sender,
+    Ticket,
+    TicketStore,
+    copy_plain,
+    entry_body,
+    message_key,
+)
+from app.handlers.common import button_ticket
 from app.handlers.states import RequestStates
 
 
 router = Router()
 
+ALBUM_NOTE = "Ответ от поддержки (медиа выше)"
+OWNED = "Заявку ведёт {}."
+
 
+@router.callback_query(F.data.startswith(ADMIN_REPLY))
 @router.callback_query(F.data.startswith("reply_"))
-async def handle_reply(callback_query: CallbackQuery, state: FSMContext):
+async def handle_reply(
+    callback_query: CallbackQuery,
+    state: FSMContext,
+    sender: Sender,
+    tickets: TicketStore,
+    assigner: Assigner
+):
     """Handle admin reply button press."""
-    user_id = int(callback_query.data.split("_")[1])
+    ticket = await button_ticket(callback_query.data, tickets)
+    if ticket is None or not ticket.is_open:
+        await callback_query.answer("Заявка уже закрыта.", show_alert=True)
+        return
+    user = callback_query.from_user
+    owner = await assigner.claim(ticket, user.id, user.full_name)
+    if owner is not None:
+        await callback_query.answer(OWNED.format(owner.full_name), show_alert=True)
+        return
     await callback_query.answer()
 
-    await callback_query.message.answer("Напишите ваш ответ пользователю.")
-    await state.update_data(user_id=user_id)
+    sender.submit(callback_query.message.answer("Напишите ваш ответ пользователю."), Priority.ADMIN)
+    await state.update_data(user_id=ticket.user_id, ticket_id=ticket.id, full_name=ticket.full_name)
     await state.set_state(RequestStates.waiting_for_user_response)
 
 
-@router.message(RequestStates.waiting_for_user_response, F.photo, F.media_group_id)
-async def process_admin_response_media_group(message: Message, state: FSMContext, album: Optional[List[Message]] = None):
-    """Process admin response with multiple photos (media group) and send to user."""
-    if not album:
-        album = [message]
-
-    data = await state.get_data()
-    user_id = data.get("user_id")
-
-    caption_text = ""
-    for msg in album:
-        if msg.caption:
-            caption_text = msg.caption
-            break
-
-    media = []
-    for i, msg in enumerate(album):
-        if msg.photo:
-            if i == 0:
-                media.append(InputMediaPhoto(
-                    media=msg.photo[-1].file_id,
-                    caption=caption_text if caption_text else None
-                ))
-            else:
-                media.append(InputMediaPhoto(media=msg.photo[-1].file_id))
-        elif msg.video:
-            if i == 0:
-                media.append(InputMediaVideo(
-                    media=msg.video.file_id,
-                    caption=caption_text if caption_text else None
-                ))
-            else:
-                media.append(InputMediaVideo(media=msg.video.file_id))
-
-    await message.bot.send_media_group(
-        chat_id=user_id,
-        media=media
-    )
-    await message.bot.send_message(
-        chat_id=user_id,
-        text="Ответ от поддержки (медиа выше)",
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
-
-    await state.clear()
-
-
-@router.message(RequestStates.waiting_for_user_response, F.photo)
-async def process_admin_response_photo(message: Message, state: FSMContext):
-    """Process admin response with photo and send to user."""
-    data = await state.get_data()
-    user_id = data.get("user_id")
-
-    await message.bot.send_photo(
-        chat_id=user_id,
-        photo=message.photo[-1].file_id,
-        caption=message.caption,
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
-
-    await state.clear()
-
-
-@router.message(RequestStates.waiting_for_user_response, F.voice)
-async def process_admin_response_voice(message: Message, state: FSMContext):
-    """Process admin response with voice message and send to user."""
-    data = await state.get_data()
-    user_id = data.get("user_id")
-
-    await message.bot.send_voice(
-        chat_id=user_id,
-        voice=message.voice.file_id,
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
-
-    await state.clear()
-
-
-@router.message(RequestStates.waiting_for_user_response, F.video)
-async def process_admin_response_video(message: Message, state: FSMContext):
-    """Process admin response with video and send to user."""
-    data = await state.get_data()
-    user_id = data.get("user_id")
-
-    await message.bot.send_video(
-        chat_id=user_id,
-        video=message.video.file_id,
-        caption=message.caption,
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
-
-    await state.clear()
-
-
-@router.message(RequestStates.waiting_for_user_response, F.video_note)
-async def process_admin_response_video_note(message: Message, state: FSMContext):
-    """Process admin response with video note and send to user."""
-    data = await state.get_data()
-    user_id = data.get("user_id")
-
-    await message.bot.send_video_note(
-        chat_id=user_id,
-        video_note=message.video_note.file_id
-    )
-    await message.bot.send_message(
-        chat_id=user_id,
-        text="Ответ от поддержки (кружочек выше)",
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
-
-    await state.clear()
-
-
-@router.message(RequestStates.waiting_for_user_response, F.document)
-async def process_admin_response_document(message: Message, state: FSMContext):
-    """Process admin response with document and send to user."""
-    data = await state.get_data()
-    user_id = data.get("user_id")
-
-    await message.bot.send_document(
-        chat_id=user_id,
-        document=message.document.file_id,
-        caption=message.caption,
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
-
-    await state.clear()
+async def replied_ticket(message: Message, tickets: TicketStore) -> Union[bool, Dict[str, Any]]:
+    """Filter for replies to a message of an open ticket."""
+    ticket_id = await tickets.ticket_for_message(message.chat.id, message.reply_to_message.message_id)
+    if ticket_id is None:
+        return False
+    ticket = await tickets.get(ticket_id)
+    if ticket is None or not ticket.is_open:
+        return False
+    return {"ticket": ticket}
+
+
+async def record_reply(ticket_id: int, tickets: TicketStore, analytics: Analytics, autoclose: AutoCloser) -> None:
+    """Record an admin reply: ticket activity and, for the first one, first response time."""
+    await tickets.touch(ticket_id)
+    autoclose.activity(ticket_id)
+    created_at = await tickets.mark_replied(ticket_id)
+    if created_at is not None:
+        analytics.first_reply(created_at)
+
+
+@router.message(F.chat.id == int(SUPPORT_CHAT_ID), F.reply_to_message, replied_ticket)
+async def process_admin_reply_to_ticket(
+    message: Message,
+    ticket: Ticket,
+    sender: Sender,
+    tickets: TicketStore,
+    outbox: Outbox,
+    search: SearchIndex,
+    analytics: Analytics,
+    autoclose: AutoCloser,
+    assigner: Assigner,
+    album: Optional[List[Message]] = None
+):
+    """Send admin's reply to a ticket message straight to the user."""
+    owner = await assigner.claim(ticket, message.from_user.id, message.from_user.full_name)
+    if owner is not None:
+        sender.submit(message.reply(OWNED.format(html.escape(owner.full_name))), Priority.ADMIN)
+        return
+
+    await outbox.submit(message_key(album or [message]), copy_plain(
+        album or [message],
+        ticket.user_id,
+        get_user_response_keyboard(ticket.id),
+        album_note=ALBUM_NOTE
+    ))
+
+    # Replies to the admin's message or the confirmation also reach this ticket
+    await tickets.add_messages(ticket.id, message.chat.id, [msg.message_id for msg in album or [message]])
+    tickets.track(ticket.id, message.chat.id, sender.submit(
+        message.reply("Ответ успешно отправлен пользователю."),
+        Priority.ADMIN
+    ))
+    await search.add("reply", ticket.user_id, ticket.full_name, entry_body(album or [message]), ticket.id)
+    await record_reply(ticket.id, tickets, analytics, autoclose)
 
 
 @router.message(RequestStates.waiting_for_user_response)
-async def process_admin_response(message: Message, state: FSMContext):
-    """Process admin response and send to user."""
+async def process_admin_response(
+    message: Message,
+    state: FSMContext,
+    sender: Sender,
+    outbox: Outbox,
+    search: SearchIndex,
+    tickets: TicketStore,
+    analytics: Analytics,
+    autoclose: AutoCloser,
+    album: Optional[List[Message]] = None
+):
+    """Process admin response of any content type and send to user."""
     data = await state.get_data()
     user_id = data.get("user_id")
-
-    await message.bot.send_message(
-        chat_id=user_id,
-        text=message.text,
-        reply_markup=get_user_response_keyboard(user_id)
-    )
-    await message.answer("Ответ успешно отправлен пользователю.")
+    ticket_id = data.get("ticket_id")
+
+    await outbox.submit(message_key(album or [message]), copy_plain(
+        album or [message],
+        user_id,
+        get_user_response_keyboard(ticket_id),
+        album_note=ALBUM_NOTE
+    ))
+    sender.submit(message.answer("Ответ успешно отправлен пользователю."), Priority.ADMIN)
+    await search.add("reply", user_id, data.get("full_name", ""), entry_body(album or [message]), ticket_id)
+    await record_reply(ticket_id, tickets, analytics, autoclose)
 
     await state.clear()
 
 
+@router.callback_query(F.data.startswith(ADMIN_CLOSE))
 @router.callback_query(F.data.startswith("close_"))
-async def handle_close_request(callback_query: CallbackQuery, state: FSMContext):
+async def handle_close_request(
+    callback_query: CallbackQuery,
+    state: FSMContext,
+    tickets: TicketStore,
+    autoclose: AutoCloser,
+    assigner: Assigner
+):
     """Handle admin closing request."""
-    user_id = int(callback_query.data.split("_")[1])
-    await callback_query.answer()
-
+    ticket = await button_ticket(callback_query.data, tickets)
+    if ticket is not None and ticket.is_open:
+        user = callback_query.from_user
+        owner = await assigner.claim(ticket, user.id, user.full_name)
+        if owner is not None:
+            await callback_query.answer(OWNED.format(owner.full_name), show_alert=True)
+            return
     await callback_query.message.edit_reply_markup(reply_markup=None)
-    await callback_query.bot.send_message(
-        chat_id=user_id,
-        text="Ваша заявка была закрыта."
-    )
+
+    if ticket is None or not await autoclose.close(ticket, "admin"):
+        await callback_query.answer("Заявка уже закрыта.")
+        return
+    await callback_query.answer()
 
     await state.clear()
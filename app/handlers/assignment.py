@@ -0,0 +1,26 @@
+from aiogram import F, Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from app.settings import SUPPORT_CHAT_ID
+from app.services import Assigner, Priority, Sender
+
+
+router = Router()
+router.message.filter(F.chat.id == int(SUPPORT_CHAT_ID))
+
+
+@router.message(Command("online"))
+async def handle_online(message: Message, sender: Sender, assigner: Assigner):
+    """Start the admin's shift: new and waiting tickets get assigned to them."""
+    load = await assigner.set_online(message.from_user.id, message.from_user.full_name, True)
+    sender.submit(message.reply(
+        f"🟢 Вы на смене. Ваших заявок: {load}, ждут в очереди: {len(assigner.waiting)}"
+    ), Priority.ADMIN)
+
+
+@router.message(Command("offline"))
+async def handle_offline(message: Message, sender: Sender, assigner: Assigner):
+    """End the admin's shift: their open tickets go back to the queue."""
+    await assigner.set_online(message.from_user.id, message.from_user.full_name, False)
+    sender.submit(message.reply("⚪️ Смена закончена, ваши заявки переданы в очередь."), Priority.ADMIN)
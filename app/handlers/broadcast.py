@@ -0,0 +1,43 @@
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.settings import SUPPORT_CHAT_ID
+from app.services import Broadcaster, Priority, Sender
+
+
+router = Router()
+router.message.filter(F.chat.id == int(SUPPORT_CHAT_ID))
+
+USAGE = (
+    "Использование:\n"
+    "/broadcast текст — написать всем пользователям с открытыми заявками\n"
+    "/broadcast_stop — остановить рассылку"
+)
+
+
+@router.message(Command("broadcast_stop"))
+async def handle_broadcast_stop(message: Message, sender: Sender, broadcaster: Broadcaster):
+    """Stop the broadcast, whichever worker is sending it."""
+    if not broadcaster.running and broadcaster.load() is None:
+        sender.submit(message.reply("Рассылка не идёт."), Priority.ADMIN)
+        return
+    await broadcaster.stop(discard=True)
+    sender.submit(message.reply("⏹ Рассылка остановлена."), Priority.ADMIN)
+
+
+@router.message(Command("broadcast"))
+async def handle_broadcast(message: Message, command: CommandObject, sender: Sender, broadcaster: Broadcaster):
+    """Start a broadcast to users with open tickets; progress is posted in the chat."""
+    args = (command.args or "").strip()
+    if not args:
+        sender.submit(message.reply(USAGE), Priority.ADMIN)
+        return
+    if broadcaster.running or broadcaster.load() is not None:
+        sender.submit(message.reply("Рассылка уже идёт. Остановить: /broadcast_stop"), Priority.ADMIN)
+        return
+
+    # The formatted text without the command
+    text = message.html_text.split(maxsplit=1)[1]
+    progress = await broadcaster.start(text)
+    sender.submit(message.reply(f"📣 Рассылка запущена, получателей: {progress.total}"), Priority.ADMIN)
@@ -1,18 +1,31 @@
+from typing import Optional
+
 from aiogram import Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
+from app.keyboards import TICKET_PREFIX
+from app.services import Sender, Ticket, TicketStore
+
 
 router = Router()
 
 
-@router.message()
-async def block_non_request_messages(message: Message, state: FSMContext):
+async def button_ticket(data: str, tickets: TicketStore) -> Optional[Ticket]:
+    """The ticket of a ticket button; legacy buttons name the user, whose open ticket it is."""
+    ticket_id = int(data.rsplit("_", 1)[1])
+    if data.startswith(TICKET_PREFIX):
+        return await tickets.get(ticket_id)
+    return await tickets.open_for_user(ticket_id)
+
+
+@router.message(flags={"throttle": "low"})
+async def block_non_request_messages(message: Message, state: FSMContext, sender: Sender):
     """Block any messages when no active request."""
     current_state = await state.get_state()
     if not current_state:
-        await message.answer(
+        sender.submit(message.answer(
             "У вас нет активных заявок. Пожалуйста, создайте заявку через /start."
-        )
+        ))
     else:
-        await message.answer("Заявка уже обрабатывается. Дождитесь завершения.")
+        sender.submit(message.answer("Заявка уже обрабатывается. Дождитесь завершения."))
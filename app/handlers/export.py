@@ -0,0 +1,44 @@
+import asyncio
+import shutil
+import tempfile
+from pathlib import Path
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+
+from app.settings import SUPPORT_CHAT_ID
+from app.services import Exporter, Priority, Sender
+from app.services.export import FORMATS, QUERIES
+
+
+router = Router()
+router.message.filter(F.chat.id == int(SUPPORT_CHAT_ID))
+
+USAGE = "Использование: /export tickets|feedback [jsonl|csv]"
+
+
+@router.message(Command("export"))
+async def handle_export(message: Message, command: CommandObject, sender: Sender, exporter: Exporter):
+    """Export tickets or feedback as documents, split into parts if large."""
+    args = (command.args or "").split()
+    kind = args[0] if args else ""
+    fmt = args[1] if len(args) > 1 else "jsonl"
+    if kind not in QUERIES or fmt not in FORMATS:
+        sender.submit(message.reply(USAGE), Priority.ADMIN)
+        return
+
+    directory = Path(tempfile.mkdtemp(prefix="export-"))
+    try:
+        parts = await exporter.export(kind, fmt, directory)
+        sends = [
+            sender.submit(message.reply_document(
+                FSInputFile(part),
+                caption=f"📦 Часть {number} из {len(parts)}" if len(parts) > 1 else None,
+            ), Priority.ADMIN)
+            for number, part in enumerate(parts, 1)
+        ]
+        # The files must stay until they are uploaded
+        await asyncio.gather(*sends, return_exceptions=True)
+    finally:
+        await asyncio.to_thread(shutil.rmtree, directory, True)
@@ -1,226 +1,88 @@
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, InputMediaPhoto, InputMediaVideo
+from aiogram.types import Message
 
 from app.settings import FEEDBACK_CHAT_ID
+from app.texts import FEEDBACK_HEADER, FEEDBACK_WITH_BODY
+from app.services import FeedbackDigest, Outbox, Priority, SearchIndex, Sender, copy_with_header, entry_body, message_key
 from app.handlers.states import FeedbackStates
 
 
 router = Router()
 
 
-@router.callback_query(F.data == "send_feedback")
-async def handle_send_feedback(callback_query: types.CallbackQuery, state: FSMContext):
-    """Handle send feedback button press."""
-    await callback_query.answer()
-    await state.set_state(FeedbackStates.waiting_for_feedback)
-    await callback_query.message.answer(
-        "Пожалуйста, напишите ваш отзыв. Мы ценим ваше мнение!"
-    )
-
+# What the user sent, as named in the feedback header
+CONTENT_NAMES = {
+    "voice": "голосовое",
+    "video": "видео",
+    "video_note": "кружочек",
+    "document": "документ",
+    "audio": "аудио",
+    "animation": "гифка",
+    "sticker": "стикер",
+}
 
-@router.message(FeedbackStates.waiting_for_feedback, F.photo, F.media_group_id)
-async def process_feedback_media_group(message: Message, state: FSMContext, album: Optional[List[Message]] = None):
-    """Process user feedback with multiple photos (media group) and send to admins."""
-    if not album:
-        album = [message]
 
+def feedback_header(message: Message, album: List[Message]) -> Callable[[str], str]:
+    """Return a function composing the feedback header around the feedback body."""
     user_id = message.from_user.id
     full_name = message.from_user.full_name
     username = message.from_user.username or "не указан"
 
-    caption_text = ""
-    for msg in album:
-        if msg.caption:
-            caption_text = msg.caption
-            break
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    media = []
-    for i, msg in enumerate(album):
-        if msg.photo:
-            if i == 0:
-                media.append(InputMediaPhoto(
-                    media=msg.photo[-1].file_id,
-                    caption=(
-                        f"💬 Новый отзыв ({len(album)} фото)\n\n"
-                        f"От: {full_name}\n"
-                        f"Username: @{username}\n"
-                        f"ID: {user_id}\n\n"
-                        f"Отзыв:\n{caption_text}"
-                    )
-                ))
-            else:
-                media.append(InputMediaPhoto(media=msg.photo[-1].file_id))
-        elif msg.video:
-            if i == 0:
-                media.append(InputMediaVideo(
-                    media=msg.video.file_id,
-                    caption=(
-                        f"💬 Новый отзыв (медиа)\n\n"
-                        f"От: {full_name}\n"
-                        f"Username: @{username}\n"
-                        f"ID: {user_id}\n\n"
-                        f"Отзыв:\n{caption_text}"
-                    )
-                ))
-            else:
-                media.append(InputMediaVideo(media=msg.video.file_id))
-
-    await message.bot.send_media_group(
-        chat_id=FEEDBACK_CHAT_ID,
-        media=media
-    )
+    if len(album) > 1:
+        title = f"💬 Новый отзыв ({len(album)} фото)" if all(msg.photo for msg in album) else "💬 Новый отзыв (медиа)"
+    elif message.content_type in CONTENT_NAMES:
+        title = f"💬 Новый отзыв ({CONTENT_NAMES[message.content_type]})"
+    else:
+        title = "💬 Новый отзыв"
 
-    await state.clear()
+    header = FEEDBACK_HEADER.render(title=title, full_name=full_name, username=username, user_id=user_id)
 
+    def compose(body: str) -> str:
+        if not body:
+            return header
+        return FEEDBACK_WITH_BODY.render(header=header, body=body)
 
-@router.message(FeedbackStates.waiting_for_feedback, F.photo)
-async def process_feedback_photo(message: Message, state: FSMContext):
-    """Process user feedback with photo and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username or "не указан"
-    feedback_text = message.caption or ""
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    await message.bot.send_photo(
-        chat_id=FEEDBACK_CHAT_ID,
-        photo=message.photo[-1].file_id,
-        caption=(
-            f"💬 Новый отзыв\n\n"
-            f"От: {full_name}\n"
-            f"Username: @{username}\n"
-            f"ID: {user_id}\n\n"
-            f"Отзыв:\n{feedback_text}"
-        )
-    )
-
-    await state.clear()
-
+    return compose
 
-@router.message(FeedbackStates.waiting_for_feedback, F.voice)
-async def process_feedback_voice(message: Message, state: FSMContext):
-    """Process user feedback with voice message and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username or "не указан"
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    await message.bot.send_voice(
-        chat_id=FEEDBACK_CHAT_ID,
-        voice=message.voice.file_id,
-        caption=(
-            f"💬 Новый отзыв (голосовое)\n\n"
-            f"От: {full_name}\n"
-            f"Username: @{username}\n"
-            f"ID: {user_id}"
-        )
-    )
-
-    await state.clear()
-
-
-@router.message(FeedbackStates.waiting_for_feedback, F.video)
-async def process_feedback_video(message: Message, state: FSMContext):
-    """Process user feedback with video and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username or "не указан"
-    feedback_text = message.caption or ""
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    await message.bot.send_video(
-        chat_id=FEEDBACK_CHAT_ID,
-        video=message.video.file_id,
-        caption=(
-            f"💬 Новый отзыв (видео)\n\n"
-            f"От: {full_name}\n"
-            f"Username: @{username}\n"
-            f"ID: {user_id}\n\n"
-            f"Отзыв:\n{feedback_text}"
-        )
-    )
 
-    await state.clear()
-
-
-@router.message(FeedbackStates.waiting_for_feedback, F.video_note)
-async def process_feedback_video_note(message: Message, state: FSMContext):
-    """Process user feedback with video note and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username or "не указан"
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    await message.bot.send_video_note(
-        chat_id=FEEDBACK_CHAT_ID,
-        video_note=message.video_note.file_id
-    )
-    await message.bot.send_message(
-        chat_id=FEEDBACK_CHAT_ID,
-        text=(
-            f"💬 Новый отзыв (кружочек)\n\n"
-            f"От: {full_name}\n"
-            f"Username: @{username}\n"
-            f"ID: {user_id}"
-        )
-    )
-
-    await state.clear()
-
-
-@router.message(FeedbackStates.waiting_for_feedback, F.document)
-async def process_feedback_document(message: Message, state: FSMContext):
-    """Process user feedback with document and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username or "не указан"
-    feedback_text = message.caption or ""
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    await message.bot.send_document(
-        chat_id=FEEDBACK_CHAT_ID,
-        document=message.document.file_id,
-        caption=(
-            f"💬 Новый отзыв (документ)\n\n"
-            f"От: {full_name}\n"
-            f"Username: @{username}\n"
-            f"ID: {user_id}\n\n"
-            f"Отзыв:\n{feedback_text}"
-        )
-    )
-
-    await state.clear()
+@router.callback_query(F.data == "send_feedback")
+async def handle_send_feedback(callback_query: types.CallbackQuery, state: FSMContext, sender: Sender):
+    """Handle send feedback button press."""
+    await callback_query.answer()
+    await state.set_state(FeedbackStates.waiting_for_feedback)
+    sender.submit(callback_query.message.answer(
+        "Пожалуйста, напишите ваш отзыв. Мы ценим ваше мнение!"
+    ))
 
 
 @router.message(FeedbackStates.waiting_for_feedback)
-async def process_feedback(message: Message, state: FSMContext):
-    """Process user feedback and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username or "не указан"
-    feedback_text = message.text or ""
-
-    await message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим.")
-
-    await message.bot.send_message(
-        chat_id=FEEDBACK_CHAT_ID,
-        text=(
-            f"💬 Новый отзыв\n\n"
-            f"От: {full_name}\n"
-            f"Username: @{username}\n"
-            f"ID: {user_id}\n\n"
-            f"Отзыв:\n{feedback_text}"
-        )
-    )
+async def process_feedback(
+    message: Message,
+    state: FSMContext,
+    sender: Sender,
+    outbox: Outbox,
+    search: SearchIndex,
+    album: Optional[List[Message]] = None,
+    digest: Optional[FeedbackDigest] = None
+):
+    """Process user feedback of any content type and send to admins.
+
+    In digest mode, feedback the digest can pack waits there to be posted
+    together with other feedback.
+    """
+    album = album or [message]
+
+    compose = feedback_header(message, album)
+    entries = digest.collect(album, compose) if digest is not None else None
+    if entries:
+        await digest.add(entries)
+    else:
+        methods = copy_with_header(album, FEEDBACK_CHAT_ID, compose)
+        await outbox.submit(message_key(album), methods, Priority.ADMIN)
+    sender.submit(message.answer("Спасибо за ваш отзыв! Мы обязательно его рассмотрим."))
+    await search.add("feedback", message.from_user.id, message.from_user.full_name, entry_body(album))
 
     await state.clear()
@@ -1,214 +1,154 @@
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, InputMediaPhoto, InputMediaVideo
+from aiogram.types import Message
 
-from app.keyboards import get_admin_keyboard
+from app.keyboards import USER_CLOSE, USER_REPLY, get_admin_keyboard
 from app.settings import SUPPORT_CHAT_ID
+from app.texts import REQUEST_ASSIGNED, REQUEST_HEADER, REQUEST_WITH_BODY
+from app.services import (
+    Admin,
+    Analytics,
+    Assigner,
+    AutoCloser,
+    Outbox,
+    Priority,
+    SearchIndex,
+    Sender,
+    Ticket,
+    TicketStore,
+    copy_with_header,
+    entry_body,
+    message_key,
+)
+from app.handlers.common import button_ticket
 from app.handlers.states import RequestStates
 
 
 router = Router()
 
 
-@router.callback_query(F.data == "apply_request")
-async def handle_apply_request(callback_query: types.CallbackQuery, state: FSMContext):
-    """Handle apply request button press."""
-    await callback_query.answer()
-    await state.set_state(RequestStates.waiting_for_request)
-    await callback_query.message.answer(
-        "Пожалуйста, опишите вашу проблему как можно детальнее, можете приложить фото. Мы поможем вам!"
-    )
-
-
-@router.message(RequestStates.waiting_for_request, F.photo, F.media_group_id)
-async def process_request_media_group(message: Message, state: FSMContext, album: Optional[List[Message]] = None):
-    """Process user request with multiple photos (media group) and send to admins."""
-    if not album:
-        album = [message]
-
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-
-    caption_text = ""
-    for msg in album:
-        if msg.caption:
-            caption_text = msg.caption
-            break
-
-    await message.answer("Ваша заявка отправлена в поддержку!")
-
-    media = []
-    for i, msg in enumerate(album):
-        if msg.photo:
-            if i == 0:
-                media.append(InputMediaPhoto(
-                    media=msg.photo[-1].file_id,
-                    caption=f"Опять работать... Еще и {len(album)} фоток прислал...\n{full_name} (ID: <code>{user_id}</code>):\n\n<blockquote expandable>{caption_text}</blockquote>"
-                ))
-            else:
-                media.append(InputMediaPhoto(media=msg.photo[-1].file_id))
-        elif msg.video:
-            if i == 0:
-                media.append(InputMediaVideo(
-                    media=msg.video.file_id,
-                    caption=f"Опять работать... Еще и медиа прислал...\n{full_name} (ID: <code>{user_id}</code>):\n\n<blockquote expandable>{caption_text}</blockquote>"
-                ))
-            else:
-                media.append(InputMediaVideo(media=msg.video.file_id))
-
-    await message.bot.send_media_group(
-        chat_id=SUPPORT_CHAT_ID,
-        media=media
-    )
-    await message.bot.send_message(
-        chat_id=SUPPORT_CHAT_ID,
-        text=f"👆 Заявка от {full_name} (ID: <code>{user_id}</code>)",
-        reply_markup=get_admin_keyboard(user_id)
-    )
-
-    await state.set_state(RequestStates.waiting_for_response)
-
-
-@router.message(RequestStates.waiting_for_request, F.photo)
-async def process_request_photo(message: Message, state: FSMContext):
-    """Process user request with photo and send to admins."""
+async def get_or_create_ticket(
+    message: Message,
+    tickets: TicketStore,
+    analytics: Analytics,
+    assigner: Assigner
+) -> Ticket:
+    """Return the user's open ticket, or open a new one and assign it."""
+    user = message.from_user
+    ticket = await tickets.open_for_user(user.id)
+    if ticket is None:
+        ticket = await tickets.create(user.id, user.full_name, user.username)
+        analytics.ticket_created(ticket.created_at)
+        await assigner.assign_new(ticket)
+        return ticket
+    await tickets.touch(ticket.id)
+    return ticket
+
+
+# What the user sent, as named in the support chat header
+CONTENT_NAMES = {
+    "photo": "фотку",
+    "video": "видео",
+    "voice": "голосовое",
+    "video_note": "кружочек",
+    "document": "документ",
+    "audio": "аудио",
+    "animation": "гифку",
+    "sticker": "стикер",
+}
+
+
+def request_header(message: Message, album: List[Message], owner: Optional[Admin] = None) -> Callable[[str], str]:
+    """Return a function composing the support chat header around the request body.
+
+    The admin owning the ticket is mentioned, so they get notified.
+    """
     user_id = message.from_user.id
     full_name = message.from_user.full_name
-    caption = message.caption or ""
 
-    await message.answer("Ваша заявка отправлена в поддержку!")
+    if len(album) > 1:
+        what = f"{len(album)} фоток" if all(msg.photo for msg in album) else "медиа"
+        intro = f"Опять работать... Еще и {what} прислал..."
+    elif message.text is not None:
+        intro = "Опять работать... "
+    else:
+        intro = f"Опять работать... Еще и {CONTENT_NAMES.get(message.content_type, 'что-то')} прислал..."
 
-    await message.bot.send_photo(
-        chat_id=SUPPORT_CHAT_ID,
-        photo=message.photo[-1].file_id,
-        caption=f"Опять работать... Еще и фотку прислал...\n{full_name} (ID: <code>{user_id}</code>):\n\n<blockquote expandable>{caption}</blockquote>",
-        reply_markup=get_admin_keyboard(user_id)
-    )
+    header = REQUEST_HEADER.render(intro=intro, full_name=full_name, user_id=user_id)
+    if owner is not None:
+        header = REQUEST_ASSIGNED.render(header=header, mention=owner.mention)
 
-    await state.set_state(RequestStates.waiting_for_response)
-
-
-@router.message(RequestStates.waiting_for_request, F.voice)
-async def process_request_voice(message: Message, state: FSMContext):
-    """Process user request with voice message and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-
-    await message.answer("Ваша заявка отправлена в поддержку!")
+    def compose(body: str) -> str:
+        if not body:
+            return header
+        return REQUEST_WITH_BODY.render(header=header, body=body)
 
-    await message.bot.send_voice(
-        chat_id=SUPPORT_CHAT_ID,
-        voice=message.voice.file_id,
-        caption=f"Опять работать... Еще и голосовое прислал...\n{full_name} (ID: <code>{user_id}</code>)",
-        reply_markup=get_admin_keyboard(user_id)
-    )
-
-    await state.set_state(RequestStates.waiting_for_response)
+    return compose
 
 
-@router.message(RequestStates.waiting_for_request, F.video)
-async def process_request_video(message: Message, state: FSMContext):
-    """Process user request with video and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    caption = message.caption or ""
-
-    await message.answer("Ваша заявка отправлена в поддержку!")
-
-    await message.bot.send_video(
-        chat_id=SUPPORT_CHAT_ID,
-        video=message.video.file_id,
-        caption=f"Опять работать... Еще и видео прислал...\n{full_name} (ID: <code>{user_id}</code>):\n\n<blockquote expandable>{caption}</blockquote>",
-        reply_markup=get_admin_keyboard(user_id)
-    )
-
-    await state.set_state(RequestStates.waiting_for_response)
-
-
-@router.message(RequestStates.waiting_for_request, F.video_note)
-async def process_request_video_note(message: Message, state: FSMContext):
-    """Process user request with video note (circle video) and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-
-    await message.answer("Ваша заявка отправлена в поддержку!")
-
-    await message.bot.send_video_note(
-        chat_id=SUPPORT_CHAT_ID,
-        video_note=message.video_note.file_id
-    )
-    await message.bot.send_message(
-        chat_id=SUPPORT_CHAT_ID,
-        text=f"Опять работать... Еще и кружочек прислал...\n{full_name} (ID: <code>{user_id}</code>)",
-        reply_markup=get_admin_keyboard(user_id)
-    )
-
-    await state.set_state(RequestStates.waiting_for_response)
-
-
-@router.message(RequestStates.waiting_for_request, F.document)
-async def process_request_document(message: Message, state: FSMContext):
-    """Process user request with document and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    caption = message.caption or ""
-
-    await message.answer("Ваша заявка отправлена в поддержку!")
-
-    await message.bot.send_document(
-        chat_id=SUPPORT_CHAT_ID,
-        document=message.document.file_id,
-        caption=f"Опять работать... Еще и документ прислал...\n{full_name} (ID: <code>{user_id}</code>):\n\n<blockquote expandable>{caption}</blockquote>",
-        reply_markup=get_admin_keyboard(user_id)
-    )
-
-    await state.set_state(RequestStates.waiting_for_response)
-
-
-@router.message(RequestStates.waiting_for_request)
-async def process_request(message: Message, state: FSMContext):
-    """Process user request and send to admins."""
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    request_text = message.text or ""
-
-    await message.answer("Ваша заявка отправлена в поддержку!")
-
-    await message.bot.send_message(
-        chat_id=SUPPORT_CHAT_ID,
-        text=f"Опять работать... \n{full_name} (ID: <code>{user_id}</code>):\n\n<blockquote expandable>{request_text}</blockquote>",
-        reply_markup=get_admin_keyboard(user_id)
-    )
+@router.callback_query(F.data == "apply_request")
+async def handle_apply_request(callback_query: types.CallbackQuery, state: FSMContext, sender: Sender):
+    """Handle apply request button press."""
+    await callback_query.answer()
+    await state.set_state(RequestStates.waiting_for_request)
+    sender.submit(callback_query.message.answer(
+        "Пожалуйста, опишите вашу проблему как можно детальнее, можете приложить фото. Мы поможем вам!"
+    ))
+
+
+@router.message(RequestStates.waiting_for_request, flags={"throttle": "high"})
+async def process_request(
+    message: Message,
+    state: FSMContext,
+    sender: Sender,
+    tickets: TicketStore,
+    outbox: Outbox,
+    search: SearchIndex,
+    analytics: Analytics,
+    autoclose: AutoCloser,
+    assigner: Assigner,
+    album: Optional[List[Message]] = None
+):
+    """Process user request of any content type and send to admins."""
+    album = album or [message]
+    ticket = await get_or_create_ticket(message, tickets, analytics, assigner)
+    autoclose.activity(ticket.id)
+
+    # The user hears back only once the relay is safely logged
+    header = request_header(message, album, assigner.owner(ticket))
+    methods = copy_with_header(album, SUPPORT_CHAT_ID, header, get_admin_keyboard(ticket.id))
+    await outbox.submit(message_key(album), methods, Priority.ADMIN, meta={"ticket_id": ticket.id})
+    sender.submit(message.answer("Ваша заявка отправлена в поддержку!"))
+    await search.add("request", ticket.user_id, ticket.full_name, entry_body(album), ticket.id)
 
     await state.set_state(RequestStates.waiting_for_response)
 
 
-@router.message(RequestStates.waiting_for_response)
-async def block_messages(message: Message):
+@router.message(RequestStates.waiting_for_response, flags={"throttle": "low"})
+async def block_messages(message: Message, sender: Sender):
     """Block messages while request is being processed."""
-    await message.answer("Заявка обрабатывается, дождитесь ответа поддержки.")
+    sender.submit(message.answer("Заявка обрабатывается, дождитесь ответа поддержки."))
 
 
+@router.callback_query(F.data.startswith(USER_REPLY))
 @router.callback_query(F.data.startswith("user_reply_"))
-async def handle_user_reply(callback_query: types.CallbackQuery, state: FSMContext):
+async def handle_user_reply(callback_query: types.CallbackQuery, state: FSMContext, sender: Sender):
     """Handle user reply button press."""
     await callback_query.answer()
     await state.set_state(RequestStates.waiting_for_request)
-    await callback_query.message.answer("Пожалуйста, напишите ваш ответ.")
+    sender.submit(callback_query.message.answer("Пожалуйста, напишите ваш ответ."))
 
 
+@router.callback_query(F.data.startswith(USER_CLOSE))
 @router.callback_query(F.data.startswith("user_close_"))
-async def handle_user_close(callback_query: types.CallbackQuery, state: FSMContext):
+async def handle_user_close(callback_query: types.CallbackQuery, tickets: TicketStore, autoclose: AutoCloser):
     """Handle user closing request."""
-    user_id = int(callback_query.data.split("_")[2])
-    await callback_query.answer()
-
+    ticket = await button_ticket(callback_query.data, tickets)
     await callback_query.message.edit_reply_markup(reply_markup=None)
-    await callback_query.bot.send_message(
-        chat_id=user_id,
-        text="Ваша заявка была закрыта."
-    )
 
-    await state.clear()
+    if ticket is None or not await autoclose.close(ticket, "user"):
+        await callback_query.answer("Заявка уже закрыта.")
+        return
+    await callback_query.answer()
@@ -0,0 +1,76 @@
+import html
+from datetime import datetime
+from typing import List, Optional
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message
+
+from app.keyboards import get_search_keyboard
+from app.settings import SUPPORT_CHAT_ID
+from app.services import Priority, SearchIndex, SearchResult, Sender
+from app.services.search import MATCH_END, MATCH_START
+
+
+router = Router()
+router.message.filter(F.chat.id == int(SUPPORT_CHAT_ID))
+
+PAGE_SIZE = 5
+
+KIND_NAMES = {
+    "request": "📝 Заявка",
+    "reply": "🖌 Ответ",
+    "feedback": "💬 Отзыв",
+}
+
+
+def format_results(query: str, page: int, results: List[SearchResult]) -> str:
+    lines = [f"🔎 «{html.escape(query)}», страница {page + 1}"]
+    for result in results:
+        snippet = html.escape(result.snippet).replace(MATCH_START, "<b>").replace(MATCH_END, "</b>")
+        ticket = f" #{result.ticket_id}" if result.ticket_id else ""
+        created = datetime.fromtimestamp(result.created_at).strftime("%d.%m.%Y %H:%M")
+        lines.append(
+            f"\n{KIND_NAMES.get(result.kind, result.kind)}{ticket} · {created}\n"
+            f"{html.escape(result.full_name)} (ID: <code>{result.user_id}</code>)\n"
+            f"{snippet}"
+        )
+    return "\n".join(lines)
+
+
+async def search_page(search: SearchIndex, query: str, page: int) -> Optional[tuple]:
+    results, has_next = await search.search(query, limit=PAGE_SIZE, offset=page * PAGE_SIZE)
+    if not results:
+        return None
+    return format_results(query, page, results), get_search_keyboard(page, has_next)
+
+
+@router.message(Command("search"))
+async def handle_search(message: Message, command: CommandObject, sender: Sender, search: SearchIndex):
+    """Search requests, replies and feedback by text, name or user ID."""
+    query = (command.args or "").strip()
+    if not query:
+        sender.submit(message.reply("Использование: /search текст, имя или ID пользователя"), Priority.ADMIN)
+        return
+
+    page = await search_page(search, query, 0)
+    if page is None:
+        sender.submit(message.reply("Ничего не найдено."), Priority.ADMIN)
+        return
+    text, keyboard = page
+    sender.submit(message.reply(text, reply_markup=keyboard), Priority.ADMIN)
+
+
+@router.callback_query(F.data.startswith("search_"))
+async def handle_search_page(callback_query: CallbackQuery, search: SearchIndex):
+    """Show another page of search results."""
+    # Results are a reply to the /search command, which holds the query
+    command = callback_query.message.reply_to_message
+    query = (command.text or "").partition(" ")[2].strip() if command else ""
+    page = await search_page(search, query, int(callback_query.data.split("_")[1])) if query else None
+    if page is None:
+        await callback_query.answer("Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    text, keyboard = page
+    await callback_query.answer()
+    await callback_query.message.edit_text(text, reply_markup=keyboard)
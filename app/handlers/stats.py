@@ -0,0 +1,55 @@
+import time
+from typing import Optional
+
+from aiogram import F, Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from app.settings import SUPPORT_CHAT_ID
+from app.services import Analytics, Priority, Sender
+from app.services.analytics import QuantileSketch
+
+
+router = Router()
+router.message.filter(F.chat.id == int(SUPPORT_CHAT_ID))
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    if seconds < 60:
+        return f"{seconds:.0f} с"
+    minutes = seconds / 60
+    if minutes < 60:
+        return f"{minutes:.0f} мин"
+    hours, minutes = divmod(int(minutes), 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин"
+    days, hours = divmod(hours, 24)
+    return f"{days} д {hours} ч"
+
+
+def format_sketch(sketch: QuantileSketch) -> str:
+    return (
+        f"медиана {format_duration(sketch.quantile(0.5))}, "
+        f"90% {format_duration(sketch.quantile(0.9))}, "
+        f"99% {format_duration(sketch.quantile(0.99))} "
+        f"(всего {sketch.count})"
+    )
+
+
+def format_stats(analytics: Analytics, now: float) -> str:
+    return (
+        "📊 Статистика поддержки\n\n"
+        f"Открытых заявок: {analytics.open}\n"
+        f"Новых за час: {analytics.created.total(now, 1)}, за сутки: {analytics.created.total(now)}\n"
+        f"Закрыто за час: {analytics.closed.total(now, 1)}, за сутки: {analytics.closed.total(now)}\n\n"
+        f"Первый ответ: {format_sketch(analytics.first_response)}\n"
+        f"Решение: {format_sketch(analytics.resolution)}"
+    )
+
+
+@router.message(Command("stats"))
+async def handle_stats(message: Message, sender: Sender, analytics: Analytics):
+    """Show queue and response time statistics."""
+    sender.submit(message.reply(format_stats(analytics.merged(), time.time())), Priority.ADMIN)
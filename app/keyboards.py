@@ -1,31 +1,60 @@
+from functools import lru_cache
+from typing import Optional
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 
+# Keyboards are not modified after they are built, so they can be shared
+KEYBOARD_CACHE_SIZE = 1024
+
+# Ticket buttons carry the ticket id. Buttons sent before tickets were stored
+# use the same names without the "t_" and carry the user id.
+TICKET_PREFIX = "t_"
+ADMIN_REPLY = "t_reply_"
+ADMIN_CLOSE = "t_close_"
+USER_REPLY = "t_user_reply_"
+USER_CLOSE = "t_user_close_"
+
+WELCOME_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(
+        text="📝 Оформить заявку",
+        callback_data="apply_request"
+    )],
+    [InlineKeyboardButton(
+        text="💬 Отправить отзыв",
+        callback_data="send_feedback"
+    )]
+])
+
+
 def get_welcome_keyboard() -> InlineKeyboardMarkup:
-    """Create welcome keyboard with apply and feedback buttons."""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="📝 Оформить заявку",
-            callback_data="apply_request"
-        )],
-        [InlineKeyboardButton(
-            text="💬 Отправить отзыв",
-            callback_data="send_feedback"
-        )]
-    ])
+    """Return welcome keyboard with apply and feedback buttons."""
+    return WELCOME_KEYBOARD
 
 
-def get_admin_keyboard(user_id: int) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_admin_keyboard(ticket_id: int) -> InlineKeyboardMarkup:
     """Create admin keyboard for request management."""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🖌 Ответить", callback_data=f"reply_{user_id}")],
-        [InlineKeyboardButton(text="❌ Закрыть заявку", callback_data=f"close_{user_id}")]
+        [InlineKeyboardButton(text="🖌 Ответить", callback_data=f"{ADMIN_REPLY}{ticket_id}")],
+        [InlineKeyboardButton(text="❌ Закрыть заявку", callback_data=f"{ADMIN_CLOSE}{ticket_id}")]
     ])
 
 
-def get_user_response_keyboard(user_id: int) -> InlineKeyboardMarkup:
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_user_response_keyboard(ticket_id: int) -> InlineKeyboardMarkup:
     """Create user keyboard for response options."""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🖌 Ответить", callback_data=f"user_reply_{user_id}")],
-        [InlineKeyboardButton(text="❌ Закрыть заявку", callback_data=f"user_close_{user_id}")]
+        [InlineKeyboardButton(text="🖌 Ответить", callback_data=f"{USER_REPLY}{ticket_id}")],
+        [InlineKeyboardButton(text="❌ Закрыть заявку", callback_data=f"{USER_CLOSE}{ticket_id}")]
     ])
+
+
+def get_search_keyboard(page: int, has_next: bool) -> Optional[InlineKeyboardMarkup]:
+    """Create pagination keyboard for search results."""
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"search_{page - 1}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"search_{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
@@ -1,29 +1,368 @@
-import asyncio
-
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-
-from app.settings import TOKEN
-from app.handlers import router, set_commands
-from app.middlewares import AlbumMiddleware
-
-
-async def main():
-    bot = Bot(
-        token=TOKEN,
-        default=DefaultBotProperties(parse_mode='HTML')
-    )
-
-    dp = Dispatcher()
-    dp.message.middleware(AlbumMiddleware())
-    dp.include_router(router)
-
-    await set_commands(bot)
-    await dp.start_polling(bot)
-
-
-if __name__ == "__main__":
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        print("Exit")
+import time
+
+# Startup timing includes the imports below
+STARTED = time.perf_counter()
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import TelegramAPIServer
+
+from app.settings import (
+    TOKEN,
+    SUPPORT_CHAT_ID,
+    FEEDBACK_CHAT_ID,
+    API_URL,
+    IMAGES_DIR,
+    DATA_DIR,
+    MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    SEND_GLOBAL_RATE,
+    SEND_CHAT_RATE,
+    SEND_GROUP_RATE,
+    SEND_CONCURRENCY,
+    HTTP_POOL_SIZE,
+    HTTP_KEEPALIVE,
+    HTTP_TIMEOUT,
+    HTTP_MEDIA_TIMEOUT,
+    HTTP_FAST_TIMEOUT,
+    HTTP_FAST_JSON,
+    FSM_FLUSH_INTERVAL,
+    FSM_CACHE_TTL,
+    ALBUM_QUIET,
+    ALBUM_MAX_WAIT,
+    UPDATE_CONCURRENCY,
+    UPDATE_MAX_PENDING,
+    THROTTLE_WINDOW,
+    THROTTLE_LIMIT,
+    THROTTLE_SHED_DEPTH,
+    TICKET_MESSAGE_CACHE,
+    TICKET_IDLE_TIMEOUT,
+    AUTOCLOSE_BATCH,
+    AUTOCLOSE_INTERVAL,
+    ASSIGN_MAX_LOAD,
+    ASSIGN_REFRESH_INTERVAL,
+    OUTBOX_MAX_BACKOFF,
+    FEEDBACK_DIGEST,
+    FEEDBACK_DIGEST_DELAY,
+    BROADCAST_WORKERS,
+    BROADCAST_RETRIES,
+    EXPORT_CHUNK_SIZE,
+    UVLOOP,
+    LOOP_LAG_INTERVAL,
+    LOOP_SLOW_THRESHOLD,
+    METRICS_HOST,
+    METRICS_PORT,
+    WORKERS,
+)
+from app.handlers import COMMANDS, router
+from app.middlewares import (
+    AlbumMiddleware,
+    MetricsMiddleware,
+    RequestMetricsMiddleware,
+    ThrottlingMiddleware,
+    UpdateScheduler,
+)
+from app.services import (
+    Analytics,
+    Assigner,
+    AutoCloser,
+    Broadcaster,
+    Database,
+    Exporter,
+    FeedbackDigest,
+    MediaCache,
+    Outbox,
+    SearchIndex,
+    Sender,
+    SQLiteStorage,
+    TicketStore,
+    TokenBucket,
+    TunedSession,
+)
+from app.services.metrics import registry, start_metrics_server
+from app.runtime import LoopMonitor, run
+from app.startup import COMMANDS_STATE, FirstUpdateMiddleware, StartupTimer, prepare_bot
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_bot() -> Bot:
+    """Create the bot, talking to a local Bot API server when API_URL is set."""
+    options = {"api": TelegramAPIServer.from_base(API_URL)} if API_URL else {}
+    session = TunedSession(
+        pool_size=HTTP_POOL_SIZE,
+        keepalive=HTTP_KEEPALIVE,
+        timeout=HTTP_TIMEOUT,
+        media_timeout=HTTP_MEDIA_TIMEOUT,
+        fast_timeout=HTTP_FAST_TIMEOUT,
+        fast_json=HTTP_FAST_JSON,
+        **options,
+    )
+    return Bot(
+        token=TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode='HTML')
+    )
+
+
+async def run_polling(dp: Dispatcher, bot: Bot, timer: StartupTimer):
+    """Receive updates with long polling."""
+    await prepare_bot(bot, COMMANDS, DATA_DIR / COMMANDS_STATE, timer, ("webhook", bot.delete_webhook()))
+    logger.info(timer.report())
+    # UpdateScheduler runs the handlers; awaiting each feed gives it backpressure
+    await dp.start_polling(bot, handle_as_tasks=False)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, timer: StartupTimer):
+    """Receive updates on an embedded aiohttp server.
+
+    The update is queued by UpdateScheduler before Telegram gets an empty
+    response, so a full queue slows Telegram down.
+    """
+    # Only needed in webhook mode
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=WEBHOOK_SECRET or None,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    # Without a public URL the webhook is expected to be set up externally
+    steps = []
+    if WEBHOOK_URL:
+        steps.append(("webhook", bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )))
+    await prepare_bot(bot, COMMANDS, DATA_DIR / COMMANDS_STATE, timer, *steps)
+    logger.info(timer.report())
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def create_dispatcher(
+    bot: Bot,
+    data_dir: Path = DATA_DIR,
+    global_bucket: Optional[TokenBucket] = None,
+    chat_buckets: Optional[Dict[str, TokenBucket]] = None,
+    outbox_file: str = "outbox.log",
+    analytics_file: str = "analytics.json",
+    analytics_peers: Sequence[str] = (),
+    autoclose: bool = True,
+    digest_file: str = "digest.log",
+    feedback_digest: bool = FEEDBACK_DIGEST,
+    resume_broadcast: bool = True,
+) -> Dispatcher:
+    """Build the dispatcher with its services, middlewares and routers.
+
+    Worker processes pass shared buckets so they send within one rate budget,
+    and only one of them runs the inactivity auto-close and resumes an
+    interrupted broadcast.
+    """
+    media_cache = MediaCache(IMAGES_DIR, data_dir / "media_cache.json")
+    media_cache.load()
+
+    sender = Sender(
+        bot,
+        global_rate=SEND_GLOBAL_RATE,
+        chat_rate=SEND_CHAT_RATE,
+        group_rate=SEND_GROUP_RATE,
+        concurrency=SEND_CONCURRENCY,
+        global_bucket=global_bucket,
+        buckets=chat_buckets,
+    )
+
+    db = Database(data_dir / "support.db")
+    await db.connect()
+    storage = SQLiteStorage(db, flush_interval=FSM_FLUSH_INTERVAL, ttl=FSM_CACHE_TTL)
+    await storage.setup()
+    tickets = TicketStore(db, message_cache_size=TICKET_MESSAGE_CACHE)
+    await tickets.setup()
+    search = SearchIndex(db)
+    await search.setup()
+    exporter = Exporter(db, chunk_size=EXPORT_CHUNK_SIZE)
+    analytics = Analytics(data_dir / analytics_file, peers=[data_dir / name for name in analytics_peers])
+    await analytics.setup(tickets)
+    assigner = Assigner(
+        db,
+        tickets,
+        sender,
+        SUPPORT_CHAT_ID,
+        max_load=ASSIGN_MAX_LOAD,
+        refresh_interval=ASSIGN_REFRESH_INTERVAL,
+    )
+    await assigner.setup()
+    closer = AutoCloser(
+        tickets,
+        sender,
+        storage,
+        analytics,
+        timeout=TICKET_IDLE_TIMEOUT if autoclose else 0,
+        batch_size=AUTOCLOSE_BATCH,
+        batch_interval=AUTOCLOSE_INTERVAL,
+        assigner=assigner,
+    )
+    await closer.setup()
+    outbox = Outbox(
+        data_dir / outbox_file,
+        sender,
+        on_delivered=tickets.record_delivery,
+        max_backoff=OUTBOX_MAX_BACKOFF,
+    )
+    broadcaster = Broadcaster(
+        tickets,
+        sender,
+        data_dir / "broadcast.json",
+        status_chat_id=SUPPORT_CHAT_ID,
+        workers=BROADCAST_WORKERS,
+        retries=BROADCAST_RETRIES,
+    )
+    digest = None
+    if feedback_digest:
+        digest = FeedbackDigest(data_dir / digest_file, outbox, FEEDBACK_CHAT_ID, max_delay=FEEDBACK_DIGEST_DELAY)
+
+    dp = Dispatcher(
+        storage=storage,
+        media_cache=media_cache,
+        sender=sender,
+        tickets=tickets,
+        outbox=outbox,
+        search=search,
+        exporter=exporter,
+        analytics=analytics,
+        autoclose=closer,
+        assigner=assigner,
+        digest=digest,
+        broadcaster=broadcaster,
+    )
+    album = AlbumMiddleware(quiet=ALBUM_QUIET, max_wait=ALBUM_MAX_WAIT)
+    scheduler = UpdateScheduler(
+        concurrency=UPDATE_CONCURRENCY,
+        max_pending=UPDATE_MAX_PENDING,
+        collected=album.collected,
+    )
+    dp.update.outer_middleware(scheduler)
+    monitor = LoopMonitor(interval=LOOP_LAG_INTERVAL, threshold=LOOP_SLOW_THRESHOLD)
+    dp["loop_monitor"] = monitor
+    dp.startup.register(monitor.start)
+    dp.startup.register(sender.start)
+    dp.startup.register(outbox.start)
+    dp.startup.register(analytics.start)
+    dp.startup.register(closer.start)
+    dp.startup.register(assigner.start)
+    if digest is not None:
+        dp.startup.register(digest.start)
+    if resume_broadcast:
+        dp.startup.register(broadcaster.resume)
+    dp.shutdown.register(closer.stop)
+    dp.shutdown.register(assigner.stop)
+    # Checkpointed, it resumes on the next start
+    dp.shutdown.register(broadcaster.stop)
+    dp.shutdown.register(scheduler.close)
+    # The FSM middleware closed the storage before queued updates finished
+    dp.shutdown.register(storage.close)
+    if digest is not None:
+        # Flushes into the outbox, so before it closes
+        dp.shutdown.register(digest.close)
+    dp.shutdown.register(outbox.close)
+    dp.shutdown.register(analytics.close)
+    dp.shutdown.register(sender.close)
+    dp.shutdown.register(db.close)
+    dp.shutdown.register(monitor.stop)
+    throttling = ThrottlingMiddleware(
+        window=THROTTLE_WINDOW,
+        limit=THROTTLE_LIMIT,
+        shed_depth=THROTTLE_SHED_DEPTH,
+        load=lambda: scheduler.pending + sender.pending,
+    )
+    for event in ("message", "callback_query"):
+        metrics = MetricsMiddleware(event)
+        dp.observers[event].outer_middleware(metrics)
+        dp.observers[event].middleware(metrics)
+    dp.message.middleware(album)
+    dp.message.middleware(throttling)
+    dp.include_router(router)
+
+    bot.session.middleware(RequestMetricsMiddleware())
+    registry.gauge("bot_send_queue", "Sends waiting in the outbound queue", lambda: sender.pending)
+    registry.gauge("bot_albums_pending", "Albums being collected", lambda: len(album.album_data))
+    registry.gauge("bot_update_queue", "Updates queued or running", lambda: scheduler.pending)
+    registry.gauge("bot_update_running", "Updates being handled", lambda: scheduler.running)
+    registry.gauge("bot_update_chats", "Chats with queued updates", lambda: len(scheduler.queues))
+    registry.gauge("bot_throttle_users", "Users tracked by flood control", lambda: len(throttling.users))
+    registry.gauge("bot_outbox_pending", "Relays logged but not delivered yet", lambda: outbox.pending)
+    if digest is not None:
+        registry.gauge("bot_digest_pending", "Feedback entries waiting in the digest", lambda: digest.pending)
+    registry.gauge("bot_loop_lag_p50_seconds", "Median event loop lag, recent samples", lambda: monitor.quantile(0.5))
+    registry.gauge("bot_loop_lag_p99_seconds", "99th percentile event loop lag, recent samples", lambda: monitor.quantile(0.99))
+    registry.gauge("bot_loop_lag_max_seconds", "Largest event loop lag, recent samples", lambda: monitor.quantile(1.0))
+    registry.gauge("bot_tickets_open", "Open tickets", lambda: analytics.open)
+    registry.gauge(
+        "bot_broadcast_processed",
+        "Recipients done in the current broadcast",
+        lambda: broadcaster.progress.processed if broadcaster.progress else 0,
+    )
+    registry.gauge("bot_tickets_waiting", "Open tickets waiting for an admin", lambda: len(assigner.waiting))
+    registry.gauge("bot_admins_online", "Admins on shift", lambda: len(assigner.online))
+    registry.gauge("bot_autoclose_timers", "Open tickets with an inactivity deadline", lambda: len(closer.wheel))
+    if isinstance(bot.session, TunedSession):
+        session = bot.session
+        registry.gauge("bot_http_pool_size", "Connection limit of the Bot API session", lambda: session.pool_size)
+        registry.gauge("bot_http_active", "Bot API connections in use", lambda: session.pool_stats()["active"])
+        registry.gauge("bot_http_idle", "Idle keep-alive Bot API connections", lambda: session.pool_stats()["idle"])
+        registry.gauge("bot_http_waiting", "Requests waiting for a Bot API connection", lambda: session.pool_stats()["waiting"])
+    return dp
+
+
+async def main():
+    timer = StartupTimer(STARTED)
+    timer.mark("imports")
+    bot = create_bot()
+    dp = await create_dispatcher(bot)
+    dp.update.middleware(FirstUpdateMiddleware(STARTED))
+    timer.mark("dispatcher")
+
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        dp.shutdown.register(metrics_runner.cleanup)
+
+    if MODE == "webhook":
+        await run_webhook(dp, bot, timer)
+    else:
+        await run_polling(dp, bot, timer)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # One line per update is too much at INFO
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    try:
+        if WORKERS > 1:
+            from app.supervisor import run_supervisor
+            run_supervisor(WORKERS)
+        else:
+            run(main(), UVLOOP)
+    except KeyboardInterrupt:
+        print("Exit")
@@ -1,3 +1,12 @@
 from app.middlewares.album import AlbumMiddleware
+from app.middlewares.metrics import MetricsMiddleware, RequestMetricsMiddleware
+from app.middlewares.scheduler import UpdateScheduler
+from app.middlewares.throttling import ThrottlingMiddleware
 
-__all__ = ["AlbumMiddleware"]
+__all__ = [
+    "AlbumMiddleware",
+    "MetricsMiddleware",
+    "RequestMetricsMiddleware",
+    "ThrottlingMiddleware",
+    "UpdateScheduler",
+]
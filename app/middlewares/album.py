@@ -1,16 +1,57 @@
 import asyncio
-from typing import Any, Callable, Dict, Awaitable
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Awaitable, List
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message
 
+from app.services.metrics import ALBUM_DELAY, ALBUM_SIZE
+
+# Telegram albums contain at most 10 items
+MAX_ALBUM_SIZE = 10
+
+
+@dataclass
+class _Group:
+    messages: List[Message]
+    started: float
+    arrived: asyncio.Event = field(default_factory=asyncio.Event)
+
 
 class AlbumMiddleware(BaseMiddleware):
-    """Middleware to collect media group messages into a single album."""
+    """Middleware to collect media group messages into a single album.
+
+    The album is passed on once no new part has arrived for `quiet` seconds,
+    when it reaches 10 items, or after `max_wait` seconds at most. A group
+    is dropped from `album_data` as soon as it is passed on, so at most
+    `max_groups` albums are held at a time. The ids of the last `max_groups`
+    albums passed on are kept for `collected`.
+    """
+
+    def __init__(self, quiet: float = 0.2, max_wait: float = 1.0, max_groups: int = 1000):
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.max_groups = max_groups
+        self.album_data: Dict[str, _Group] = {}
+        self._collected: "OrderedDict[str, None]" = OrderedDict()
 
-    def __init__(self, latency: float = 0.5):
-        self.latency = latency
-        self.album_data: Dict[str, list] = {}
+    def collected(self, media_group_id: str) -> bool:
+        """Whether the album was passed on: a part arriving now is too late for it."""
+        return media_group_id in self._collected
+
+    async def _collect(self, group: _Group) -> None:
+        deadline = group.started + self.max_wait
+        while len(group.messages) < MAX_ALBUM_SIZE:
+            timeout = min(self.quiet, deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            group.arrived.clear()
+            try:
+                await asyncio.wait_for(group.arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
 
     async def __call__(
         self,
@@ -21,12 +62,31 @@ class AlbumMiddleware(BaseMiddleware):
         if not event.media_group_id:
             return await handler(event, data)
 
-        try:
-            self.album_data[event.media_group_id].append(event)
+        group = self.album_data.get(event.media_group_id)
+        if group is not None:
+            group.messages.append(event)
+            group.arrived.set()
             return
-        except KeyError:
-            self.album_data[event.media_group_id] = [event]
-            await asyncio.sleep(self.latency)
 
-            data["album"] = self.album_data.pop(event.media_group_id)
+        now = time.monotonic()
+        if len(self.album_data) >= self.max_groups:
+            # Too many albums in flight, pass parts on without collecting
+            data["album"] = [event]
             return await handler(event, data)
+
+        group = _Group(messages=[event], started=now)
+        self.album_data[event.media_group_id] = group
+        try:
+            await self._collect(group)
+        finally:
+            self.album_data.pop(event.media_group_id, None)
+            self._collected[event.media_group_id] = None
+            if len(self._collected) > self.max_groups:
+                self._collected.popitem(last=False)
+
+        album = sorted(group.messages, key=lambda m: m.message_id)
+        ALBUM_SIZE.observe(len(album))
+        ALBUM_DELAY.observe(time.monotonic() - now)
+
+        data["album"] = album
+        return await handler(event, data)
@@ -0,0 +1,80 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from app.services.metrics import API_ERRORS, API_LATENCY, HANDLER_LATENCY, UPDATES
+
+
+class _Scope:
+    __slots__ = ("handler",)
+
+    def __init__(self):
+        self.handler = "unhandled"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Record handler name, FSM state, latency and outcome of events.
+
+    Register it as an outer middleware to time the event and as an inner one
+    to learn which handler ran:
+
+        dp.message.outer_middleware(metrics)
+        dp.message.middleware(metrics)
+    """
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        scope = data.get("metrics_scope")
+        if scope is not None:
+            # Inner call: the handler is resolved, tell the outer call its name
+            scope.handler = data["handler"].callback.__name__
+            return await handler(event, data)
+
+        scope = data["metrics_scope"] = _Scope()
+        state = data.get("raw_state") or "none"
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            outcome = "unhandled" if result is UNHANDLED else "ok"
+            return result
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, self.event, scope.handler)
+            UPDATES.inc(self.event, scope.handler, state, outcome)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Time every Bot API call and count failures, 429s included."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            API_ERRORS.inc(name, "429")
+            raise
+        except TelegramAPIError as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, name)
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.services.metrics import UPDATE_WAIT
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+Key = Tuple[Optional[int], Optional[int]]
+
+
+class _Job:
+    __slots__ = ("handler", "event", "data", "queued", "started", "followers")
+
+    def __init__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]):
+        self.handler = handler
+        self.event = event
+        self.data = data
+        self.queued = time.monotonic()
+        self.started = False
+        # Later parts of an album started by this update
+        self.followers: List[Tuple[Handler, TelegramObject, Dict[str, Any]]] = []
+
+
+def _media_group(event: TelegramObject) -> Optional[str]:
+    if isinstance(event, Update) and event.message is not None:
+        return event.message.media_group_id
+    return None
+
+
+class UpdateScheduler(BaseMiddleware):
+    """Run updates of different chats concurrently and updates of one chat in order.
+
+    In group chats like the support chat the order is kept per member, the
+    scope of their FSM state, so one admin doesn't hold up the others.
+
+    Register it as the last outer middleware of `dp.update`: each update is
+    put in its chat's FIFO queue and the middleware returns right away. One
+    task per busy chat drains its queue; at most `concurrency` updates are
+    handled at once. With `max_pending` updates queued the middleware waits
+    for room, so polling (with handle_as_tasks=False) or the webhook request
+    slows down instead of memory growing.
+
+    Album parts after the first don't queue behind it: they're handed to
+    AlbumMiddleware as soon as the first part starts, so it can collect them.
+    A part arriving once `collected(media_group_id)` says the album was
+    passed on is queued like any other update, after those before it.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 64,
+        max_pending: int = 10000,
+        collected: Callable[[str], bool] = lambda media_group_id: False,
+    ):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.collected = collected
+        self.queues: Dict[Key, Deque[_Job]] = {}
+        self.pending = 0
+        self.running = 0
+        self._albums: Dict[Tuple[Key, str], _Job] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._room = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: set = set()
+
+    @staticmethod
+    def _chat_key(data: Dict[str, Any]) -> Key:
+        """Queue key, the same granularity as FSM keys: a user in a chat."""
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        return (chat and chat.id, user and user.id)
+
+    def _spawn(self, coro: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def __call__(
+        self,
+        handler: Handler,
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        while self.pending >= self.max_pending:
+            self._room.clear()
+            await self._room.wait()
+
+        key = self._chat_key(data)
+        group = _media_group(event)
+        lead = self._albums.get((key, group)) if group is not None else None
+        if lead is not None and not lead.started:
+            lead.followers.append((handler, event, data))
+            return
+        if lead is not None and not self.collected(group):
+            # Joins the album the first part is collecting
+            self._spawn(self._handle(handler, event, data))
+            return
+
+        job = _Job(handler, event, data)
+        if group is not None and lead is None:
+            self._albums[key, group] = job
+        self.pending += 1
+        self._idle.clear()
+
+        queue = self.queues.get(key)
+        if queue is not None:
+            queue.append(job)
+        else:
+            self.queues[key] = deque([job])
+            self._spawn(self._drain(key))
+
+    async def _handle(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> None:
+        try:
+            # FSMContextMiddleware read the state when the update was queued;
+            # an earlier update of this user may have changed it since
+            state = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+            await handler(event, data)
+        except Exception:
+            logger.exception("Failed to handle update %s", getattr(event, "update_id", None))
+
+    async def _drain(self, key: Key) -> None:
+        queue = self.queues[key]
+        while queue:
+            job = queue[0]
+            async with self._semaphore:
+                UPDATE_WAIT.observe(time.monotonic() - job.queued)
+                self.running += 1
+                job.started = True
+                run = asyncio.ensure_future(self._handle(job.handler, job.event, job.data))
+                for follower in job.followers:
+                    self._spawn(self._handle(*follower))
+                job.followers.clear()
+                try:
+                    await run
+                finally:
+                    self.running -= 1
+
+            group = _media_group(job.event)
+            if group is not None and self._albums.get((key, group)) is job:
+                del self._albums[key, group]
+            queue.popleft()
+            self.pending -= 1
+            self._room.set()
+
+        del self.queues[key]
+        if not self.pending:
+            self._idle.set()
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Wait for queued updates to be handled."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopped with %s updates still queued", self.pending)
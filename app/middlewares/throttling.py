@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.enums import ChatType
+from aiogram.types import Message
+
+from app.services.metrics import THROTTLED
+
+
+class _Window:
+    """Message counts of one user in a ring of time buckets."""
+
+    __slots__ = ("counts", "head", "notified", "last", "last_bucket")
+
+    def __init__(self, slots: int, bucket: int):
+        self.counts: List[int] = [0] * slots
+        self.head = bucket
+        self.notified = -slots
+        self.last: Optional[int] = None
+        self.last_bucket = bucket
+
+    def add(self, bucket: int) -> int:
+        """Count a message in `bucket` and return the total over the window."""
+        slots = len(self.counts)
+        if bucket - self.head >= slots:
+            self.counts = [0] * slots
+        else:
+            for b in range(self.head + 1, bucket + 1):
+                self.counts[b % slots] = 0
+        self.head = bucket
+        self.counts[bucket % slots] += 1
+        return sum(self.counts)
+
+
+def _signature(message: Message) -> int:
+    media = message.photo[-1] if message.photo else (
+        message.document or message.video or message.voice or message.audio
+        or message.animation or message.sticker or message.video_note
+    )
+    return hash((message.content_type, message.text or message.caption, media and media.file_unique_id))
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Per-user flood control for private chats.
+
+    Every message counts in a sliding window of `window` seconds split into
+    `slots` buckets. Over `limit` messages per window the rest is dropped.
+    A message identical to the user's previous one within the window is
+    dropped as a repeat, commands excepted.
+
+    Handlers flagged `throttle="low"` (the "please wait" replies) run at most
+    once per window per user, and not at all while `load()` is above
+    `shed_depth`. Handlers flagged `throttle="high"` (a new request) get
+    repeats too: after the user asks to write again, the same text is a new
+    message. Users idle for a whole window are forgotten.
+
+    Register it after AlbumMiddleware so an album counts as one message.
+    """
+
+    def __init__(
+        self,
+        window: float = 10.0,
+        limit: int = 20,
+        slots: int = 10,
+        shed_depth: int = 1000,
+        load: Callable[[], int] = lambda: 0,
+    ):
+        self.width = window / slots
+        self.slots = slots
+        self.limit = limit
+        self.shed_depth = shed_depth
+        self.load = load
+        # Least recently active first, so idle users are evicted from the front
+        self.users: "OrderedDict[int, _Window]" = OrderedDict()
+
+    def _window(self, user_id: int, bucket: int) -> _Window:
+        while self.users:
+            oldest = next(iter(self.users.values()))
+            if bucket - oldest.head < self.slots:
+                break
+            self.users.popitem(last=False)
+
+        window = self.users.get(user_id)
+        if window is None:
+            window = self.users[user_id] = _Window(self.slots, bucket)
+        else:
+            self.users.move_to_end(user_id)
+        return window
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.chat.type != ChatType.PRIVATE or event.from_user is None:
+            return await handler(event, data)
+
+        bucket = int(time.monotonic() / self.width)
+        window = self._window(event.from_user.id, bucket)
+        total = window.add(bucket)
+
+        # Commands are cheap and often repeated on purpose
+        signature = None if (event.text or "").startswith("/") else _signature(event)
+        repeat = signature is not None and signature == window.last and bucket - window.last_bucket < self.slots
+        window.last, window.last_bucket = signature, bucket
+        priority = get_flag(data, "throttle")
+
+        reason = None
+        if total > self.limit:
+            reason = "flood"
+        elif repeat and priority != "high":
+            reason = "repeat"
+        elif priority == "low":
+            if self.load() > self.shed_depth:
+                reason = "shed"
+            elif bucket - window.notified < self.slots:
+                reason = "notified"
+            else:
+                window.notified = bucket
+        if reason is not None:
+            THROTTLED.inc(reason)
+            return None
+
+        return await handler(event, data)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Coroutine, Deque, Optional, TypeVar
+
+from app.services.metrics import LOOP_LAG, LOOP_STALLS
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Innermost frames of a blocked loop's stack to log
+STACK_LIMIT = 20
+
+
+def loop_factory(use_uvloop: bool = True) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """uvloop's loop factory if it's wanted and installed, else None for the stock loop."""
+    if not use_uvloop:
+        return None
+    try:
+        import uvloop
+    except ImportError:  # optional, the stock loop is used without it
+        return None
+    return uvloop.new_event_loop
+
+
+def run(main: Coroutine[Any, Any, T], use_uvloop: bool = True) -> T:
+    """asyncio.run on uvloop when available."""
+    factory = loop_factory(use_uvloop)
+    if factory is not None:
+        logger.info("Event loop: uvloop")
+    elif use_uvloop:
+        logger.info("Event loop: asyncio, install the speedups extra for uvloop")
+    else:
+        logger.info("Event loop: asyncio")
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(main)
+
+
+def percentile(values: Any, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopMonitor:
+    """Measures event loop lag and reports what blocks the loop.
+
+    A sampler sleeps `interval` seconds at a time; how much later than that
+    it wakes up is the loop lag, kept for the last `window` samples and
+    observed in the bot_loop_lag_seconds histogram. A watchdog thread checks
+    the sampler's heartbeat: when the loop hasn't come round for
+    `threshold` seconds, it logs the stack of the loop thread, which ends in
+    the callback or coroutine holding it, once per stall.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, window: int = 600):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=window)
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def quantile(self, q: float) -> float:
+        return percentile(self.lags, q)
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.lags.append(lag)
+            LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                LOOP_STALLS.inc()
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            logger.warning(
+                "Event loop blocked for %.2fs so far in %s:\n%s",
+                blocked,
+                task.get_name() if task is not None else "a callback",
+                "".join(traceback.format_stack(frame, STACK_LIMIT)),
+            )
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._watchdog = None
@@ -0,0 +1,44 @@
+from app.services.analytics import Analytics
+from app.services.assignment import Admin, Assigner
+from app.services.autoclose import AutoCloser
+from app.services.broadcast import Broadcaster, Progress
+from app.services.database import Database
+from app.services.digest import FeedbackDigest
+from app.services.export import Exporter
+from app.services.media import MediaCache
+from app.services.outbox import Outbox, message_key
+from app.services.sender import Priority, Sender, SharedTokenBucket, TokenBucket
+from app.services.relay import copy_plain, copy_with_header, submit_all
+from app.services.search import SearchIndex, SearchResult, entry_body
+from app.services.session import TunedSession
+from app.services.storage import SQLiteStorage
+from app.services.tickets import Ticket, TicketStore
+
+__all__ = [
+    "Admin",
+    "Analytics",
+    "Assigner",
+    "AutoCloser",
+    "Broadcaster",
+    "Database",
+    "Exporter",
+    "FeedbackDigest",
+    "MediaCache",
+    "Outbox",
+    "Priority",
+    "Progress",
+    "SearchIndex",
+    "SearchResult",
+    "Sender",
+    "SharedTokenBucket",
+    "SQLiteStorage",
+    "Ticket",
+    "TicketStore",
+    "TokenBucket",
+    "TunedSession",
+    "copy_plain",
+    "copy_with_header",
+    "entry_body",
+    "message_key",
+    "submit_all",
+]
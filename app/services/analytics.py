@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.services.files import write_atomic
+from app.services.tickets import TicketStore
+
+
+logger = logging.getLogger(__name__)
+
+# How often workers save their aggregates, so /stats on one sees the others'
+PEER_SAVE_INTERVAL = 5.0
+
+
+class QuantileSketch:
+    """Streaming quantiles with bounded relative error (DDSketch-style).
+
+    A value goes to the logarithmic bucket `ceil(log(value) / log(gamma))`,
+    so any quantile is off by at most `accuracy` relative to the true one.
+    Memory grows with the log of the value range, not with the count:
+    seconds up to a month at 1% take under a thousand buckets.
+    """
+
+    def __init__(self, accuracy: float = 0.01, min_value: float = 1e-3):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        index = math.ceil(math.log(max(value, self.min_value)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add another sketch of the same accuracy."""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"buckets": self.buckets, "count": self.count, "total": self.total}
+
+    def load(self, data: Dict[str, Any]) -> None:
+        self.buckets = {int(index): count for index, count in data["buckets"].items()}
+        self.count = data["count"]
+        self.total = data["total"]
+
+
+class RingCounter:
+    """Event counts in fixed time buckets covering the last `slots * width` seconds."""
+
+    def __init__(self, slots: int = 24, width: float = 3600.0):
+        self.slots = slots
+        self.width = width
+        self.counts = [0] * slots
+        # Bucket number each slot currently holds
+        self.starts = [-1] * slots
+
+    def add(self, now: float, value: int = 1) -> None:
+        bucket = int(now // self.width)
+        slot = bucket % self.slots
+        if self.starts[slot] != bucket:
+            self.starts[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += value
+
+    def total(self, now: float, buckets: Optional[int] = None) -> int:
+        """Sum of the last `buckets` buckets, the current one included."""
+        current = int(now // self.width)
+        oldest = current - (buckets or self.slots) + 1
+        return sum(
+            count for count, start in zip(self.counts, self.starts)
+            if oldest <= start <= current
+        )
+
+    def merge(self, other: "RingCounter") -> None:
+        """Add another counter of the same shape; the newer bucket wins a slot."""
+        for slot, (count, start) in enumerate(zip(other.counts, other.starts)):
+            if start > self.starts[slot]:
+                self.starts[slot] = start
+                self.counts[slot] = count
+            elif start == self.starts[slot] and start >= 0:
+                self.counts[slot] += count
+
+    def to_dict(self) -> Dict[str, List]:
+        return {"counts": self.counts, "starts": self.starts}
+
+    def load(self, data: Dict[str, List]) -> None:
+        if len(data["counts"]) == self.slots:
+            self.counts = list(data["counts"])
+            self.starts = list(data["starts"])
+
+
+class Analytics:
+    """Running support aggregates, updated on every ticket transition.
+
+    Keeps the open ticket count, hourly created/closed counts for the last
+    day and sketches of first response and resolution times, so reading the
+    stats costs the same whatever the history. Aggregates are saved to a
+    JSON file periodically and on shutdown.
+
+    The open count follows this process's transitions and is read from the
+    database every `refresh_interval` seconds, since worker processes close
+    each other's tickets. The rest is per process: `peers` are the other
+    workers' snapshot files, which `merged` adds in. Workers with peers save
+    every PEER_SAVE_INTERVAL seconds at most, so that's how far behind the
+    others the merged figures can be.
+    """
+
+    def __init__(
+        self,
+        snapshot_file: Path,
+        save_interval: float = 60.0,
+        refresh_interval: float = 10.0,
+        peers: Sequence[Path] = (),
+    ):
+        self.snapshot_file = snapshot_file
+        self.peers = list(peers)
+        self.save_interval = min(save_interval, PEER_SAVE_INTERVAL) if self.peers else save_interval
+        self.refresh_interval = refresh_interval
+        self.tickets: Optional[TicketStore] = None
+        self.open = 0
+        self.created = RingCounter()
+        self.closed = RingCounter()
+        self.first_response = QuantileSketch()
+        self.resolution = QuantileSketch()
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _read(path: Path) -> Optional["Analytics"]:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        snapshot = Analytics(path)
+        snapshot.created.load(data["created"])
+        snapshot.closed.load(data["closed"])
+        snapshot.first_response.load(data["first_response"])
+        snapshot.resolution.load(data["resolution"])
+        return snapshot
+
+    def _add(self, other: "Analytics") -> None:
+        self.created.merge(other.created)
+        self.closed.merge(other.closed)
+        self.first_response.merge(other.first_response)
+        self.resolution.merge(other.resolution)
+
+    def load(self) -> None:
+        snapshot = self._read(self.snapshot_file)
+        if snapshot is not None:
+            self._add(snapshot)
+
+    def merged(self) -> "Analytics":
+        """This process's aggregates plus the last saved ones of every peer."""
+        total = Analytics(self.snapshot_file)
+        total.open = self.open
+        total._add(self)
+        for path in self.peers:
+            snapshot = self._read(path)
+            if snapshot is not None:
+                total._add(snapshot)
+        return total
+
+    def save(self) -> None:
+        data = {
+            "created": self.created.to_dict(),
+            "closed": self.closed.to_dict(),
+            "first_response": self.first_response.to_dict(),
+            "resolution": self.resolution.to_dict(),
+        }
+        write_atomic(self.snapshot_file, json.dumps(data))
+        self._dirty = False
+
+    def ticket_created(self, now: Optional[float] = None) -> None:
+        self.open += 1
+        self.created.add(now or time.time())
+        self._dirty = True
+
+    def first_reply(self, created_at: float, now: Optional[float] = None) -> None:
+        self.first_response.add((now or time.time()) - created_at)
+        self._dirty = True
+
+    def ticket_closed(self, created_at: float, now: Optional[float] = None) -> None:
+        now = now or time.time()
+        self.open = max(self.open - 1, 0)
+        self.closed.add(now)
+        self.resolution.add(now - created_at)
+        self._dirty = True
+
+    async def _autosave(self) -> None:
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self._dirty:
+                try:
+                    self.save()
+                except OSError:
+                    logger.exception("Failed to save analytics")
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                self.open = await self.tickets.count_open()
+            except Exception:
+                logger.exception("Failed to refresh the open ticket count")
+
+    async def setup(self, tickets: TicketStore) -> None:
+        self.load()
+        self.tickets = tickets
+        self.open = await tickets.count_open()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._autosave())
+        if self.refresh_interval and self.tickets is not None and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def close(self) -> None:
+        for task in (self._task, self._refresh_task):
+            if task is not None:
+                task.cancel()
+        self._task = self._refresh_task = None
+        if self._dirty:
+            self.save()
@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.methods import SendMessage
+
+from app.keyboards import get_admin_keyboard
+from app.services.database import Database
+from app.services.relay import ChatId
+from app.services.sender import Priority, Sender
+from app.services.tickets import Ticket, TicketStore
+from app.texts import ASSIGNED, MENTION
+
+
+logger = logging.getLogger(__name__)
+
+# Claims lost to concurrent reassignments before giving up
+CLAIM_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS admins (
+    user_id INTEGER PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    online INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class Admin:
+    user_id: int
+    full_name: str
+    online: bool = False
+    # When the admin last got a ticket, to rotate between equally loaded ones
+    assigned_at: float = 0.0
+
+    @property
+    def mention(self) -> str:
+        return MENTION.render(user_id=self.user_id, full_name=self.full_name)
+
+
+class Assigner:
+    """Assigns open tickets to online admins, least loaded first.
+
+    `load` counts the open tickets of every admin; `waiting` is a heap of
+    unassigned open tickets, longest waiting first. A new ticket goes to
+    the online admin with the fewest tickets, or waits if everyone has
+    `max_load` (0 for no cap) or nobody is online. Waiting tickets are
+    handed out, with a note in the support chat, as soon as an admin comes
+    online or closes a ticket.
+
+    The owner of a ticket is its `assignee` column, so checking it is a
+    look at the ticket row the handlers load anyway. Assignments are
+    conditional updates, safe across worker processes; every process
+    reloads the counters from the database each `refresh_interval`.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        tickets: TicketStore,
+        sender: Sender,
+        chat_id: ChatId,
+        max_load: int = 10,
+        refresh_interval: float = 10.0,
+    ):
+        self.db = db
+        self.tickets = tickets
+        self.sender = sender
+        self.chat_id = chat_id
+        self.max_load = max_load
+        self.refresh_interval = refresh_interval
+        self.admins: Dict[int, Admin] = {}
+        self.load: Dict[int, int] = {}
+        self.waiting: List[Tuple[float, int]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def setup(self) -> None:
+        await self.db.executescript(SCHEMA)
+        await self.refresh()
+
+    async def refresh(self) -> None:
+        """Reload admins, loads and the waiting queue from the database."""
+        previous, self.admins = self.admins, {}
+        for user_id, full_name, online in await self.db.fetchall("SELECT user_id, full_name, online FROM admins"):
+            admin = self.admins[user_id] = Admin(user_id, full_name, bool(online))
+            if user_id in previous:
+                admin.assigned_at = previous[user_id].assigned_at
+        self.load, waiting = await self.tickets.assignment()
+        self.waiting = [(created_at, ticket_id) for ticket_id, created_at in waiting]
+        heapq.heapify(self.waiting)
+
+    @property
+    def online(self) -> List[Admin]:
+        return [admin for admin in self.admins.values() if admin.online]
+
+    def pick(self) -> Optional[Admin]:
+        """The online admin with the fewest open tickets and room for one more."""
+        candidates = [
+            admin for admin in self.online
+            if not self.max_load or self.load.get(admin.user_id, 0) < self.max_load
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda admin: (self.load.get(admin.user_id, 0), admin.assigned_at))
+
+    def owner(self, ticket: Ticket) -> Optional[Admin]:
+        return self.admins.get(ticket.assignee) if ticket.assignee is not None else None
+
+    def _count(self, admin_id: Optional[int], delta: int) -> None:
+        if admin_id is None:
+            return
+        load = self.load.get(admin_id, 0) + delta
+        if load > 0:
+            self.load[admin_id] = load
+        else:
+            self.load.pop(admin_id, None)
+
+    async def _give(self, ticket_id: int, admin: Admin, current: Optional[int] = None) -> bool:
+        # Counted up front, so concurrent picks see the admin's new load
+        self._count(current, -1)
+        self._count(admin.user_id, 1)
+        admin.assigned_at = time.time()
+        if await self.tickets.assign(ticket_id, admin.user_id, current):
+            return True
+        self._count(admin.user_id, -1)
+        self._count(current, 1)
+        return False
+
+    async def assign_new(self, ticket: Ticket) -> Optional[Admin]:
+        """Assign a just created ticket, or queue it; returns the admin."""
+        admin = self.pick()
+        if admin is not None and await self._give(ticket.id, admin):
+            ticket.assignee = admin.user_id
+            return admin
+        heapq.heappush(self.waiting, (ticket.created_at, ticket.id))
+        return None
+
+    async def claim(self, ticket: Ticket, user_id: int, full_name: str) -> Optional[Admin]:
+        """Let an admin work on a ticket; returns the online owner keeping them from it.
+
+        A ticket that is unassigned or whose owner is offline passes to the admin.
+        If another process reassigns it meanwhile, the ticket is read again
+        and its new owner is checked the same way.
+        """
+        for _ in range(CLAIM_ATTEMPTS):
+            if ticket.assignee == user_id:
+                return None
+            if ticket.assignee is not None and ticket.assignee not in self.admins:
+                # An admin this process hasn't loaded yet
+                await self.refresh()
+            owner = self.owner(ticket)
+            if owner is not None and owner.online:
+                return owner
+            admin = self.admins.get(user_id)
+            if admin is None:
+                admin = self.admins[user_id] = Admin(user_id, full_name)
+                await self._save(admin)
+            if await self._give(ticket.id, admin, ticket.assignee):
+                ticket.assignee = user_id
+                return None
+            current = await self.tickets.get(ticket.id)
+            if current is None or not current.is_open:
+                return None
+            ticket.assignee = current.assignee
+        return self.owner(ticket)
+
+    async def release(self, ticket: Ticket) -> None:
+        """A ticket was closed: its admin has room for a waiting one."""
+        self._count(ticket.assignee, -1)
+        await self._drain()
+
+    async def _drain(self) -> None:
+        """Hand waiting tickets out, longest waiting first, while someone has room."""
+        while self.waiting:
+            admin = self.pick()
+            if admin is None:
+                return
+            _, ticket_id = heapq.heappop(self.waiting)
+            # Closed or taken meanwhile
+            if not await self._give(ticket_id, admin):
+                continue
+            ticket = await self.tickets.get(ticket_id)
+            self.tickets.track(ticket_id, self.chat_id, self.sender.submit(SendMessage(
+                chat_id=self.chat_id,
+                text=ASSIGNED.render(ticket_id=ticket_id, full_name=ticket.full_name, mention=admin.mention),
+                reply_markup=get_admin_keyboard(ticket_id),
+            ), Priority.ADMIN))
+
+    async def _save(self, admin: Admin) -> None:
+        await self.db.execute(
+            "INSERT OR REPLACE INTO admins (user_id, full_name, online, updated_at) VALUES (?, ?, ?, ?)",
+            (admin.user_id, admin.full_name, int(admin.online), time.time()),
+        )
+
+    async def set_online(self, user_id: int, full_name: str, online: bool) -> int:
+        """Start or end an admin's shift; returns their open tickets.
+
+        Going offline puts the admin's tickets back in the queue for the others.
+        """
+        admin = self.admins.get(user_id) or Admin(user_id, full_name)
+        admin.full_name, admin.online = full_name, online
+        self.admins[user_id] = admin
+        await self._save(admin)
+        if not online:
+            for ticket_id, created_at in await self.tickets.unassign_all(user_id):
+                heapq.heappush(self.waiting, (created_at, ticket_id))
+            self.load.pop(user_id, None)
+        await self._drain()
+        return self.load.get(user_id, 0)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+                await self._drain()
+            except Exception:
+                logger.exception("Failed to refresh ticket assignment")
+
+    async def start(self) -> None:
+        if self.refresh_interval and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from typing import Hashable, List, Optional
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.methods import SendMessage
+
+from app.services.analytics import Analytics
+from app.services.assignment import Assigner
+from app.services.sender import Sender
+from app.services.tickets import Ticket, TicketStore
+from app.services.timers import TimingWheel
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED_TEXT = "Ваша заявка была закрыта."
+EXPIRED_TEXT = "Ваша заявка была закрыта из-за отсутствия активности."
+
+# How far back each rescan looks again, for activity that committed late
+RESCAN_MARGIN = 5.0
+
+
+class AutoCloser:
+    """Closes tickets and auto-closes them after `timeout` seconds without activity.
+
+    Each open ticket has a deadline in a timing wheel, pushed back on every
+    request or reply. The wheel is rebuilt from `tickets.updated_at` on
+    start and turned once per tick; expired tickets are checked against the
+    database (activity may have come through another worker) and closed in
+    batches of `batch_size`, one batch per `batch_interval` seconds.
+
+    Only one worker process runs the wheel, while tickets are created and
+    touched on every worker. Every `rescan_interval` seconds it arms the
+    tickets whose activity changed since the last scan.
+
+    With `timeout` 0 nothing is scheduled; `close` still serves the handlers.
+    """
+
+    def __init__(
+        self,
+        tickets: TicketStore,
+        sender: Sender,
+        storage: BaseStorage,
+        analytics: Analytics,
+        timeout: float,
+        batch_size: int = 50,
+        batch_interval: float = 1.0,
+        tick: float = 1.0,
+        assigner: Optional[Assigner] = None,
+        rescan_interval: float = 10.0,
+    ):
+        self.tickets = tickets
+        self.sender = sender
+        self.storage = storage
+        self.analytics = analytics
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.tick = tick
+        self.assigner = assigner
+        self.rescan_interval = rescan_interval
+        self._scanned = time.time()
+        self.wheel = TimingWheel(time.time(), tick)
+        self.due: List[Hashable] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def setup(self) -> None:
+        """Arm a deadline for every open ticket from its last activity."""
+        if not self.timeout:
+            return
+        self._scanned = time.time()
+        for ticket_id, updated_at in await self.tickets.open_activity():
+            self.due.extend(self.wheel.schedule(ticket_id, updated_at + self.timeout))
+
+    async def rescan(self) -> None:
+        """Arm or re-arm the tickets with activity since the last scan, from any worker."""
+        since, self._scanned = self._scanned - RESCAN_MARGIN, time.time()
+        for ticket_id, updated_at in await self.tickets.open_activity(since):
+            self.due.extend(self.wheel.schedule(ticket_id, updated_at + self.timeout))
+
+    def activity(self, ticket_id: int, now: Optional[float] = None) -> None:
+        """Push the ticket's deadline back; the caller records the activity in the database."""
+        if self.timeout:
+            self.due.extend(self.wheel.schedule(ticket_id, (now or time.time()) + self.timeout))
+
+    async def close(self, ticket: Ticket, closed_by: str, text: str = CLOSED_TEXT) -> bool:
+        """Close an open ticket, tell the user and reset their conversation.
+
+        Returns False if the ticket was already closed.
+        """
+        if not await self.tickets.close(ticket.id, closed_by):
+            return False
+        self.wheel.cancel(ticket.id)
+        self.analytics.ticket_closed(ticket.created_at)
+        if self.assigner is not None:
+            await self.assigner.release(ticket)
+        self.sender.submit(SendMessage(chat_id=ticket.user_id, text=text))
+        key = StorageKey(bot_id=self.sender.bot.id, chat_id=ticket.user_id, user_id=ticket.user_id)
+        # The user's own worker drops its cached state when it syncs with the database
+        await FSMContext(self.storage, key).clear()
+        return True
+
+    async def _expire(self, ticket_id: int, now: float) -> None:
+        ticket = await self.tickets.get(ticket_id)
+        if ticket is None or not ticket.is_open:
+            return
+        if ticket.updated_at + self.timeout > now:
+            self.due.extend(self.wheel.schedule(ticket.id, ticket.updated_at + self.timeout))
+            return
+        await self.close(ticket, "timeout", EXPIRED_TEXT)
+
+    async def _run(self) -> None:
+        rescanned = time.monotonic()
+        while True:
+            await asyncio.sleep(self.tick)
+            if self.rescan_interval and time.monotonic() - rescanned >= self.rescan_interval:
+                rescanned = time.monotonic()
+                try:
+                    await self.rescan()
+                except Exception:
+                    logger.exception("Failed to rescan ticket activity")
+            self.due.extend(self.wheel.advance(time.time()))
+            while self.due:
+                batch, self.due = self.due[:self.batch_size], self.due[self.batch_size:]
+                now = time.time()
+                for ticket_id in batch:
+                    try:
+                        await self._expire(ticket_id, now)
+                    except Exception:
+                        logger.exception("Failed to auto-close ticket %s", ticket_id)
+                if self.due:
+                    await asyncio.sleep(self.batch_interval)
+
+    async def start(self) -> None:
+        if self.timeout and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
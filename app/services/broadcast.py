@@ -0,0 +1,325 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import EditMessageText, SendMessage
+
+from app.services.files import write_atomic
+from app.services.relay import ChatId
+from app.services.sender import Priority, Sender
+from app.services.tickets import TicketStore
+
+
+logger = logging.getLogger(__name__)
+
+# Still failing after the Sender's own retries, but worth another go later
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError, TelegramRetryAfter)
+
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+
+@dataclass
+class Progress:
+    """A broadcast and how far it got; saved as the checkpoint."""
+    text: str
+    total: int
+    # Every recipient up to this user id is done
+    cursor: int = 0
+    # Recipients above the cursor that are done too
+    done: List[int] = field(default_factory=list)
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished: bool = False
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+
+def load_progress(state_file: Path) -> Optional[Progress]:
+    """The unfinished broadcast in a checkpoint file, if any."""
+    try:
+        data = json.loads(state_file.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    progress = Progress(**data)
+    return None if progress.finished else progress
+
+
+def format_progress(progress: Progress) -> str:
+    title = "✅ Рассылка завершена" if progress.finished else "📣 Рассылка"
+    return (
+        f"{title}: {progress.processed} из {progress.total}\n"
+        f"Доставлено: {progress.sent}\n"
+        f"Заблокировали бота: {progress.blocked}\n"
+        f"Ошибок: {progress.failed}"
+    )
+
+
+class StatusMessage:
+    """Progress callback keeping a status message in a chat up to date.
+
+    Edits are spaced `interval` seconds apart, the final state is always shown.
+    """
+
+    def __init__(self, sender: Sender, chat_id: ChatId, interval: float = 10.0):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.interval = interval
+        self.message_id: Optional[int] = None
+        self._text = ""
+        self._edited = 0.0
+
+    async def __call__(self, progress: Progress) -> None:
+        text = format_progress(progress)
+        now = time.monotonic()
+        if text == self._text or (not progress.finished and now - self._edited < self.interval):
+            return
+        self._text, self._edited = text, now
+        try:
+            if self.message_id is None:
+                message = await self.sender.submit(SendMessage(chat_id=self.chat_id, text=text), Priority.ADMIN)
+                self.message_id = message.message_id
+            else:
+                await self.sender.submit(EditMessageText(
+                    chat_id=self.chat_id, message_id=self.message_id, text=text
+                ), Priority.ADMIN)
+        except Exception as e:
+            logger.warning("Failed to update broadcast status: %r", e)
+
+
+class Broadcaster:
+    """Sends a message to every user with an open ticket.
+
+    Recipients are streamed from the ticket store in user id order to a
+    pool of `workers`. Sends go through the Sender in the bulk lane, so they
+    share the global rate limit and live traffic goes first. A recipient
+    still failing with a network or server error is retried `retries` times;
+    users who blocked the bot are recorded and left out of later broadcasts.
+
+    Progress is checkpointed to `state_file` every `checkpoint_interval`
+    seconds; an interrupted broadcast resumes from there, sending again to
+    no more than the recipients in flight at the crash.
+
+    Any worker can stop a broadcast for good: it records the broadcast's
+    start time in a stop file next to the state file, which the worker
+    running it checks before every page of recipients and checkpoint.
+    """
+
+    def __init__(
+        self,
+        tickets: TicketStore,
+        sender: Sender,
+        state_file: Path,
+        status_chat_id: Optional[ChatId] = None,
+        workers: int = 16,
+        retries: int = 3,
+        checkpoint_interval: float = 1.0,
+        page_size: int = 500,
+    ):
+        self.tickets = tickets
+        self.sender = sender
+        self.state_file = state_file
+        self.status_chat_id = status_chat_id
+        self.workers = workers
+        self.retries = retries
+        self.checkpoint_interval = checkpoint_interval
+        self.page_size = page_size
+        self.stop_file = state_file.with_suffix(".stop")
+        self.progress: Optional[Progress] = None
+        self._task: Optional[asyncio.Task] = None
+        self._saving: Optional[asyncio.Future] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # -- checkpoints ----------------------------------------------------
+
+    def _stopped_at(self) -> Optional[float]:
+        """Start time of the broadcast stopped last."""
+        try:
+            return json.loads(self.stop_file.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def load(self) -> Optional[Progress]:
+        progress = load_progress(self.state_file)
+        if progress is not None and progress.started_at == self._stopped_at():
+            return None
+        return progress
+
+    def _save(self, data: Dict) -> None:
+        write_atomic(self.state_file, json.dumps(data, ensure_ascii=False))
+
+    def _discard(self, progress: Progress) -> None:
+        # Unless a newer broadcast has replaced it
+        current = load_progress(self.state_file)
+        if current is not None and current.started_at == progress.started_at:
+            self.state_file.unlink(missing_ok=True)
+
+    async def _checkpoint(self, progress: Progress, issued: Dict[int, bool]) -> None:
+        # Recipients are issued in id order: the cursor moves over the done ones in front
+        while issued:
+            first = next(iter(issued))
+            if not issued[first]:
+                break
+            del issued[first]
+            progress.cursor = first
+        progress.done = [user_id for user_id, done in issued.items() if done]
+        # A cancelled checkpoint's save goes on in its thread: let it land first
+        if self._saving is not None:
+            await asyncio.wait([self._saving])
+        self._saving = asyncio.ensure_future(asyncio.to_thread(self._save, asdict(progress)))
+        await asyncio.shield(self._saving)
+
+    # -- sending --------------------------------------------------------
+
+    async def _deliver(self, user_id: int, text: str) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                await self.sender.submit(SendMessage(chat_id=user_id, text=text), Priority.BULK)
+                return SENT
+            except TelegramForbiddenError:
+                await self.tickets.mark_blocked(user_id)
+                return BLOCKED
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    logger.warning("Broadcast to %s failed after %s attempts: %r", user_id, attempt + 1, e)
+                    return FAILED
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except Exception as e:
+                logger.warning("Broadcast to %s failed: %r", user_id, e)
+                return FAILED
+        return FAILED
+
+    async def run(
+        self,
+        progress: Progress,
+        on_progress: Optional[Callable[[Progress], Awaitable[None]]] = None,
+    ) -> Progress:
+        """Send the broadcast from its cursor on; saves a checkpoint when cancelled too."""
+        queue: asyncio.Queue = asyncio.Queue(self.workers * 2)
+        # Issued recipients in id order -> done
+        issued: Dict[int, bool] = {}
+        skip = set(progress.done)
+        stopped = asyncio.Event()
+
+        async def halted() -> bool:
+            if await asyncio.to_thread(self._stopped_at) == progress.started_at:
+                stopped.set()
+            return stopped.is_set()
+
+        async def produce() -> None:
+            after = progress.cursor
+            while not await halted():
+                users = await self.tickets.open_users(after, self.page_size)
+                if not users:
+                    break
+                for user_id in users:
+                    # Done before the restart
+                    issued[user_id] = user_id in skip
+                    if not issued[user_id]:
+                        await queue.put(user_id)
+                after = users[-1]
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def work() -> None:
+            while True:
+                user_id = await queue.get()
+                if user_id is None:
+                    return
+                if stopped.is_set():
+                    continue
+                outcome = await self._deliver(user_id, progress.text)
+                setattr(progress, outcome, getattr(progress, outcome) + 1)
+                issued[user_id] = True
+
+        async def report() -> None:
+            while True:
+                await asyncio.sleep(self.checkpoint_interval)
+                if await halted():
+                    return
+                await self._checkpoint(progress, issued)
+                if on_progress is not None:
+                    await on_progress(progress)
+
+        self.progress = progress
+        reporter = asyncio.create_task(report())
+        try:
+            await asyncio.gather(produce(), *(work() for _ in range(self.workers)))
+            progress.finished = not stopped.is_set()
+        finally:
+            reporter.cancel()
+            if stopped.is_set():
+                if self._saving is not None:
+                    await asyncio.wait([self._saving])
+                await asyncio.to_thread(self._discard, progress)
+            else:
+                await self._checkpoint(progress, issued)
+        if stopped.is_set():
+            logger.info("Broadcast stopped at %s of %s", progress.processed, progress.total)
+            return progress
+        if on_progress is not None:
+            await on_progress(progress)
+        logger.info(
+            "Broadcast finished: %s sent, %s blocked, %s failed in %.0fs",
+            progress.sent, progress.blocked, progress.failed, time.time() - progress.started_at,
+        )
+        return progress
+
+    # -- lifecycle ------------------------------------------------------
+
+    def _spawn(self, progress: Progress) -> Progress:
+        status = StatusMessage(self.sender, self.status_chat_id) if self.status_chat_id is not None else None
+        self._task = asyncio.create_task(self.run(progress, status))
+        self._task.add_done_callback(_log_failure)
+        return progress
+
+    async def start(self, text: str) -> Progress:
+        """Start a new broadcast in the background."""
+        progress = Progress(text=text, total=await self.tickets.count_open_users())
+        await asyncio.to_thread(self._save, asdict(progress))
+        return self._spawn(progress)
+
+    async def resume(self) -> Optional[Progress]:
+        """Continue the broadcast left unfinished by the last run, if any."""
+        progress = await asyncio.to_thread(self.load)
+        if progress is None or self.running:
+            return None
+        logger.info("Resuming broadcast at %s of %s", progress.processed, progress.total)
+        return self._spawn(progress)
+
+    async def stop(self, discard: bool = False) -> None:
+        """Stop the running broadcast; it resumes on the next start unless discarded.
+
+        Discarding stops it on whichever worker is running it.
+        """
+        if discard:
+            progress = await asyncio.to_thread(self.load)
+            if progress is not None:
+                await asyncio.to_thread(write_atomic, self.stop_file, json.dumps(progress.started_at))
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if discard and progress is not None:
+            await asyncio.to_thread(self._discard, progress)
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Broadcast failed: %r", task.exception())
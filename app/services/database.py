@@ -0,0 +1,67 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Sequence, TypeVar
+
+
+T = TypeVar("T")
+
+
+class Database:
+    """SQLite connection in WAL mode, used from one dedicated worker thread.
+
+    All queries go through `run`, so the event loop never blocks on disk and
+    the connection is never shared between threads.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def connect(self) -> None:
+        if self._conn is None:
+            loop = asyncio.get_running_loop()
+            self._conn = await loop.run_in_executor(self._executor, self._connect)
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run `fn(connection, *args)` in the database thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, self._conn, *args)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Execute a statement, commit and return the last row id."""
+        def _execute(conn: sqlite3.Connection) -> int:
+            with conn:
+                return conn.execute(sql, params).lastrowid
+        return await self.run(_execute)
+
+    async def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        def _executemany(conn: sqlite3.Connection) -> None:
+            with conn:
+                conn.executemany(sql, rows)
+        await self.run(_executemany)
+
+    async def executescript(self, script: str) -> None:
+        await self.run(lambda conn: conn.executescript(script))
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self.run(lambda conn: conn.close())
+            self._conn = None
+        self._executor.shutdown(wait=True)
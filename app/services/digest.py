@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram.methods import SendAudio, SendDocument, SendMediaGroup, SendMessage, SendPhoto, SendVideo, TelegramMethod
+from aiogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, Message
+
+from app.services.files import append_lines, read_lines, write_lines
+from app.services.outbox import Outbox
+from app.services.relay import CAPTION_LIMIT, TEXT_LIMIT, ChatId
+from app.services.sender import Priority
+
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n➖➖➖\n\n"
+
+# Content types that can be packed into albums, by the kind of album they can share
+ALBUM_KINDS = {"photo": "visual", "video": "visual", "document": "document", "audio": "audio"}
+
+INPUT_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio,
+}
+
+# A lone item can't be a media group
+SEND_ONE = {"photo": SendPhoto, "video": SendVideo, "document": SendDocument, "audio": SendAudio}
+
+
+def _file_id(message: Message) -> str:
+    if message.photo:
+        return message.photo[-1].file_id
+    return getattr(message, message.content_type).file_id
+
+
+def pack_texts(texts: List[str], limit: int = TEXT_LIMIT) -> List[str]:
+    """Join texts into as few messages of at most `limit` characters as possible, in order."""
+    packs: List[str] = []
+    current = ""
+    for text in texts:
+        if current and len(current) + len(SEPARATOR) + len(text) <= limit:
+            current += SEPARATOR + text
+            continue
+        if current:
+            packs.append(current)
+        current = text
+    if current:
+        packs.append(current)
+    return packs
+
+
+class FeedbackDigest:
+    """Buffers feedback and posts it to the feedback chat packed into few messages.
+
+    Texts are joined into messages of up to 4096 characters; photos, videos,
+    documents and audio go out as albums of up to `album_size`. Entries are
+    fsynced to a JSON lines file before `add` returns, so the user is only
+    thanked once the feedback is safe. Whole messages and albums are handed
+    to the outbox as soon as they fill up; whatever is left goes out
+    `max_delay` seconds after the oldest buffered entry.
+
+    Before a batch is handed to the outbox its key and entry ids are
+    appended to the file. A restart between that and the file rewrite sends
+    the same batch again under the same key, which the outbox skips, rather
+    than regrouping its entries into new messages.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        outbox: Outbox,
+        chat_id: ChatId,
+        max_delay: float = 300.0,
+        text_limit: int = TEXT_LIMIT,
+        album_size: int = 10,
+    ):
+        self.path = path
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.max_delay = max_delay
+        self.text_limit = text_limit
+        self.album_size = album_size
+
+        self.entries: List[Dict[str, Any]] = []
+        self._text_size = 0
+        self._album_sizes: Dict[str, int] = {}
+        self._last_id = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="digest")
+
+    @property
+    def pending(self) -> int:
+        return len(self.entries)
+
+    # -- buffer file ----------------------------------------------------
+
+    def _append(self, lines: List[str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            append_lines(f, lines)
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # -- entries --------------------------------------------------------
+
+    def _next_id(self) -> int:
+        self._last_id = max(time.time_ns(), self._last_id + 1)
+        return self._last_id
+
+    def collect(self, messages: List[Message], compose: Callable[[str], str]) -> Optional[List[Dict[str, Any]]]:
+        """Turn feedback into digest entries, or None if it has to be sent on its own."""
+        album = sorted(messages, key=lambda m: m.message_id)
+        first = album[0]
+        if len(album) == 1 and first.text is not None:
+            text = compose(first.html_text)
+            if len(text) > self.text_limit:
+                return None
+            return [{"id": self._next_id(), "type": "text", "text": text}]
+
+        kinds = {ALBUM_KINDS.get(message.content_type) for message in album}
+        if len(kinds) != 1 or None in kinds:
+            return None
+        caption = compose(next((m.html_text for m in album if m.caption), ""))
+        if len(caption) > CAPTION_LIMIT:
+            return None
+        return [
+            {
+                "id": self._next_id(),
+                "type": message.content_type,
+                "file_id": _file_id(message),
+                "caption": caption if i == 0 else None,
+            }
+            for i, message in enumerate(album)
+        ]
+
+    def _remember(self, entries: List[Dict[str, Any]]) -> None:
+        for entry in entries:
+            self.entries.append(entry)
+            if entry["type"] == "text":
+                self._text_size += len(entry["text"]) + len(SEPARATOR)
+            else:
+                kind = ALBUM_KINDS[entry["type"]]
+                self._album_sizes[kind] = self._album_sizes.get(kind, 0) + 1
+
+    def _full(self) -> bool:
+        return self._text_size > self.text_limit or any(
+            size >= self.album_size for size in self._album_sizes.values()
+        )
+
+    def _complete(self) -> List[Dict[str, Any]]:
+        """Entries filling whole messages and albums; the rest waits for more."""
+        texts = [entry for entry in self.entries if entry["type"] == "text"]
+        # Texts from the start of the last message on, as `pack_texts` packs them, wait
+        start, size = 0, 0
+        for i, entry in enumerate(texts):
+            if size and size + len(SEPARATOR) + len(entry["text"]) > self.text_limit:
+                start, size = i, len(entry["text"])
+            else:
+                size += (len(SEPARATOR) if size else 0) + len(entry["text"])
+        taken = {entry["id"] for entry in texts[:start]}
+
+        full = {kind: count - count % self.album_size for kind, count in self._album_sizes.items()}
+        for entry in self.entries:
+            kind = ALBUM_KINDS.get(entry["type"])
+            if kind is not None and full[kind]:
+                full[kind] -= 1
+                taken.add(entry["id"])
+        return [entry for entry in self.entries if entry["id"] in taken]
+
+    async def add(self, entries: List[Dict[str, Any]]) -> None:
+        """Buffer entries from `collect`; returns once they are on disk."""
+        # In memory first: a flush rewriting the file meanwhile keeps them
+        self._remember(entries)
+        await self._run(self._append, [json.dumps(entry, ensure_ascii=False) for entry in entries])
+        if self._full():
+            await self.flush(complete_only=True)
+        if self.entries and self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to flush feedback digest")
+
+    # -- flushing -------------------------------------------------------
+
+    def build(self, entries: List[Dict[str, Any]]) -> List[TelegramMethod]:
+        """Pack entries into messages and albums."""
+        methods: List[TelegramMethod] = [
+            SendMessage(chat_id=self.chat_id, text=text)
+            for text in pack_texts([e["text"] for e in entries if e["type"] == "text"], self.text_limit)
+        ]
+
+        albums: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            if entry["type"] != "text":
+                albums.setdefault(ALBUM_KINDS[entry["type"]], []).append(entry)
+        for items in albums.values():
+            for start in range(0, len(items), self.album_size):
+                chunk = items[start:start + self.album_size]
+                if len(chunk) == 1:
+                    item = chunk[0]
+                    methods.append(SEND_ONE[item["type"]](
+                        chat_id=self.chat_id, caption=item["caption"], **{item["type"]: item["file_id"]}
+                    ))
+                else:
+                    methods.append(SendMediaGroup(chat_id=self.chat_id, media=[
+                        INPUT_MEDIA[item["type"]](media=item["file_id"], caption=item["caption"])
+                        for item in chunk
+                    ]))
+        return methods
+
+    async def flush(self, complete_only: bool = False) -> None:
+        """Hand buffered entries to the outbox and drop them from the buffer file.
+
+        With `complete_only` only whole messages and albums go out.
+        """
+        async with self._lock:
+            if not complete_only:
+                if self._timer is not None and self._timer is not asyncio.current_task():
+                    self._timer.cancel()
+                self._timer = None
+            entries = self._complete() if complete_only else self.entries
+            if not entries:
+                return
+
+            key = f"digest:{entries[0]['id']}:{entries[-1]['id']}:{len(entries)}"
+            batch = {"batch": key, "ids": [entry["id"] for entry in entries]}
+            await self._run(self._append, [json.dumps(batch)])
+            await self._submit(key, entries)
+
+    async def _submit(self, key: str, entries: List[Dict[str, Any]]) -> None:
+        """Hand a recorded batch to the outbox and drop its entries from the buffer file."""
+        taken = {entry["id"] for entry in entries}
+        kept = [entry for entry in self.entries if entry["id"] not in taken]
+        self.entries, self._text_size, self._album_sizes = [], 0, {}
+        self._remember(kept)
+        await self.outbox.submit(key, self.build(entries), Priority.ADMIN)
+        await self._run(write_lines, self.path, [json.dumps(entry, ensure_ascii=False) for entry in self.entries])
+
+    # -- lifecycle ------------------------------------------------------
+
+    async def start(self) -> None:
+        """Load entries left from the last run and schedule their flush."""
+        records = await self._run(lambda: list(read_lines(self.path)))
+        entries = [record for record in records if "batch" not in record]
+        if not entries:
+            return
+        logger.info("Loaded %s buffered feedback entries", len(entries))
+        self._last_id = max(entry["id"] for entry in entries)
+        self._remember(entries)
+        # Batches recorded before a crash go out as they were grouped
+        for record in records:
+            if "batch" in record:
+                ids = set(record["ids"])
+                batch = [entry for entry in self.entries if entry["id"] in ids]
+                if batch:
+                    async with self._lock:
+                        await self._submit(record["batch"], batch)
+        if self.entries:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def close(self) -> None:
+        """Flush what's buffered; the outbox delivers or replays it."""
+        try:
+            await self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+
+from app.services.database import Database
+
+
+# Each query pages by id: rows after the given id, in id order
+QUERIES = {
+    "tickets": (
+        "SELECT t.id, t.user_id, t.full_name, t.username, t.status, t.created_at, t.updated_at, "
+        "t.closed_at, t.closed_by, t.first_reply_at, "
+        "(SELECT group_concat(e.body, char(10)) FROM entries e WHERE e.ticket_id = t.id AND e.kind = 'request'), "
+        "(SELECT COUNT(*) FROM entries e WHERE e.ticket_id = t.id AND e.kind = 'reply') "
+        "FROM tickets t WHERE t.id > ? ORDER BY t.id LIMIT ?"
+    ),
+    "feedback": (
+        "SELECT id, user_id, full_name, created_at, body "
+        "FROM entries WHERE kind = 'feedback' AND id > ? ORDER BY id LIMIT ?"
+    ),
+}
+
+FIELDS = {
+    "tickets": [
+        "id", "user_id", "full_name", "username", "status", "created_at", "updated_at",
+        "closed_at", "closed_by", "first_reply_at", "request", "replies",
+    ],
+    "feedback": ["id", "user_id", "full_name", "created_at", "body"],
+}
+
+TIME_FIELDS = {"created_at", "updated_at", "closed_at", "first_reply_at"}
+
+FORMATS = ("jsonl", "csv")
+
+# Lines are written to the file in blocks of about this size
+WRITE_BUFFER = 64 * 1024
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat(timespec="seconds")
+
+
+async def iter_rows(db: Database, sql: str, batch: int = 500) -> AsyncIterator[tuple]:
+    """Yield rows of a keyset-paged query, `batch` rows per round trip."""
+    last_id = 0
+    while True:
+        rows = await db.fetchall(sql, (last_id, batch))
+        for row in rows:
+            yield row
+        if len(rows) < batch:
+            return
+        last_id = rows[-1][0]
+
+
+async def iter_records(db: Database, kind: str, batch: int = 500) -> AsyncIterator[Dict[str, Any]]:
+    fields = FIELDS[kind]
+    async for row in iter_rows(db, QUERIES[kind], batch):
+        record = dict(zip(fields, row))
+        for field in TIME_FIELDS.intersection(record):
+            record[field] = _timestamp(record[field])
+        yield record
+
+
+def line_encoder(fmt: str, fields: List[str]) -> Tuple[str, Callable[[Dict[str, Any]], str]]:
+    """Return the header line (empty for JSONL) and a function encoding one record."""
+    if fmt == "jsonl":
+        return "", lambda record: json.dumps(record, ensure_ascii=False) + "\n"
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(values) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    return encode(fields), lambda record: encode(record[field] for field in fields)
+
+
+async def write_chunks(
+    lines: AsyncIterator[str],
+    path: Path,
+    chunk_size: int = 0,
+    header: str = "",
+) -> List[Path]:
+    """Write lines to `path`, starting a new part each `chunk_size` bytes.
+
+    Every part starts with the header, so each can be read on its own. Parts
+    are named `name-1.ext`, `name-2.ext`...; a single part keeps `path`.
+    """
+    header_size = len(header.encode())
+    parts: List[Path] = []
+    file = None
+    size = 0
+    pending: List[str] = []
+    pending_size = 0
+
+    async def open_part() -> None:
+        nonlocal file, size
+        part = path.with_name(f"{path.stem}-{len(parts) + 1}{path.suffix}")
+        parts.append(part)
+        file = await aiofiles.open(part, "w", encoding="utf-8", newline="")
+        size = header_size
+        if header:
+            await file.write(header)
+
+    async def flush() -> None:
+        nonlocal pending_size
+        if pending:
+            await file.write("".join(pending))
+            pending.clear()
+            pending_size = 0
+
+    try:
+        await open_part()
+        async for line in lines:
+            line_size = len(line.encode())
+            if chunk_size and size + line_size > chunk_size and size > header_size:
+                await flush()
+                await file.close()
+                await open_part()
+            pending.append(line)
+            pending_size += line_size
+            size += line_size
+            if pending_size >= WRITE_BUFFER:
+                await flush()
+        await flush()
+    finally:
+        if file is not None:
+            await file.close()
+
+    if len(parts) == 1:
+        await aiofiles.os.replace(parts[0], path)
+        parts[0] = path
+    return parts
+
+
+class Exporter:
+    """Streams tickets or feedback from the database to JSONL or CSV files.
+
+    Rows are fetched in small keyset-paged batches and pass through a chain
+    of async generators to the file, so memory use doesn't depend on the
+    size of the export.
+    """
+
+    def __init__(self, db: Database, chunk_size: int = 0, batch: int = 500):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.batch = batch
+
+    async def export(self, kind: str, fmt: str, directory: Path) -> List[Path]:
+        """Export `kind` ("tickets" or "feedback") as `fmt`; return the written parts."""
+        if kind not in QUERIES:
+            raise ValueError(f"Unknown export: {kind}")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+
+        header, encode = line_encoder(fmt, FIELDS[kind])
+
+        async def lines() -> AsyncIterator[str]:
+            async for record in iter_records(self.db, kind, self.batch):
+                yield encode(record)
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = Path(directory) / f"{kind}-{stamp}.{fmt}"
+        return await write_chunks(lines(), path, self.chunk_size, header)
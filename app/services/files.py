@@ -0,0 +1,48 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, Iterator
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Replace `path` with `text`: readers see the old or the new file, never a part.
+
+    The temporary file is per process and thread, so concurrent saves of the
+    same file don't clobber each other's half-written copy, and is fsynced
+    before the rename.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_lines(path: Path, lines: Iterable[str]) -> None:
+    """Atomically replace a JSON lines file."""
+    write_atomic(path, "".join(line + "\n" for line in lines))
+
+
+def append_lines(f: IO[str], lines: Iterable[str]) -> None:
+    """Append lines to an open file and fsync it."""
+    f.write("".join(line + "\n" for line in lines))
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def read_lines(path: Path) -> Iterator[Dict[str, Any]]:
+    """Records of a JSON lines file; nothing if it doesn't exist."""
+    try:
+        f = path.open(encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Torn write at the tail after a crash
+                continue
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from app.services.files import write_atomic
+
+
+# Bad requests that mean the cached file_id itself is no good
+FILE_ID_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "wrong file_id",
+    "file_id_invalid",
+    "file reference expired",
+    "file_reference_expired",
+    "media_empty",
+)
+
+
+def is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = error.message.lower()
+    return any(fragment in message for fragment in FILE_ID_ERRORS)
+
+
+class MediaCache:
+    """Cache of Telegram file_ids for local media files.
+
+    Each file is uploaded once; the returned file_id is stored under the
+    file's relative path plus content hash and saved to disk, so restarts
+    reuse it and an edited file is uploaded again.
+    """
+
+    def __init__(self, root: Path, cache_file: Path):
+        self.root = root
+        self.cache_file = cache_file
+        self._file_ids: Dict[str, str] = {}
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = asyncio.Lock()
+
+    def load(self) -> None:
+        """Load saved file_ids from disk."""
+        try:
+            self._file_ids = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self._file_ids = {}
+
+    def _save(self) -> None:
+        write_atomic(self.cache_file, json.dumps(self._file_ids, ensure_ascii=False))
+
+    def _key(self, name: str) -> str:
+        """Return cache key for a file, rehashing only when it changed on disk."""
+        stat = (self.root / name).stat()
+        cached = self._digests.get(name)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            digest = cached[2]
+        else:
+            digest = hashlib.sha256((self.root / name).read_bytes()).hexdigest()
+            self._digests[name] = (stat.st_mtime_ns, stat.st_size, digest)
+        return f"{name}:{digest}"
+
+    def _forget(self, key: str) -> None:
+        if self._file_ids.pop(key, None) is not None:
+            self._save()
+
+    async def answer_photo(self, message: Message, name: str, **kwargs) -> Message:
+        """Answer with a photo from the media directory, uploading it only once."""
+        key = self._key(name)
+        file_id: Optional[str] = self._file_ids.get(key)
+        if file_id:
+            try:
+                return await message.answer_photo(photo=file_id, **kwargs)
+            except TelegramBadRequest as e:
+                # Other bad requests would fail the same with a fresh upload
+                if not is_file_id_error(e):
+                    raise
+                self._forget(key)
+
+        async with self._lock:
+            # Another request may have uploaded the file while we waited
+            file_id = self._file_ids.get(key)
+            if file_id:
+                return await message.answer_photo(photo=file_id, **kwargs)
+
+            sent = await message.answer_photo(photo=FSInputFile(self.root / name), **kwargs)
+            self._file_ids = {k: v for k, v in self._file_ids.items() if not k.startswith(f"{name}:")}
+            self._file_ids[key] = sent.photo[-1].file_id
+            self._save()
+            return sent
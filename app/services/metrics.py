@@ -0,0 +1,178 @@
+import bisect
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from aiohttp import web
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + value
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    """Histogram with fixed buckets; observe is a bisect and two increments."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, row in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {row[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+UPDATES = registry.counter(
+    "bot_updates_total", "Handled updates", ("event", "handler", "state", "outcome")
+)
+HANDLER_LATENCY = registry.histogram(
+    "bot_handler_seconds", "Update handling latency", ("event", "handler")
+)
+API_LATENCY = registry.histogram(
+    "bot_api_seconds", "Telegram Bot API request latency", ("method",)
+)
+API_ERRORS = registry.counter(
+    "bot_api_errors_total", "Failed Telegram Bot API requests", ("method", "error")
+)
+API_RETRIES = registry.counter(
+    "bot_api_retries_total", "Requests retried by the outbound sender", ("method", "reason")
+)
+UPDATE_WAIT = registry.histogram(
+    "bot_update_wait_seconds", "Time updates wait in their chat queue"
+)
+THROTTLED = registry.counter(
+    "bot_throttled_total", "Messages dropped by flood control", ("reason",)
+)
+ALBUM_SIZE = registry.histogram(
+    "bot_album_size", "Parts of collected albums", buckets=tuple(range(1, 11))
+)
+ALBUM_DELAY = registry.histogram(
+    "bot_album_flush_seconds", "Time from an album's first part to passing it on",
+    buckets=(0.05, 0.1, 0.2, 0.5, 1.0),
+)
+LOOP_LAG = registry.histogram(
+    "bot_loop_lag_seconds", "How late the event loop runs a timer"
+)
+LOOP_STALLS = registry.counter(
+    "bot_loop_stalls_total", "Times the event loop was blocked over the threshold"
+)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+def setup_metrics_routes(app: web.Application, path: str = "/metrics") -> None:
+    app.router.add_get(path, _handle_metrics)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve /metrics on a separate local HTTP server."""
+    app = web.Application()
+    setup_metrics_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
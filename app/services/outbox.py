@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import methods
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+from aiogram.methods import TelegramMethod
+
+from app.services.files import append_lines, read_lines, write_lines
+from app.services.sender import Priority, Sender
+
+
+logger = logging.getLogger(__name__)
+
+# Errors retrying won't fix
+PERMANENT_ERRORS = (TelegramBadRequest, TelegramForbiddenError, TelegramNotFound)
+
+METHODS = {
+    cls.__api_method__: cls
+    for cls in vars(methods).values()
+    if isinstance(cls, type) and issubclass(cls, TelegramMethod) and hasattr(cls, "__api_method__")
+}
+
+DeliveredHook = Callable[[Dict[str, Any], TelegramMethod, Any], Awaitable[None]]
+
+
+def _prune(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _prune(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_prune(v) for v in value]
+    return value
+
+
+def dump_method(method: TelegramMethod) -> Dict[str, Any]:
+    """Serialize a method to JSON; bot defaults like parse_mode are left to be applied on send."""
+    params = method.model_dump(mode="json", exclude_none=True, fallback=lambda value: None)
+    return {"method": method.__api_method__, "params": _prune(params)}
+
+
+def load_method(data: Dict[str, Any]) -> TelegramMethod:
+    return METHODS[data["method"]].model_validate(data["params"])
+
+
+def message_key(messages: List[Any]) -> str:
+    """Idempotency key of a relay: the first source message, so a redelivered update is recognized."""
+    first = min(messages, key=lambda m: m.message_id)
+    return f"{first.chat.id}:{first.message_id}"
+
+
+@dataclass
+class _Entry:
+    key: str
+    payload: List[Dict[str, Any]]
+    priority: int
+    meta: Dict[str, Any]
+    sent: int = 0
+    attempts: int = 0
+    futures: List[asyncio.Future] = field(default_factory=list)
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "op": "add",
+            "key": self.key,
+            "priority": self.priority,
+            "meta": self.meta,
+            "sent": self.sent,
+            "methods": self.payload,
+        }
+
+
+class Outbox:
+    """Write-ahead log of relayed messages.
+
+    `submit` appends the methods to an append-only file and returns once the
+    record is fsynced, so the user is only told "sent" when the relay
+    survives a crash. Delivery runs in the background through the Sender
+    and is retried with exponential backoff until it succeeds or fails for
+    good; pending records are replayed on startup. Records carry an
+    idempotency key, a repeated key is ignored.
+
+    Records appended while an fsync is running go out together with the next
+    one, so concurrent submits share fsyncs.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sender: Sender,
+        on_delivered: Optional[DeliveredHook] = None,
+        max_backoff: float = 300.0,
+        remember: int = 10000,
+        compact_every: int = 10000,
+    ):
+        self.path = path
+        self.sender = sender
+        self.on_delivered = on_delivered
+        self.max_backoff = max_backoff
+        self.remember = remember
+        self.compact_every = compact_every
+
+        self._pending: Dict[str, _Entry] = {}
+        self._done: "OrderedDict[str, None]" = OrderedDict()
+        self._buffer: List[str] = []
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup = asyncio.Event()
+        self._records = 0
+        self._file = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._writer: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # -- log ------------------------------------------------------------
+
+    def _load(self) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        records: Dict[str, Dict[str, Any]] = {}
+        done: "OrderedDict[str, None]" = OrderedDict()
+        for record in read_lines(self.path):
+            key = record["key"]
+            if record["op"] == "add":
+                records[key] = record
+            elif record["op"] == "sent" and key in records:
+                records[key]["sent"] = record["sent"]
+            elif record["op"] == "done":
+                records.pop(key, None)
+                done[key] = None
+                done.move_to_end(key)
+        return records, list(done)[-self.remember:]
+
+    def _rewrite(self, lines: List[str]) -> None:
+        """Replace the log with a compacted one."""
+        write_lines(self.path, lines)
+        if self._file is not None:
+            self._file.close()
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def _write(self, lines: List[str]) -> None:
+        append_lines(self._file, lines)
+
+    def _snapshot(self) -> List[str]:
+        lines = [json.dumps({"op": "done", "key": key}) for key in self._done]
+        lines.extend(json.dumps(entry.record(), ensure_ascii=False) for entry in self._pending.values())
+        return lines
+
+    def _append(self, record: Dict[str, Any]) -> asyncio.Future:
+        """Queue a record for the next fsync; the future resolves once it's on disk."""
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append(json.dumps(record, ensure_ascii=False))
+        self._waiters.append(future)
+        self._wakeup.set()
+        return future
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._buffer:
+                continue
+            lines, waiters = self._buffer, self._waiters
+            self._buffer, self._waiters = [], []
+            try:
+                await loop.run_in_executor(self._executor, self._write, lines)
+            except OSError as e:
+                logger.error("Outbox write failed: %r", e)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                continue
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+            self._records += len(lines)
+            if self._records >= self.compact_every:
+                self._records = len(self._pending) + len(self._done)
+                await loop.run_in_executor(self._executor, self._rewrite, self._snapshot())
+
+    # -- delivery -------------------------------------------------------
+
+    async def submit(
+        self,
+        key: str,
+        methods: List[TelegramMethod],
+        priority: Priority = Priority.USER,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> List[asyncio.Future]:
+        """Log methods under an idempotency key and queue them for delivery in order.
+
+        Returns once the record is durable, with a future per method resolved
+        by its result. A key seen before returns no futures and sends nothing.
+        """
+        if key in self._pending or key in self._done:
+            logger.info("Outbox entry %s already recorded, skipping", key)
+            return []
+
+        entry = _Entry(key=key, payload=[dump_method(m) for m in methods], priority=int(priority), meta=meta or {})
+        entry.futures = [_future() for _ in methods]
+        self._pending[key] = entry
+        try:
+            await self._append(entry.record())
+        except OSError:
+            del self._pending[key]
+            raise
+        self._deliver(entry, methods)
+        return list(entry.futures)
+
+    def _deliver(self, entry: _Entry, methods: List[TelegramMethod]) -> None:
+        task = asyncio.create_task(self._run(entry, methods))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, entry: _Entry, methods: List[TelegramMethod]) -> None:
+        while entry.sent < len(methods):
+            method = methods[entry.sent]
+            try:
+                result = await self.sender.submit(method, Priority(entry.priority))
+            except PERMANENT_ERRORS as e:
+                logger.error("Dropping outbox entry %s: %s", entry.key, e)
+                for future in entry.futures[entry.sent:]:
+                    if not future.done():
+                        future.set_exception(e)
+                break
+            except Exception as e:
+                entry.attempts += 1
+                delay = min(self.max_backoff, 2.0 ** entry.attempts)
+                logger.warning("Outbox entry %s failed (%r), retrying in %ss", entry.key, e, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            entry.attempts = 0
+            entry.sent += 1
+            future = entry.futures[entry.sent - 1]
+            if not future.done():
+                future.set_result(result)
+            if self.on_delivered is not None:
+                try:
+                    await self.on_delivered(entry.meta, method, result)
+                except Exception:
+                    logger.exception("Outbox delivery hook failed for %s", entry.key)
+            if entry.sent < len(methods):
+                self._append({"op": "sent", "key": entry.key, "sent": entry.sent})
+
+        del self._pending[entry.key]
+        self._done[entry.key] = None
+        while len(self._done) > self.remember:
+            self._done.popitem(last=False)
+        self._append({"op": "done", "key": entry.key})
+
+    # -- lifecycle ------------------------------------------------------
+
+    async def start(self) -> None:
+        """Load the log, compact it and replay entries that weren't delivered."""
+        loop = asyncio.get_running_loop()
+        records, done = await loop.run_in_executor(self._executor, self._load)
+        self._done = OrderedDict.fromkeys(done)
+        for key, record in records.items():
+            self._pending[key] = _Entry(
+                key=key,
+                payload=record["methods"],
+                priority=record["priority"],
+                meta=record["meta"],
+                sent=record["sent"],
+            )
+        await loop.run_in_executor(self._executor, self._rewrite, self._snapshot())
+        self._records = len(self._pending) + len(self._done)
+        self._writer = asyncio.create_task(self._write_loop())
+
+        if self._pending:
+            logger.info("Replaying %s outbox entries", len(self._pending))
+        for entry in self._pending.values():
+            entry.futures = [_future() for _ in entry.payload]
+            self._deliver(entry, [load_method(data) for data in entry.payload])
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Give deliveries a moment to finish, then flush the log.
+
+        Undelivered entries stay in the log and are replayed on the next start.
+        """
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+        for task in list(self._tasks):
+            task.cancel()
+        if self._writer is not None:
+            while self._buffer:
+                self._wakeup.set()
+                await asyncio.sleep(0.01)
+            self._writer.cancel()
+            self._writer = None
+        # A cancelled writer may still have a write running in the executor
+        self._executor.shutdown(wait=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _future() -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    # Results are optional for callers; don't warn about unretrieved failures
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return future
@@ -0,0 +1,126 @@
+import asyncio
+from typing import Callable, List, Optional, Union
+
+from aiogram.methods import CopyMessage, CopyMessages, SendMediaGroup, SendMessage, TelegramMethod
+from aiogram.types import (
+    InlineKeyboardMarkup,
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
+    Message,
+)
+
+from app.services.sender import Priority, Sender
+
+
+TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+# Content types that can carry a caption when copied
+CAPTIONED = {"photo", "video", "document", "audio", "voice", "animation"}
+
+ChatId = Union[int, str]
+
+
+def _input_media(message: Message, caption: Optional[str] = None):
+    """Build InputMedia for an album part; keeps the part's own caption unless one is given."""
+    if caption is None:
+        options = {"caption": message.caption, "caption_entities": message.caption_entities, "parse_mode": None}
+    else:
+        options = {"caption": caption}
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id, **options)
+    if message.video:
+        return InputMediaVideo(media=message.video.file_id, **options)
+    if message.document:
+        return InputMediaDocument(media=message.document.file_id, **options)
+    return InputMediaAudio(media=message.audio.file_id, **options)
+
+
+def _groupable(album: List[Message]) -> bool:
+    """Whether the album can be resent with sendMediaGroup."""
+    kinds = {message.content_type for message in album}
+    return kinds <= {"photo", "video"} or kinds == {"document"} or kinds == {"audio"}
+
+
+def copy_with_header(
+    messages: List[Message],
+    chat_id: ChatId,
+    compose: Callable[[str], str],
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+) -> List[TelegramMethod]:
+    """Build the fewest methods that deliver messages to a chat with a header.
+
+    `compose(body)` returns the header with the HTML text or caption of the
+    message appended; it is called with an empty body when the content is
+    copied separately.
+    """
+    album = sorted(messages, key=lambda m: m.message_id)
+    first = album[0]
+    from_chat_id = first.chat.id
+
+    if len(album) > 1:
+        body = next((m.html_text for m in album if m.caption), "")
+        header = compose(body)
+        if reply_markup is None and len(header) <= CAPTION_LIMIT and _groupable(album):
+            media = [_input_media(album[0], caption=header)] + [_input_media(m) for m in album[1:]]
+            return [SendMediaGroup(chat_id=chat_id, media=media)]
+        return [
+            CopyMessages(chat_id=chat_id, from_chat_id=from_chat_id, message_ids=[m.message_id for m in album]),
+            SendMessage(chat_id=chat_id, text=compose(""), reply_markup=reply_markup),
+        ]
+
+    if first.text is not None:
+        text = compose(first.html_text)
+        if len(text) <= TEXT_LIMIT:
+            return [SendMessage(chat_id=chat_id, text=text, reply_markup=reply_markup)]
+    elif first.content_type in CAPTIONED:
+        caption = compose(first.html_text if first.caption else "")
+        if len(caption) <= CAPTION_LIMIT:
+            return [CopyMessage(
+                chat_id=chat_id,
+                from_chat_id=from_chat_id,
+                message_id=first.message_id,
+                caption=caption,
+                reply_markup=reply_markup,
+            )]
+
+    # No room for the header on the content itself: copy it and add the header below
+    return [
+        CopyMessage(chat_id=chat_id, from_chat_id=from_chat_id, message_id=first.message_id),
+        SendMessage(chat_id=chat_id, text=compose(""), reply_markup=reply_markup),
+    ]
+
+
+def copy_plain(
+    messages: List[Message],
+    chat_id: ChatId,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    album_note: str = "",
+) -> List[TelegramMethod]:
+    """Build methods that copy messages as they are.
+
+    Albums can't carry a keyboard, so it goes on a separate `album_note` message.
+    """
+    album = sorted(messages, key=lambda m: m.message_id)
+    from_chat_id = album[0].chat.id
+    if len(album) == 1:
+        return [CopyMessage(
+            chat_id=chat_id,
+            from_chat_id=from_chat_id,
+            message_id=album[0].message_id,
+            reply_markup=reply_markup,
+        )]
+
+    methods: List[TelegramMethod] = [
+        CopyMessages(chat_id=chat_id, from_chat_id=from_chat_id, message_ids=[m.message_id for m in album])
+    ]
+    if reply_markup is not None or album_note:
+        methods.append(SendMessage(chat_id=chat_id, text=album_note, reply_markup=reply_markup))
+    return methods
+
+
+def submit_all(sender: Sender, methods: List[TelegramMethod], priority: Priority = Priority.USER) -> List[asyncio.Future]:
+    """Queue methods in order and return their futures."""
+    return [sender.submit(method, priority) for method in methods]
@@ -0,0 +1,115 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from aiogram.types import Message
+
+from app.services.database import Database
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ticket_id INTEGER,
+    user_id INTEGER NOT NULL,
+    full_name TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_ticket_id ON entries (ticket_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    body, full_name, user_id,
+    content='entries', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, body, full_name, user_id)
+    VALUES (new.id, new.body, new.full_name, new.user_id);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, body, full_name, user_id)
+    VALUES ('delete', old.id, old.body, old.full_name, old.user_id);
+END;
+"""
+
+REQUEST = "request"
+REPLY = "reply"
+FEEDBACK = "feedback"
+
+# Marks around matched terms in snippets, replaced after HTML escaping
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+WORD = re.compile(r"\w+")
+
+
+@dataclass
+class SearchResult:
+    id: int
+    kind: str
+    ticket_id: Optional[int]
+    user_id: int
+    full_name: str
+    created_at: float
+    snippet: str
+
+
+def entry_body(messages: Sequence[Message]) -> str:
+    """Searchable text of a message or album: texts and captions, or the content type."""
+    texts = [m.text or m.caption for m in messages if m.text or m.caption]
+    if texts:
+        return "\n".join(texts)
+    return f"[{messages[0].content_type}]"
+
+
+def match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word, as a prefix."""
+    words = WORD.findall(query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class SearchIndex:
+    """Full-text index of requests, admin replies and feedback.
+
+    Entries live in a plain table; an external-content FTS5 table kept in
+    sync by a trigger indexes body, name and user id. Results are ranked by
+    bm25 and paged with LIMIT/OFFSET.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def setup(self) -> None:
+        await self.db.executescript(SCHEMA)
+
+    async def add(
+        self,
+        kind: str,
+        user_id: int,
+        full_name: str,
+        body: str,
+        ticket_id: Optional[int] = None,
+    ) -> int:
+        return await self.db.execute(
+            "INSERT INTO entries (kind, ticket_id, user_id, full_name, body, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, ticket_id, user_id, full_name, body, time.time()),
+        )
+
+    async def search(self, query: str, limit: int = 5, offset: int = 0) -> Tuple[List[SearchResult], bool]:
+        """Return a page of results, best first, and whether there are more."""
+        match = match_query(query)
+        if match is None:
+            return [], False
+        rows = await self.db.fetchall(
+            "SELECT e.id, e.kind, e.ticket_id, e.user_id, e.full_name, e.created_at, "
+            f"snippet(entries_fts, 0, '{MATCH_START}', '{MATCH_END}', '…', 16) "
+            "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+            "WHERE entries_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (match, limit + 1, offset),
+        )
+        return [SearchResult(*row) for row in rows[:limit]], len(rows) > limit
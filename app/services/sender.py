@@ -0,0 +1,415 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import multiprocessing
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import TelegramMethod
+
+from app.services.metrics import API_RETRIES
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Send lanes, lower value goes first."""
+    USER = 0
+    ADMIN = 1
+    # Broadcasts, sent when nothing else is waiting
+    BULK = 2
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost: float, now: float) -> float:
+        """Return seconds to wait until `cost` tokens are available."""
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        wait = max(0.0, (cost - self.tokens) / self.rate)
+        return max(wait, self.paused_until - now)
+
+    def consume(self, cost: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(cost, self.capacity)
+
+    def full(self, now: float) -> bool:
+        """Whether the bucket has refilled, i.e. is as good as a new one."""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+    def pause(self, seconds: float) -> None:
+        """Block the bucket, e.g. for Telegram's retry_after."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+def _shared_field(index: int) -> property:
+    return property(
+        lambda self: self._state[index],
+        lambda self, value: self._state.__setitem__(index, value),
+    )
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket kept in shared memory so worker processes draw from one budget.
+
+    Create it in the parent process and pass it to the workers.
+    """
+
+    def __init__(self, rate: float, capacity: float, context=multiprocessing):
+        self.rate = rate
+        self.capacity = capacity
+        # tokens, updated, paused_until
+        self._state = context.RawArray("d", [capacity, time.monotonic(), 0.0])
+        self._lock = context.Lock()
+
+    tokens = _shared_field(0)
+    updated = _shared_field(1)
+    paused_until = _shared_field(2)
+
+    def delay(self, cost: float, now: float) -> float:
+        with self._lock:
+            return super().delay(cost, now)
+
+    def consume(self, cost: float, now: float) -> None:
+        with self._lock:
+            super().consume(cost, now)
+
+    def full(self, now: float) -> bool:
+        with self._lock:
+            return super().full(now)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            super().pause(seconds)
+
+
+@dataclass
+class _Job:
+    method: TelegramMethod
+    chat_key: Optional[str]
+    cost: int
+    future: asyncio.Future
+    attempts: int = 0
+
+
+@dataclass(order=True)
+class _Entry:
+    priority: int
+    seq: int
+    job: _Job = field(compare=False)
+
+
+class _Chat:
+    """Queued sends of one chat: a FIFO lane per priority."""
+
+    __slots__ = ("lanes", "size", "busy", "token")
+
+    def __init__(self):
+        self.lanes: List[Deque[_Entry]] = [deque() for _ in Priority]
+        self.size = 0
+        self.busy = False
+        # Heap entries carrying an older token are stale
+        self.token = 0
+
+    def head(self) -> _Entry:
+        for lane in self.lanes:
+            if lane:
+                return lane[0]
+        raise IndexError("empty chat")
+
+    def push(self, entry: _Entry, front: bool = False) -> None:
+        lane = self.lanes[entry.priority]
+        if front:
+            lane.appendleft(entry)
+        else:
+            lane.append(entry)
+        self.size += 1
+
+    def pop(self) -> _Entry:
+        for lane in self.lanes:
+            if lane:
+                self.size -= 1
+                return lane.popleft()
+        raise IndexError("empty chat")
+
+
+def _chat_key(method: TelegramMethod) -> Optional[str]:
+    chat_id = getattr(method, "chat_id", None)
+    return None if chat_id is None else str(chat_id)
+
+
+def _cost(method: TelegramMethod) -> int:
+    """Number of messages a method produces in the destination chat."""
+    media = getattr(method, "media", None)
+    if isinstance(media, list):
+        return len(media)
+    message_ids = getattr(method, "message_ids", None)
+    if isinstance(message_ids, list):
+        return len(message_ids)
+    return 1
+
+
+class Sender:
+    """Outbound queue that keeps sends within Telegram flood limits.
+
+    Methods are queued by priority and sent through a global token bucket
+    and one bucket per destination chat. Sends to one chat keep their order,
+    sends to different chats run concurrently. `retry_after` from a 429
+    pauses the chat and the job is retried in place.
+
+    Every chat keeps its own FIFO lanes; only the head of a chat that can
+    send right now sits in the `_ready` heap, chats waiting for their bucket
+    sit in `_delayed` by the time they can send, so a pick doesn't look at
+    the backlog of a throttled chat. Per-chat buckets are dropped once they
+    are full again and the chat has nothing queued: a full bucket is the
+    same as a new one.
+
+    `global_bucket` and `buckets` replace the default buckets, e.g. with
+    SharedTokenBucket when several processes send for one bot.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        concurrency: int = 8,
+        max_retries: int = 5,
+        global_bucket: Optional[TokenBucket] = None,
+        buckets: Optional[Dict[str, TokenBucket]] = None,
+        sweep_interval: float = 60.0,
+    ):
+        self.bot = bot
+        self.global_bucket = global_bucket or TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.sweep_interval = sweep_interval
+
+        self._chats: Dict[Optional[str], _Chat] = {}
+        # (priority, seq, token, chat key) of chats that can send now
+        self._ready: List[Tuple[int, int, int, Optional[str]]] = []
+        # (when the bucket allows the head, token, chat key)
+        self._delayed: List[Tuple[float, int, Optional[str]]] = []
+        self._pending = 0
+        self._seq = itertools.count()
+        self._buckets: Dict[str, TokenBucket] = dict(buckets or {})
+        # Buckets passed in are shared with other processes, never dropped
+        self._kept = set(self._buckets)
+        self._swept = time.monotonic()
+        self._in_flight = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    def submit(self, method: TelegramMethod, priority: Priority = Priority.USER) -> asyncio.Future:
+        """Queue a method for sending and return a future with its result.
+
+        Callers that don't need the result may drop the future, failures are logged.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_log_failure)
+        job = _Job(method=method, chat_key=_chat_key(method), cost=_cost(method), future=future)
+        self._push(_Entry(priority, next(self._seq), job))
+        return future
+
+    def _push(self, entry: _Entry, front: bool = False) -> None:
+        key = entry.job.chat_key
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = _Chat()
+        chat.push(entry, front)
+        self._pending += 1
+        if not chat.busy and chat.head() is entry:
+            # New head: reschedule, the old heap entry goes stale
+            self._schedule(key, chat, time.monotonic())
+        self._wakeup.set()
+
+    def _schedule(self, key: Optional[str], chat: _Chat, now: float) -> None:
+        """Put a chat with queued sends in the ready or the delayed heap."""
+        chat.token += 1
+        head = chat.head()
+        delay = 0.0 if key is None else self.bucket(key).delay(head.job.cost, now)
+        if delay > 0:
+            heapq.heappush(self._delayed, (now + delay, chat.token, key))
+        else:
+            heapq.heappush(self._ready, (head.priority, head.seq, chat.token, key))
+
+    def bucket(self, chat_key: str) -> TokenBucket:
+        bucket = self._buckets.get(chat_key)
+        if bucket is None:
+            if chat_key.startswith("-"):
+                bucket = TokenBucket(self.group_rate, max(1.0, self.group_rate * 60))
+            else:
+                bucket = TokenBucket(self.chat_rate, max(1.0, self.chat_rate * 3))
+            self._buckets[chat_key] = bucket
+        return bucket
+
+    def _sweep(self, now: float) -> None:
+        """Drop the buckets of idle chats that have refilled."""
+        self._swept = now
+        for key in [
+            key for key, bucket in self._buckets.items()
+            if key not in self._chats and key not in self._kept and bucket.full(now)
+        ]:
+            del self._buckets[key]
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _pick(self) -> Tuple[Optional[_Entry], float]:
+        """Take the first sendable entry, or return how long to wait for one."""
+        if self._in_flight >= self.concurrency:
+            # A finishing send sets _wakeup
+            return None, float("inf")
+        now = time.monotonic()
+        global_delay = self.global_bucket.delay(1, now)
+        if global_delay > 0:
+            return None, global_delay
+
+        while self._delayed and self._delayed[0][0] <= now:
+            _, token, key = heapq.heappop(self._delayed)
+            chat = self._chats.get(key)
+            if chat is not None and chat.token == token:
+                self._schedule(key, chat, now)
+
+        while self._ready:
+            _, _, token, key = heapq.heappop(self._ready)
+            chat = self._chats.get(key)
+            if chat is None or chat.token != token:
+                continue
+            head = chat.head()
+            # A shared bucket may have been drained by another process
+            if key is not None and self.bucket(key).delay(head.job.cost, now) > 0:
+                self._schedule(key, chat, now)
+                continue
+            entry = chat.pop()
+            self._pending -= 1
+            if key is not None:
+                # Keep per-chat order: the next one waits for this send
+                chat.busy = True
+                chat.token += 1
+            elif chat.size:
+                self._schedule(key, chat, now)
+            else:
+                del self._chats[key]
+            return entry, 0.0
+
+        if self._delayed:
+            return None, self._delayed[0][0] - now
+        return None, float("inf")
+
+    async def _run(self) -> None:
+        while True:
+            entry, wait = self._pick()
+            if entry is None:
+                now = time.monotonic()
+                if now - self._swept >= self.sweep_interval:
+                    self._sweep(now)
+                self._wakeup.clear()
+                timeout = None if wait == float("inf") else wait
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = entry.job
+            now = time.monotonic()
+            self.global_bucket.consume(job.cost, now)
+            if job.chat_key is not None:
+                self.bucket(job.chat_key).consume(job.cost, now)
+            self._in_flight += 1
+
+            task = asyncio.create_task(self._send(entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, entry: _Entry) -> None:
+        job = entry.job
+        try:
+            result = await self.bot(job.method)
+        except TelegramRetryAfter as e:
+            self._retry(entry, e, e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            self._retry(entry, e, min(2 ** job.attempts, 30))
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            if job.chat_key is not None:
+                self._release(job.chat_key)
+            self._wakeup.set()
+
+    def _release(self, key: str) -> None:
+        """A send to the chat finished: let its next one go."""
+        chat = self._chats[key]
+        chat.busy = False
+        if chat.size:
+            self._schedule(key, chat, time.monotonic())
+        else:
+            del self._chats[key]
+
+    def _retry(self, entry: _Entry, error: Exception, delay: float) -> None:
+        job = entry.job
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            if not job.future.done():
+                job.future.set_exception(error)
+            return
+
+        logger.warning("%s failed (%s), retrying in %ss", job.method.__api_method__, error, delay)
+        API_RETRIES.inc(job.method.__api_method__, type(error).__name__)
+        if job.chat_key is not None:
+            self.bucket(job.chat_key).pause(delay)
+        else:
+            self.global_bucket.pause(delay)
+        # Back at the head of its chat, which is still busy with it
+        self._push(entry, front=True)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Wait for queued sends to finish and stop the worker."""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _log_failure(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Outbound send failed: %r", future.exception())
+
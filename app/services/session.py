@@ -0,0 +1,84 @@
+import logging
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib json is used without it
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Uploads and media that Telegram may fetch or process for a while
+MEDIA_METHODS = {
+    "sendPhoto",
+    "sendVideo",
+    "sendDocument",
+    "sendAudio",
+    "sendVoice",
+    "sendAnimation",
+    "sendVideoNote",
+    "sendMediaGroup",
+}
+
+# Calls that are useless if late: the user is waiting on a spinner
+FAST_METHODS = {"answerCallbackQuery"}
+
+
+def _orjson_dumps(value: Any) -> str:
+    return orjson.dumps(value).decode()
+
+
+class TunedSession(AiohttpSession):
+    """AiohttpSession with a sized keep-alive pool, per-method timeouts and pool stats.
+
+    Media methods get `media_timeout`, callback answers `fast_timeout`, the
+    rest `timeout`; an explicit request timeout (like getUpdates') wins.
+    With `fast_json` and orjson installed, request fields and responses are
+    encoded and decoded with orjson.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 100,
+        keepalive: float = 60.0,
+        timeout: float = 60.0,
+        media_timeout: float = 300.0,
+        fast_timeout: float = 10.0,
+        fast_json: bool = True,
+        **kwargs: Any
+    ):
+        if fast_json and orjson is not None:
+            kwargs.setdefault("json_loads", orjson.loads)
+            kwargs.setdefault("json_dumps", _orjson_dumps)
+            logger.info("Bot API JSON: orjson")
+        elif fast_json:
+            logger.info("Bot API JSON: json, install the speedups extra for orjson")
+        super().__init__(limit=pool_size, timeout=timeout, **kwargs)
+        self.pool_size = pool_size
+        self._connector_init["keepalive_timeout"] = keepalive
+        self.timeouts: Dict[str, float] = {
+            **{name: media_timeout for name in MEDIA_METHODS},
+            **{name: fast_timeout for name in FAST_METHODS},
+        }
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        if timeout is None:
+            timeout = self.timeouts.get(method.__api_method__)
+        return await super().make_request(bot, method, timeout)
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Connections in use, idle keep-alive ones and requests waiting for one."""
+        connector = self._session.connector if self._session is not None else None
+        if connector is None or connector.closed:
+            return {"active": 0, "idle": 0, "waiting": 0}
+        return {
+            "active": len(connector._acquired),
+            "idle": sum(len(conns) for conns in connector._conns.values()),
+            "waiting": sum(len(waiters) for waiters in connector._waiters.values()),
+        }
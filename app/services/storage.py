@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional, Set
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from app.services.database import Database
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL,
+    origin TEXT
+);
+"""
+
+# How far back each sync looks again, for writes that committed late
+SYNC_MARGIN = 5.0
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched: float = field(default_factory=time.monotonic)
+    # Wall time of the load or the last change, to compare with other processes' writes
+    stamp: float = field(default_factory=time.time)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage persisted to SQLite with a write-back in-memory cache.
+
+    Reads and writes hit the in-memory dict; changed keys are written to disk
+    in batches every `flush_interval` seconds and on close. Keys not used for
+    `ttl` seconds are dropped from memory and loaded again on demand, so
+    startup doesn't need to read the whole table.
+
+    Several worker processes share the table, and a process may change a key
+    that another one has cached, e.g. a ticket closed on the admin's worker
+    resets its user. Rows carry the `origin` of the storage that wrote them;
+    every flush interval each storage drops cached keys another one has
+    written since it loaded them. A cleared key is written as an empty row
+    rather than deleted, so the other processes see the change; empty rows
+    are deleted after `ttl`.
+    """
+
+    def __init__(self, db: Database, flush_interval: float = 1.0, ttl: float = 3600.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self.origin = uuid.uuid4().hex
+        self._synced = time.time()
+        self._purged = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    async def setup(self) -> None:
+        await self.db.executescript(SCHEMA)
+        columns = {row[1] for row in await self.db.fetchall("PRAGMA table_info(fsm)")}
+        if "origin" not in columns:
+            await self.db.execute("ALTER TABLE fsm ADD COLUMN origin TEXT")
+        await self.db.execute("CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)")
+        self._start()
+
+    def _start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _record(self, key: StorageKey) -> _Record:
+        k = self.key_builder.build(key)
+        record = self._cache.get(k)
+        if record is None:
+            row = await self.db.fetchone("SELECT state, data FROM fsm WHERE key = ?", (k,))
+            loaded = _Record(state=row[0], data=json.loads(row[1])) if row else _Record()
+            # A write may have landed while the row was loading
+            record = self._cache.setdefault(k, loaded)
+        record.touched = time.monotonic()
+        return record
+
+    def _mark_dirty(self, key: StorageKey, record: _Record) -> None:
+        k = self.key_builder.build(key)
+        record.stamp = time.time()
+        self._cache[k] = record
+        self._dirty.add(k)
+        self._start()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def flush(self) -> None:
+        """Write changed keys to disk in one transaction."""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        now = time.time()
+        upserts = []
+        for k in keys:
+            record = self._cache.get(k)
+            if record is not None:
+                upserts.append((k, record.state, json.dumps(record.data, ensure_ascii=False), now, self.origin))
+
+        def _write(conn):
+            with conn:
+                conn.executemany(
+                    "INSERT INTO fsm (key, state, data, updated_at, origin) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                    "updated_at = excluded.updated_at, origin = excluded.origin",
+                    upserts,
+                )
+
+        try:
+            await self.db.run(_write)
+        except Exception:
+            # Keep the keys dirty so the next flush retries them
+            self._dirty |= keys
+            raise
+
+    async def sync(self) -> None:
+        """Drop cached keys that other processes have written since they were loaded."""
+        since, self._synced = self._synced - SYNC_MARGIN, time.time()
+        rows = await self.db.fetchall(
+            "SELECT key, updated_at FROM fsm WHERE updated_at > ? AND origin IS NOT ?",
+            (since, self.origin),
+        )
+        for k, updated_at in rows:
+            record = self._cache.get(k)
+            # A later change of our own wins and is flushed over theirs
+            if record is not None and record.stamp < updated_at:
+                del self._cache[k]
+                self._dirty.discard(k)
+
+    async def _purge(self) -> None:
+        """Delete rows that were cleared long enough ago for every process to have seen it."""
+        self._purged = time.monotonic()
+        await self.db.execute(
+            "DELETE FROM fsm WHERE state IS NULL AND data = '{}' AND updated_at < ?",
+            (time.time() - self.ttl,),
+        )
+
+    def _evict(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        stale = [k for k, r in self._cache.items() if r.touched < deadline and k not in self._dirty]
+        for k in stale:
+            del self._cache[k]
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                await self.sync()
+                if time.monotonic() - self._purged >= self.ttl:
+                    await self._purge()
+            except Exception:
+                logger.exception("Failed to flush FSM storage")
+            self._evict()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
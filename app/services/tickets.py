@@ -0,0 +1,283 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.database import Database
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    full_name TEXT NOT NULL,
+    username TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    closed_at REAL,
+    closed_by TEXT,
+    first_reply_at REAL,
+    assignee INTEGER
+);
+CREATE INDEX IF NOT EXISTS tickets_user_id ON tickets (user_id, created_at);
+CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status, created_at);
+CREATE INDEX IF NOT EXISTS tickets_created_at ON tickets (created_at);
+CREATE INDEX IF NOT EXISTS tickets_updated_at ON tickets (status, updated_at);
+
+CREATE TABLE IF NOT EXISTS ticket_messages (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    ticket_id INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS ticket_messages_ticket_id ON ticket_messages (ticket_id);
+
+CREATE TABLE IF NOT EXISTS blocked_users (
+    user_id INTEGER PRIMARY KEY,
+    blocked_at REAL NOT NULL
+);
+"""
+
+# Users with an open ticket, but not those who blocked the bot after their last activity
+OPEN_USERS = (
+    "FROM tickets t WHERE t.status = ? AND NOT EXISTS ("
+    "SELECT 1 FROM blocked_users b WHERE b.user_id = t.user_id AND b.blocked_at >= t.updated_at)"
+)
+
+COLUMNS = (
+    "id, user_id, full_name, username, status, created_at, updated_at, closed_at, closed_by, first_reply_at, assignee"
+)
+
+OPEN = "open"
+CLOSED = "closed"
+
+
+@dataclass
+class Ticket:
+    id: int
+    user_id: int
+    full_name: str
+    username: Optional[str]
+    status: str
+    created_at: float
+    updated_at: float
+    closed_at: Optional[float] = None
+    closed_by: Optional[str] = None
+    first_reply_at: Optional[float] = None
+    # Admin user id
+    assignee: Optional[int] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.status == OPEN
+
+
+def message_ids(result: Any) -> List[int]:
+    """Extract message ids from a send/copy result."""
+    items = result if isinstance(result, list) else [result]
+    return [item.message_id for item in items if getattr(item, "message_id", None)]
+
+
+class TicketStore:
+    """Support tickets and the support chat messages that belong to them.
+
+    Recent message to ticket mappings are also kept in a bounded LRU, so
+    routing a reply usually doesn't touch the database.
+    """
+
+    def __init__(self, db: Database, message_cache_size: int = 10000):
+        self.db = db
+        self.message_cache_size = message_cache_size
+        self._messages: OrderedDict[Tuple[int, int], int] = OrderedDict()
+        self._tasks: set = set()
+
+    def _remember(self, chat_id: int, message_id: int, ticket_id: int) -> None:
+        self._messages[(chat_id, message_id)] = ticket_id
+        self._messages.move_to_end((chat_id, message_id))
+        if len(self._messages) > self.message_cache_size:
+            self._messages.popitem(last=False)
+
+    async def setup(self) -> None:
+        await self.db.executescript(SCHEMA)
+        columns = {row[1] for row in await self.db.fetchall("PRAGMA table_info(tickets)")}
+        if "first_reply_at" not in columns:
+            await self.db.execute("ALTER TABLE tickets ADD COLUMN first_reply_at REAL")
+        if "assignee" not in columns:
+            await self.db.execute("ALTER TABLE tickets ADD COLUMN assignee INTEGER")
+
+    async def create(self, user_id: int, full_name: str, username: Optional[str] = None) -> Ticket:
+        now = time.time()
+        ticket_id = await self.db.execute(
+            "INSERT INTO tickets (user_id, full_name, username, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, full_name, username, OPEN, now, now),
+        )
+        return Ticket(ticket_id, user_id, full_name, username, OPEN, now, now)
+
+    async def get(self, ticket_id: int) -> Optional[Ticket]:
+        row = await self.db.fetchone(f"SELECT {COLUMNS} FROM tickets WHERE id = ?", (ticket_id,))
+        return Ticket(*row) if row else None
+
+    async def open_for_user(self, user_id: int) -> Optional[Ticket]:
+        """Return the user's latest open ticket."""
+        row = await self.db.fetchone(
+            f"SELECT {COLUMNS} FROM tickets WHERE user_id = ? AND status = ? ORDER BY created_at DESC LIMIT 1",
+            (user_id, OPEN),
+        )
+        return Ticket(*row) if row else None
+
+    async def for_user(self, user_id: int, limit: int = 20) -> List[Ticket]:
+        rows = await self.db.fetchall(
+            f"SELECT {COLUMNS} FROM tickets WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit),
+        )
+        return [Ticket(*row) for row in rows]
+
+    async def list_open(self, limit: int = 50, offset: int = 0) -> List[Ticket]:
+        rows = await self.db.fetchall(
+            f"SELECT {COLUMNS} FROM tickets WHERE status = ? ORDER BY created_at LIMIT ? OFFSET ?",
+            (OPEN, limit, offset),
+        )
+        return [Ticket(*row) for row in rows]
+
+    async def open_activity(self, since: Optional[float] = None) -> List[Tuple[int, float]]:
+        """(id, updated_at) of every open ticket, or of those with activity after `since`."""
+        if since is None:
+            return await self.db.fetchall("SELECT id, updated_at FROM tickets WHERE status = ?", (OPEN,))
+        return await self.db.fetchall(
+            "SELECT id, updated_at FROM tickets WHERE status = ? AND updated_at > ?", (OPEN, since)
+        )
+
+    async def count_open(self) -> int:
+        row = await self.db.fetchone("SELECT COUNT(*) FROM tickets WHERE status = ?", (OPEN,))
+        return row[0]
+
+    async def open_users(self, after: int = 0, limit: int = 500) -> List[int]:
+        """Ids of users with an open ticket greater than `after`, ascending, for keyset paging."""
+        rows = await self.db.fetchall(
+            f"SELECT DISTINCT t.user_id {OPEN_USERS} AND t.user_id > ? ORDER BY t.user_id LIMIT ?",
+            (OPEN, after, limit),
+        )
+        return [row[0] for row in rows]
+
+    async def count_open_users(self) -> int:
+        row = await self.db.fetchone(f"SELECT COUNT(DISTINCT t.user_id) {OPEN_USERS}", (OPEN,))
+        return row[0]
+
+    async def mark_blocked(self, user_id: int) -> None:
+        """Leave the user out of `open_users` until their next activity."""
+        await self.db.execute(
+            "INSERT OR REPLACE INTO blocked_users (user_id, blocked_at) VALUES (?, ?)",
+            (user_id, time.time()),
+        )
+
+    async def touch(self, ticket_id: int) -> None:
+        await self.db.execute("UPDATE tickets SET updated_at = ? WHERE id = ?", (time.time(), ticket_id))
+
+    async def close(self, ticket_id: int, closed_by: str) -> bool:
+        """Close an open ticket; False if it was already closed or doesn't exist."""
+        def _close(conn) -> bool:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE tickets SET status = ?, closed_at = ?, closed_by = ?, updated_at = ? "
+                    "WHERE id = ? AND status = ?",
+                    (CLOSED, now, closed_by, now, ticket_id, OPEN),
+                )
+                return cursor.rowcount > 0
+
+        now = time.time()
+        return await self.db.run(_close)
+
+    async def mark_replied(self, ticket_id: int) -> Optional[float]:
+        """Record the first admin reply; return the ticket's creation time if this was it."""
+        def _mark(conn) -> Optional[float]:
+            with conn:
+                rows = conn.execute(
+                    "UPDATE tickets SET first_reply_at = ? WHERE id = ? AND first_reply_at IS NULL "
+                    "RETURNING created_at",
+                    (time.time(), ticket_id),
+                ).fetchall()
+                return rows[0][0] if rows else None
+
+        return await self.db.run(_mark)
+
+    async def assign(self, ticket_id: int, admin_id: Optional[int], current: Optional[int] = None) -> bool:
+        """Hand an open ticket to an admin if it's still assigned to `current`.
+
+        The check makes concurrent assignments safe: only one of them wins.
+        """
+        def _assign(conn) -> bool:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE tickets SET assignee = ? WHERE id = ? AND status = ? AND assignee IS ?",
+                    (admin_id, ticket_id, OPEN, current),
+                )
+                return cursor.rowcount > 0
+
+        return await self.db.run(_assign)
+
+    async def unassign_all(self, admin_id: int) -> List[Tuple[int, float]]:
+        """Take an admin's open tickets back; returns their (id, created_at)."""
+        def _unassign(conn) -> List[Tuple[int, float]]:
+            with conn:
+                return conn.execute(
+                    "UPDATE tickets SET assignee = NULL WHERE assignee = ? AND status = ? RETURNING id, created_at",
+                    (admin_id, OPEN),
+                ).fetchall()
+
+        return await self.db.run(_unassign)
+
+    async def assignment(self) -> Tuple[Dict[int, int], List[Tuple[int, float]]]:
+        """Open tickets per admin, and (id, created_at) of the unassigned open ones."""
+        loads = await self.db.fetchall(
+            "SELECT assignee, COUNT(*) FROM tickets WHERE status = ? AND assignee IS NOT NULL GROUP BY assignee",
+            (OPEN,),
+        )
+        waiting = await self.db.fetchall(
+            "SELECT id, created_at FROM tickets WHERE status = ? AND assignee IS NULL", (OPEN,)
+        )
+        return dict(loads), waiting
+
+    async def add_messages(self, ticket_id: int, chat_id: int, ids: Iterable[int]) -> None:
+        rows = [(int(chat_id), message_id, ticket_id) for message_id in ids]
+        for row in rows:
+            self._remember(*row)
+        await self.db.executemany(
+            "INSERT OR REPLACE INTO ticket_messages (chat_id, message_id, ticket_id) VALUES (?, ?, ?)",
+            rows,
+        )
+
+    async def ticket_for_message(self, chat_id: int, message_id: int) -> Optional[int]:
+        key = (int(chat_id), message_id)
+        ticket_id = self._messages.get(key)
+        if ticket_id is not None:
+            self._messages.move_to_end(key)
+            return ticket_id
+
+        row = await self.db.fetchone(
+            "SELECT ticket_id FROM ticket_messages WHERE chat_id = ? AND message_id = ?",
+            key,
+        )
+        if row is None:
+            return None
+        self._remember(*key, row[0])
+        return row[0]
+
+    async def record_delivery(self, meta: Dict[str, Any], method: Any, result: Any) -> None:
+        """Outbox hook: link a delivered relay to its ticket."""
+        ticket_id = meta.get("ticket_id")
+        if ticket_id is not None:
+            await self.add_messages(ticket_id, method.chat_id, message_ids(result))
+
+    def track(self, ticket_id: int, chat_id: int, future: asyncio.Future) -> None:
+        """Record the messages produced by a queued send once it completes."""
+        def _done(fut: asyncio.Future) -> None:
+            if fut.cancelled() or fut.exception() is not None:
+                return
+            task = asyncio.create_task(self.add_messages(ticket_id, chat_id, message_ids(fut.result())))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        future.add_done_callback(_done)
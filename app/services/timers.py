@@ -0,0 +1,81 @@
+import math
+from typing import Dict, Hashable, List, Tuple
+
+
+class TimingWheel:
+    """Hierarchical timing wheel with O(1) schedule and cancel.
+
+    Level 0 has `slots` buckets of one `tick` each; a bucket of every next
+    level spans a full turn of the level below. A timer goes to the lowest
+    level whose turn covers its delay and moves down as the wheel turns, so
+    each timer is touched at most `levels` times before it fires. Deadlines
+    beyond the top level's turn park in its farthest bucket and are placed
+    again when they come around.
+    """
+
+    def __init__(self, now: float, tick: float = 1.0, slots: int = 64, levels: int = 4):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.current = int(now // tick)
+        self.wheels: List[List[Dict[Hashable, int]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        # key -> (level, slot) of the bucket holding it
+        self.where: Dict[Hashable, Tuple[int, int]] = {}
+        self._span = slots ** levels
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.where
+
+    def _place(self, key: Hashable, due: int, expired: List[Hashable]) -> None:
+        if due <= self.current:
+            expired.append(key)
+            return
+        at = min(due, self.current + self._span - 1)
+        delta = at - self.current
+        level = 0
+        while delta >= self.slots ** (level + 1):
+            level += 1
+        slot = (at // self.slots ** level) % self.slots
+        self.wheels[level][slot][key] = due
+        self.where[key] = (level, slot)
+
+    def schedule(self, key: Hashable, deadline: float) -> List[Hashable]:
+        """Arm or re-arm the timer of `key`; returns [key] if the deadline already passed."""
+        self.cancel(key)
+        expired: List[Hashable] = []
+        self._place(key, math.ceil(deadline / self.tick), expired)
+        return expired
+
+    def cancel(self, key: Hashable) -> bool:
+        where = self.where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self.wheels[level][slot][key]
+        return True
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Turn the wheel up to `now` and return the keys whose deadlines passed."""
+        expired: List[Hashable] = []
+        target = int(now // self.tick)
+        while self.current < target:
+            self.current += 1
+            # Bring down the buckets of higher levels that start at this tick
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if self.current % span == 0:
+                    self._cascade(level, (self.current // span) % self.slots, expired)
+            self._cascade(0, self.current % self.slots, expired)
+        return expired
+
+    def _cascade(self, level: int, slot: int, expired: List[Hashable]) -> None:
+        bucket = self.wheels[level][slot]
+        if not bucket:
+            return
+        self.wheels[level][slot] = {}
+        for key, due in bucket.items():
+            del self.where[key]
+            self._place(key, due, expired)
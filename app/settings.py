@@ -1,15 +1,84 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 IMAGES_DIR = BASE_DIR / "images"
+DATA_DIR = BASE_DIR / "data"
 
 
 class Settings(BaseSettings):
     token: str
     support_chat_id: str
     feedback_chat_id: str
+    api_url: str = ""
+    data_dir: Path = DATA_DIR
+
+    mode: Literal["polling", "webhook"] = "polling"
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+
+    send_global_rate: float = 30.0
+    send_chat_rate: float = 1.0
+    send_group_rate: float = 20 / 60
+    send_concurrency: int = 8
+
+    http_pool_size: int = 100
+    http_keepalive: float = 60.0
+    http_timeout: float = 60.0
+    http_media_timeout: float = 300.0
+    http_fast_timeout: float = 10.0
+    http_fast_json: bool = True
+
+    fsm_flush_interval: float = 1.0
+    fsm_cache_ttl: float = 3600.0
+
+    album_quiet: float = 0.2
+    album_max_wait: float = 1.0
+
+    update_concurrency: int = 64
+    update_max_pending: int = 10000
+
+    throttle_window: float = 10.0
+    throttle_limit: int = 20
+    throttle_shed_depth: int = 1000
+
+    ticket_message_cache: int = 10000
+    # Seconds without requests or replies before a ticket is closed; 0 turns it off
+    ticket_idle_timeout: float = 3 * 24 * 3600
+    autoclose_batch: int = 50
+    autoclose_interval: float = 1.0
+    # Open tickets an admin gets before new ones wait in the queue; 0 for no cap
+    assign_max_load: int = 10
+    assign_refresh_interval: float = 10.0
+
+    outbox_max_backoff: float = 300.0
+
+    # Post feedback packed into digest messages and albums instead of one by one
+    feedback_digest: bool = False
+    # Longest a feedback entry waits in the digest before it is posted
+    feedback_digest_delay: float = 300.0
+
+    broadcast_workers: int = 16
+    broadcast_retries: int = 3
+
+    # Bots may upload documents up to 50 MB
+    export_chunk_size: int = 45 * 1024 * 1024
+
+    # Run on uvloop when it's installed
+    uvloop: bool = True
+    loop_lag_interval: float = 0.1
+    # Loop stalls over this are logged with the stack holding the loop
+    loop_slow_threshold: float = 0.25
+
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9090
+
+    workers: int = 1
 
     class Config:
         env_file = BASE_DIR / ".env"
@@ -20,3 +89,63 @@ config = Settings()
 TOKEN = config.token
 SUPPORT_CHAT_ID = config.support_chat_id
 FEEDBACK_CHAT_ID = config.feedback_chat_id
+API_URL = config.api_url
+DATA_DIR = config.data_dir
+
+MODE = config.mode
+WEBHOOK_URL = config.webhook_url
+WEBHOOK_PATH = config.webhook_path
+WEBHOOK_SECRET = config.webhook_secret
+WEBHOOK_HOST = config.webhook_host
+WEBHOOK_PORT = config.webhook_port
+
+SEND_GLOBAL_RATE = config.send_global_rate
+SEND_CHAT_RATE = config.send_chat_rate
+SEND_GROUP_RATE = config.send_group_rate
+SEND_CONCURRENCY = config.send_concurrency
+
+HTTP_POOL_SIZE = config.http_pool_size
+HTTP_KEEPALIVE = config.http_keepalive
+HTTP_TIMEOUT = config.http_timeout
+HTTP_MEDIA_TIMEOUT = config.http_media_timeout
+HTTP_FAST_TIMEOUT = config.http_fast_timeout
+HTTP_FAST_JSON = config.http_fast_json
+
+FSM_FLUSH_INTERVAL = config.fsm_flush_interval
+FSM_CACHE_TTL = config.fsm_cache_ttl
+
+ALBUM_QUIET = config.album_quiet
+ALBUM_MAX_WAIT = config.album_max_wait
+
+UPDATE_CONCURRENCY = config.update_concurrency
+UPDATE_MAX_PENDING = config.update_max_pending
+
+THROTTLE_WINDOW = config.throttle_window
+THROTTLE_LIMIT = config.throttle_limit
+THROTTLE_SHED_DEPTH = config.throttle_shed_depth
+
+TICKET_MESSAGE_CACHE = config.ticket_message_cache
+TICKET_IDLE_TIMEOUT = config.ticket_idle_timeout
+AUTOCLOSE_BATCH = config.autoclose_batch
+AUTOCLOSE_INTERVAL = config.autoclose_interval
+ASSIGN_MAX_LOAD = config.assign_max_load
+ASSIGN_REFRESH_INTERVAL = config.assign_refresh_interval
+
+OUTBOX_MAX_BACKOFF = config.outbox_max_backoff
+
+FEEDBACK_DIGEST = config.feedback_digest
+FEEDBACK_DIGEST_DELAY = config.feedback_digest_delay
+
+BROADCAST_WORKERS = config.broadcast_workers
+BROADCAST_RETRIES = config.broadcast_retries
+
+EXPORT_CHUNK_SIZE = config.export_chunk_size
+
+UVLOOP = config.uvloop
+LOOP_LAG_INTERVAL = config.loop_lag_interval
+LOOP_SLOW_THRESHOLD = config.loop_slow_threshold
+
+METRICS_HOST = config.metrics_host
+METRICS_PORT = config.metrics_port
+
+WORKERS = config.workers
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import BotCommand, TelegramObject
+
+from app.services.files import write_atomic
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SKIPPED = "skipped"
+
+# File in the data directory with the hash of the last set commands
+COMMANDS_STATE = "commands.sha256"
+
+
+class StartupTimer:
+    """Durations of the startup steps, logged as one line once the bot is ready.
+
+    Sequential steps end with `mark`; steps run concurrently are wrapped with
+    `timed` and listed under the next marked step.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self._last = started
+        self._parallel: List[Tuple[str, Any]] = []
+        self.steps: List[Tuple[str, float, List[Tuple[str, Any]]]] = []
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.steps.append((name, now - self._last, self._parallel))
+        self._parallel = []
+        self._last = now
+
+    async def timed(self, name: str, step: Awaitable[T]) -> T:
+        started = time.perf_counter()
+        result = await step
+        self._parallel.append((name, SKIPPED if result is False else time.perf_counter() - started))
+        return result
+
+    def report(self) -> str:
+        parts = []
+        for name, seconds, parallel in self.steps:
+            part = f"{name} {seconds:.2f}s"
+            if parallel:
+                inner = ", ".join(
+                    f"{step} {value}" if value == SKIPPED else f"{step} {value:.2f}s"
+                    for step, value in parallel
+                )
+                part += f" ({inner})"
+            parts.append(part)
+        parts.append(f"total {time.perf_counter() - self.started:.2f}s")
+        return "Startup: " + ", ".join(parts)
+
+
+def commands_hash(bot: Bot, commands: Sequence[BotCommand]) -> str:
+    data = {"bot": bot.id, "commands": [command.model_dump(exclude_none=True) for command in commands]}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+async def sync_commands(bot: Bot, commands: Sequence[BotCommand], state_file: Path) -> bool:
+    """Set the bot commands unless this exact set was already set; return whether it called the API.
+
+    The hash of the last set commands is kept in `state_file`.
+    """
+    digest = commands_hash(bot, commands)
+    try:
+        if state_file.read_text(encoding="utf-8").strip() == digest:
+            return False
+    except FileNotFoundError:
+        pass
+
+    await bot.set_my_commands(list(commands))
+    write_atomic(state_file, digest)
+    return True
+
+
+async def prepare_bot(
+    bot: Bot,
+    commands: Sequence[BotCommand],
+    state_file: Path,
+    timer: StartupTimer,
+    *steps: Tuple[str, Awaitable[Any]],
+) -> None:
+    """Run the startup API calls concurrently: getMe, commands and the given `steps`.
+
+    getMe fills the bot's cache, so polling starts without another round trip.
+    """
+    await asyncio.gather(
+        timer.timed("getMe", bot.me()),
+        timer.timed("commands", sync_commands(bot, commands, state_file)),
+        *(timer.timed(name, step) for name, step in steps),
+    )
+    timer.mark("api")
+
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Log how long after start the first update was handled."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.seen = False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self.seen:
+            return await handler(event, data)
+        self.seen = True
+        try:
+            return await handler(event, data)
+        finally:
+            logger.info("First update handled %.2fs after start", time.perf_counter() - self.started)
@@ -0,0 +1,244 @@
+"""Multi-process mode: one ingress process shards updates over worker processes.
+
+Every update of a user goes to the same worker, so the user's FSM state and
+album parts stay in one process. Tickets and FSM state live in the shared
+SQLite database, sends go through token buckets in shared memory.
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiogram.methods import GetUpdates
+
+from app.settings import (
+    DATA_DIR,
+    SUPPORT_CHAT_ID,
+    FEEDBACK_CHAT_ID,
+    MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    SEND_GLOBAL_RATE,
+    SEND_GROUP_RATE,
+    METRICS_HOST,
+    METRICS_PORT,
+    UVLOOP,
+)
+from app.handlers import COMMANDS, router
+from app.main import create_bot, create_dispatcher
+from app.runtime import run
+from app.services import SharedTokenBucket, TokenBucket
+from app.services.metrics import registry, start_metrics_server
+from app.startup import COMMANDS_STATE, sync_commands
+
+
+logger = logging.getLogger(__name__)
+
+POLLING_TIMEOUT = 30
+
+context = multiprocessing.get_context("spawn")
+
+INGRESS_UPDATES = registry.counter(
+    "bot_ingress_updates_total", "Updates forwarded to worker processes", ("worker",)
+)
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """Return the user id of a raw update, or its chat id when there's no user."""
+    for kind, payload in update.items():
+        if kind == "update_id" or not isinstance(payload, dict):
+            continue
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+async def _feed(dp, bot: Bot, update: Dict[str, Any]) -> None:
+    try:
+        await dp.feed_raw_update(bot, update)
+    except Exception:
+        logger.exception("Failed to process update %s", update.get("update_id"))
+
+
+async def _run_worker(
+    index: int,
+    workers: int,
+    updates,
+    ready,
+    data_dir: Path,
+    global_bucket: TokenBucket,
+    chat_buckets: Dict[str, TokenBucket],
+) -> None:
+    bot = create_bot()
+    dp = await create_dispatcher(
+        bot,
+        data_dir,
+        global_bucket,
+        chat_buckets,
+        outbox_file=f"outbox-{index}.log",
+        analytics_file=f"analytics-{index}.json",
+        analytics_peers=[f"analytics-{peer}.json" for peer in range(workers) if peer != index],
+        autoclose=index == 0,
+        digest_file=f"digest-{index}.log",
+        resume_broadcast=index == 0,
+    )
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + index + 1)
+        dp.shutdown.register(metrics_runner.cleanup)
+
+    loop = asyncio.get_running_loop()
+    await dp.emit_startup(bot=bot)
+    ready.set()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                break
+            # Returns once UpdateScheduler has queued the update
+            await _feed(dp, bot, update)
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+def _worker(index: int, *args) -> None:
+    # Ctrl+C reaches the whole process group; workers stop on the supervisor's sentinel
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run(_run_worker(index, *args), UVLOOP)
+
+
+class Supervisor:
+    """Receive updates once and shard them over `workers` processes."""
+
+    def __init__(self, workers: int, data_dir: Path = DATA_DIR):
+        self.data_dir = data_dir
+        self.global_bucket = SharedTokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_RATE, context)
+        # The support and feedback chats get messages from every worker
+        self.chat_buckets = {
+            chat_id: SharedTokenBucket(SEND_GROUP_RATE, max(1.0, SEND_GROUP_RATE * 60), context)
+            for chat_id in {SUPPORT_CHAT_ID, FEEDBACK_CHAT_ID}
+        }
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.ready = [context.Event() for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+
+    def spawn(self, index: int) -> None:
+        self.ready[index].clear()
+        process = context.Process(
+            target=_worker,
+            args=(index, len(self.queues), self.queues[index], self.ready[index], self.data_dir, self.global_bucket, self.chat_buckets),
+            name=f"worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until every worker has started up."""
+        return all(event.wait(timeout) for event in self.ready)
+
+    def dispatch(self, update: Dict[str, Any]) -> None:
+        index = shard_key(update) % len(self.queues)
+        self.queues[index].put(update)
+        INGRESS_UPDATES.inc(str(index))
+
+    async def watch(self, interval: float = 1.0) -> None:
+        """Restart workers that died; their queued updates are kept."""
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.warning("Worker %s exited with %s, restarting", index, process.exitcode)
+                    self.spawn(index)
+
+    def stop(self, timeout: float = 15.0) -> None:
+        """Let workers finish queued updates, then stop them."""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    async def poll(self, bot: Bot) -> None:
+        """Receive updates with long polling."""
+        await bot.delete_webhook()
+        method = GetUpdates(timeout=POLLING_TIMEOUT, allowed_updates=router.resolve_used_update_types())
+        backoff = 1.0
+        while True:
+            try:
+                updates = await bot(method, request_timeout=int(bot.session.timeout + POLLING_TIMEOUT))
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning("getUpdates failed (%s), retrying in %ss", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+            backoff = 1.0
+            for update in updates:
+                method.offset = update.update_id + 1
+                self.dispatch(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+
+    async def serve_webhook(self, bot: Bot) -> None:
+        """Receive updates on an aiohttp server and answer Telegram right away."""
+        async def handle(request: web.Request) -> web.Response:
+            if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+                return web.Response(status=401)
+            self.dispatch(await request.json())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, handle)
+
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=router.resolve_used_update_types(),
+            )
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def run(self) -> None:
+        for index in range(len(self.queues)):
+            self.spawn(index)
+
+        main_task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+
+        bot = create_bot()
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        watcher = asyncio.create_task(self.watch())
+        try:
+            await sync_commands(bot, COMMANDS, self.data_dir / COMMANDS_STATE)
+            if MODE == "webhook":
+                await self.serve_webhook(bot)
+            else:
+                await self.poll(bot)
+        finally:
+            watcher.cancel()
+            await asyncio.to_thread(self.stop)
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await bot.session.close()
+
+
+def run_supervisor(workers: int) -> None:
+    run(Supervisor(workers).run(), UVLOOP)
@@ -0,0 +1,45 @@
+import html
+from string import Formatter
+from typing import Any, Iterable, List, Optional, Tuple
+
+
+class Template:
+    """HTML message template parsed once.
+
+    Rendering joins the prepared literal parts with the field values, which
+    are HTML-escaped unless listed in `raw` (text that is already HTML, such
+    as a message's `html_text` or another rendered template).
+    """
+
+    def __init__(self, text: str, raw: Iterable[str] = ()):
+        self.text = text
+        raw = set(raw)
+        self._parts: List[Tuple[str, Optional[str], bool]] = [
+            (literal, field, field in raw)
+            for literal, field, _, _ in Formatter().parse(text)
+        ]
+
+    def render(self, **values: Any) -> str:
+        out = []
+        for literal, field, is_raw in self._parts:
+            out.append(literal)
+            if field is not None:
+                value = str(values[field])
+                out.append(value if is_raw else html.escape(value, quote=False))
+        return "".join(out)
+
+
+WELCOME = Template(
+    "⚙️ Здравствуйте, {username}! Это бот поддержки.\n"
+    "Вы можете обратиться в поддержку или оставить отзыв, нажав на кнопки ниже."
+)
+
+REQUEST_HEADER = Template("{intro}\n{full_name} (ID: <code>{user_id}</code>)")
+REQUEST_ASSIGNED = Template("{header}\n👤 Ведёт: {mention}", raw=("header", "mention"))
+REQUEST_WITH_BODY = Template("{header}:\n\n<blockquote expandable>{body}</blockquote>", raw=("header", "body"))
+
+MENTION = Template('<a href="tg://user?id={user_id}">{full_name}</a>')
+ASSIGNED = Template("📌 Заявку #{ticket_id} ({full_name}) теперь ведёт {mention}", raw=("mention",))
+
+FEEDBACK_HEADER = Template("{title}\n\nОт: {full_name}\nUsername: @{username}\nID: {user_id}")
+FEEDBACK_WITH_BODY = Template("{header}\n\nОтзыв:\n{body}", raw=("header", "body"))
@@ -0,0 +1,160 @@
+"""Feedback digest benchmark: Bot API calls to the feedback chat with and without the digest.
+
+Replays feedback conversations ("send_feedback" -> text, photo or album)
+through the real dispatcher over long polling against the fake Bot API,
+once posting every feedback on its own and once in digest mode, and
+reports the calls made to the feedback chat and the cut between the two.
+The run is shorter than the digest's max delay: batches go out when full
+and the rest on shutdown. Each mode runs in its own process, as the
+routers attach to one dispatcher only.
+
+Usage:
+    python bench/digest.py [--feedback N] [--mix text,photo,album]
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TOKEN = "123456:bench"
+FEEDBACK_CHAT_ID = -1002
+
+# Settings are read on import, so the environment goes first
+os.environ.update({
+    "TOKEN": TOKEN,
+    "SUPPORT_CHAT_ID": "-1001",
+    "FEEDBACK_CHAT_ID": str(FEEDBACK_CHAT_ID),
+    "SEND_GLOBAL_RATE": "100000",
+    "SEND_CHAT_RATE": "100000",
+    "SEND_GROUP_RATE": "100000",
+})
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from app.main import create_dispatcher  # noqa: E402
+from app.services import TunedSession  # noqa: E402
+from bench.fake_api import FakeTelegramAPI  # noqa: E402
+
+
+STEP_TIMEOUT = 30.0
+
+
+def _thanked(method: str, params: Dict[str, Any]) -> bool:
+    return str(params.get("text", "")).startswith("Спасибо")
+
+
+class FeedbackRun:
+    def __init__(self, api: FakeTelegramAPI):
+        self.api = api
+
+    def _message(self, user_id: int, **content) -> Dict[str, Any]:
+        return {
+            "message_id": self.api.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            **content,
+        }
+
+    def _photo(self) -> List[Dict[str, Any]]:
+        file_id = f"user-photo-{self.api.next_message_id()}"
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}]
+
+    def _feedback(self, user_id: int, kind: str) -> List[Dict[str, Any]]:
+        if kind == "text":
+            return [{"message": self._message(user_id, text=f"Отзыв от {user_id}: всё понравилось, спасибо!")}]
+        if kind == "photo":
+            return [{"message": self._message(user_id, photo=self._photo(), caption="Скриншот")}]
+        group = f"album-{user_id}"
+        return [{"message": self._message(user_id, photo=self._photo(), media_group_id=group)} for _ in range(3)]
+
+    async def feedback(self, user_id: int, kind: str) -> None:
+        prompt = self.api.expect(user_id)
+        self.api.push_update({"callback_query": {
+            "id": str(self.api.next_message_id()),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "chat_instance": str(user_id),
+            "data": "send_feedback",
+            "message": self._message(user_id, text="menu"),
+        }})
+        await asyncio.wait_for(prompt, STEP_TIMEOUT)
+
+        thanked = self.api.expect(user_id, _thanked)
+        for update in self._feedback(user_id, kind):
+            self.api.push_update(update)
+        await asyncio.wait_for(thanked, STEP_TIMEOUT)
+
+
+async def run(digest: bool, args: argparse.Namespace, kinds: List[str]) -> int:
+    """Replay the feedback and return the calls made to the feedback chat."""
+    api = FakeTelegramAPI(bot_id=int(TOKEN.split(":")[0]))
+    url = await api.start()
+    session = TunedSession(api=TelegramAPIServer.from_base(url))
+    bot = Bot(token=TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            dp = await create_dispatcher(bot, Path(data_dir), feedback_digest=digest)
+            polling = asyncio.create_task(
+                dp.start_polling(bot, handle_signals=False, handle_as_tasks=False, polling_timeout=1)
+            )
+            started = time.perf_counter()
+            run = FeedbackRun(api)
+            limit = asyncio.Semaphore(args.concurrency)
+
+            async def one(user_id: int) -> None:
+                async with limit:
+                    await run.feedback(user_id, kinds[user_id % len(kinds)])
+
+            try:
+                await asyncio.gather(*(one(user_id) for user_id in range(10_000, 10_000 + args.feedback)))
+            finally:
+                # Shutdown flushes the digest and lets the outbox deliver it
+                await dp.stop_polling()
+                await polling
+            elapsed = time.perf_counter() - started
+    finally:
+        await bot.session.close()
+        await api.close()
+
+    calls = api.chat_calls[FEEDBACK_CHAT_ID]
+    print(f"{'digest' if digest else 'direct':<8}{args.feedback:>10}{calls:>8}{elapsed:>10.2f}s")
+    return calls
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"{'mode':<8}{'feedback':>10}{'calls':>8}{'time':>11}")
+    calls = {}
+    for mode in ("direct", "digest"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, *sys.argv[1:]],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        print(output)
+        calls[mode] = int(output.split()[2])
+    print(f"api calls to the feedback chat cut {calls['direct'] / max(calls['digest'], 1):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--feedback", type=int, default=500, help="Feedback messages to replay")
+    parser.add_argument("--mix", default="text,text,text,photo,album", help="Feedback kinds, picked round robin")
+    parser.add_argument("--concurrency", type=int, default=50, help="Users sending feedback at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", choices=["direct", "digest"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode is None:
+        main(args)
+    else:
+        kinds = [kind.strip() for kind in args.mix.split(",") if kind.strip()]
+        random.Random(args.seed).shuffle(kinds)
+        asyncio.run(run(args.mode == "digest", args, kinds))
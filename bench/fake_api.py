@@ -0,0 +1,151 @@
+"""In-process fake Telegram Bot API server for benchmarks.
+
+Implements the methods the bot uses, hands out updates through getUpdates
+and lets the load generator wait for the bot's outgoing messages.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+
+Predicate = Callable[[str, Dict[str, Any]], bool]
+
+
+def _decode(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class FakeTelegramAPI:
+    def __init__(self, bot_id: int = 1, latency: float = 0.0):
+        self.bot_id = bot_id
+        # Simulated round trip of every call but getUpdates
+        self.latency = latency
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.calls: Counter = Counter()
+        self.chat_calls: Counter = Counter()
+        self._waiters: Dict[int, List] = defaultdict(list)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    # -- updates --------------------------------------------------------
+
+    def push_update(self, payload: Dict[str, Any]) -> int:
+        update_id = next(self.update_ids)
+        self.updates.put_nowait({"update_id": update_id, **payload})
+        return update_id
+
+    def next_message_id(self) -> int:
+        return next(self.message_ids)
+
+    def expect(self, chat_id: int, predicate: Optional[Predicate] = None) -> asyncio.Future:
+        """Return a future resolved with the next matching call to a chat."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[int(chat_id)].append((predicate, future))
+        return future
+
+    def _notify(self, method: str, params: Dict[str, Any], result: Any) -> None:
+        chat_id = params.get("chat_id")
+        if chat_id is None:
+            return
+        waiters = self._waiters.get(int(chat_id))
+        if not waiters:
+            return
+        for item in list(waiters):
+            predicate, future = item
+            if future.done():
+                waiters.remove(item)
+            elif predicate is None or predicate(method, params):
+                waiters.remove(item)
+                future.set_result((method, params, result))
+                return
+
+    # -- API ------------------------------------------------------------
+
+    def _message(self, chat_id: Any, **extra) -> Dict[str, Any]:
+        chat_id = int(chat_id)
+        return {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+            "from": {"id": self.bot_id, "is_bot": True, "first_name": "Bot"},
+            **extra,
+        }
+
+    def _photo(self) -> List[Dict[str, Any]]:
+        file_id = f"photo{next(self.file_ids)}"
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}]
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        timeout = float(params.get("timeout") or 0)
+        if self.updates.empty() and timeout:
+            try:
+                first = await asyncio.wait_for(self.updates.get(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            batch = [first]
+        else:
+            batch = []
+        limit = int(params.get("limit") or 100)
+        while len(batch) < limit and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        self.calls[method] += 1
+        if params.get("chat_id") is not None:
+            self.chat_calls[int(params["chat_id"])] += 1
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return {"id": self.bot_id, "is_bot": True, "first_name": "Bot", "username": "bench_bot"}
+        if method == "sendPhoto":
+            result = self._message(params["chat_id"], photo=self._photo(), caption=params.get("caption"))
+        elif method == "sendMediaGroup":
+            result = [self._message(params["chat_id"], photo=self._photo()) for _ in params["media"]]
+        elif method == "copyMessage":
+            result = {"message_id": self.next_message_id()}
+        elif method == "copyMessages":
+            result = [{"message_id": self.next_message_id()} for _ in params["message_ids"]]
+        elif method.startswith("send"):
+            result = self._message(params["chat_id"], text=params.get("text"))
+        else:
+            # answerCallbackQuery, editMessageReplyMarkup, setMyCommands, deleteWebhook, ...
+            result = True
+        self._notify(method, params, result)
+        return result
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        params = {key: _decode(value) for key, value in form.items() if isinstance(value, str)}
+        if self.latency and request.match_info["method"] != "getUpdates":
+            await asyncio.sleep(self.latency)
+        result = await self.call(request.match_info["method"], params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
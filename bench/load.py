@@ -0,0 +1,320 @@
+"""End-to-end load benchmark against the in-process fake Bot API.
+
+Replays synthetic conversations through the real dispatcher over long
+polling:
+
+    /start -> "apply_request" -> text/photo/album request
+           -> admin reply in the support chat -> "t_close_<ticket>"
+
+and reports updates/sec, end-to-end latency percentiles (update pushed ->
+bot's answer received by the fake API), event loop lag percentiles and
+memory per 1000 open conversations. --loop compares the stock asyncio
+loop with uvloop, when it's installed.
+
+Usage:
+    python bench/load.py [--sessions N] [--rate R] [--mix text,photo,album] [--active N] [--workers N]
+                         [--loop asyncio|uvloop]
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TOKEN = "123456:bench"
+SUPPORT_CHAT_ID = -1001
+FEEDBACK_CHAT_ID = -1002
+# Admins answering in the support chat
+ADMIN_IDS = range(42, 47)
+
+# Settings are read on import, so the environment goes first
+os.environ.update({
+    "TOKEN": TOKEN,
+    "SUPPORT_CHAT_ID": str(SUPPORT_CHAT_ID),
+    "FEEDBACK_CHAT_ID": str(FEEDBACK_CHAT_ID),
+    "SEND_GLOBAL_RATE": os.environ.get("SEND_GLOBAL_RATE", "100000"),
+    "SEND_CHAT_RATE": os.environ.get("SEND_CHAT_RATE", "100000"),
+    "SEND_GROUP_RATE": os.environ.get("SEND_GROUP_RATE", "100000"),
+    "SEND_CONCURRENCY": os.environ.get("SEND_CONCURRENCY", "64"),
+})
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from app.keyboards import ADMIN_CLOSE  # noqa: E402
+from app.main import create_dispatcher  # noqa: E402
+from app.runtime import LoopMonitor, loop_factory, run  # noqa: E402
+from app.services import Database, TicketStore, TunedSession  # noqa: E402
+from bench.fake_api import FakeTelegramAPI  # noqa: E402
+
+
+STEP_TIMEOUT = 30.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _text(params: Dict[str, Any]) -> str:
+    return str(params.get("text") or params.get("caption") or "")
+
+
+class Conversation:
+    """One synthetic user walking through the support flow."""
+
+    def __init__(self, bench: "LoadBench", user_id: int, kind: str):
+        self.bench = bench
+        self.api = bench.api
+        self.user_id = user_id
+        self.kind = kind
+        self.user = {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"}
+        self.chat = {"id": user_id, "type": "private", "first_name": "User"}
+
+    def _message(self, chat: Dict[str, Any], user: Dict[str, Any], **content) -> Dict[str, Any]:
+        return {
+            "message_id": self.api.next_message_id(),
+            "date": int(time.time()),
+            "chat": chat,
+            "from": user,
+            **content,
+        }
+
+    def _callback(self, data: str, chat: Dict[str, Any], user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "callback_query": {
+                "id": str(self.api.next_message_id()),
+                "from": user,
+                "chat_instance": str(chat["id"]),
+                "data": data,
+                "message": self._message(chat, {"id": 123456, "is_bot": True, "first_name": "Bot"}, text="menu"),
+            }
+        }
+
+    def _photo(self) -> List[Dict[str, Any]]:
+        file_id = f"user-photo-{self.api.next_message_id()}"
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}]
+
+    async def _step(self, name: str, updates: List[Dict[str, Any]], chat_id: int, predicate=None):
+        """Push updates and wait for the bot's answer in a chat."""
+        expected = self.api.expect(chat_id, predicate)
+        started = time.perf_counter()
+        for update in updates:
+            self.api.push_update(update)
+        self.bench.pushed += len(updates)
+        result = await asyncio.wait_for(expected, STEP_TIMEOUT)
+        self.bench.latencies[name].append(time.perf_counter() - started)
+        return result
+
+    def _request_updates(self) -> List[Dict[str, Any]]:
+        if self.kind == "text":
+            return [{"message": self._message(self.chat, self.user, text=f"Help me, request of {self.user_id}")}]
+        if self.kind == "photo":
+            return [{"message": self._message(self.chat, self.user, photo=self._photo(), caption="Screenshot")}]
+        group = f"album-{self.user_id}"
+        return [
+            {"message": self._message(self.chat, self.user, photo=self._photo(), media_group_id=group)}
+            for _ in range(3)
+        ]
+
+    async def open(self) -> int:
+        """Go from /start to a ticket in the support chat; return the header message id."""
+        start = self._message(
+            self.chat, self.user, text="/start",
+            entities=[{"type": "bot_command", "offset": 0, "length": 6}],
+        )
+        await self._step("start", [{"message": start}], self.user_id)
+        await self._step("apply", [self._callback("apply_request", self.chat, self.user)], self.user_id)
+
+        marker = f"<code>{self.user_id}</code>"
+        _, params, result = await self._step(
+            f"request_{self.kind}",
+            self._request_updates(),
+            SUPPORT_CHAT_ID,
+            lambda method, params: marker in _text(params) and params.get("reply_markup") is not None,
+        )
+        self.ticket_id = int(params["reply_markup"]["inline_keyboard"][0][0]["callback_data"].rsplit("_", 1)[1])
+        return result["message_id"]
+
+    async def run(self) -> None:
+        header_id = await self.open()
+
+        # The ticket learns its support chat message ids once the send completes
+        while await self.bench.tickets.ticket_for_message(SUPPORT_CHAT_ID, header_id) is None:
+            await asyncio.sleep(0.005)
+
+        support_chat = {"id": SUPPORT_CHAT_ID, "type": "supergroup", "title": "Support"}
+        admin = {"id": ADMIN_IDS[self.user_id % len(ADMIN_IDS)], "is_bot": False, "first_name": "Admin"}
+        reply_to = self._message(support_chat, {"id": 123456, "is_bot": True, "first_name": "Bot"}, text="header")
+        reply_to["message_id"] = header_id
+        reply = self._message(support_chat, admin, text="Solved", reply_to_message=reply_to)
+        await self._step("admin_reply", [{"message": reply}], self.user_id)
+
+        await self._step("close", [self._callback(f"{ADMIN_CLOSE}{self.ticket_id}", support_chat, admin)], self.user_id)
+
+
+class LoadBench:
+    def __init__(self, api: FakeTelegramAPI, tickets: TicketStore):
+        self.api = api
+        self.tickets = tickets
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.pushed = 0
+        self.failed: Counter = Counter()
+        self.user_ids = itertools.count(1_000_000)
+
+    async def _guard(self, coro) -> None:
+        try:
+            await coro
+        except Exception as e:
+            self.failed[type(e).__name__] += 1
+
+    async def sessions(self, count: int, rate: float, mix: List[str]) -> float:
+        """Start `count` full conversations at `rate` per second; return the elapsed time."""
+        tasks = []
+        started = time.perf_counter()
+        for i in range(count):
+            conversation = Conversation(self, next(self.user_ids), random.choice(mix))
+            tasks.append(asyncio.create_task(self._guard(conversation.run())))
+            if rate:
+                delay = started + (i + 1) / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    async def memory(self, active: int, mix: List[str]) -> float:
+        """Open `active` conversations without closing them; return bytes per 1000."""
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        conversations = [Conversation(self, next(self.user_ids), random.choice(mix)) for _ in range(active)]
+        await asyncio.gather(*(self._guard(c.open()) for c in conversations))
+        # Let queued sends and ticket bookkeeping settle
+        await asyncio.sleep(0.5)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return (after - before) * 1000 / active
+
+
+def report(
+    bench: LoadBench,
+    sessions: int,
+    elapsed: float,
+    per_thousand: Optional[float],
+    monitor: Optional[LoopMonitor] = None,
+) -> None:
+    print(f"sessions: {sessions} in {elapsed:.2f}s, failed: {dict(bench.failed) or 0}")
+    print(f"updates/sec: {bench.pushed / elapsed:.1f} ({bench.pushed} updates)")
+    print(f"{'step':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    every = []
+    for name, values in bench.latencies.items():
+        every.extend(values)
+        print(f"{name:<16}{len(values):>8}{percentile(values, 0.5) * 1000:>10.1f}{percentile(values, 0.99) * 1000:>10.1f}")
+    print(f"{'all':<16}{len(every):>8}{percentile(every, 0.5) * 1000:>10.1f}{percentile(every, 0.99) * 1000:>10.1f}")
+    if monitor is not None:
+        print(
+            f"loop lag ms: p50 {monitor.quantile(0.5) * 1000:.1f}, p99 {monitor.quantile(0.99) * 1000:.1f}, "
+            f"max {monitor.quantile(1.0) * 1000:.1f}, stalls {monitor.stalls}"
+        )
+    if per_thousand is not None:
+        print(f"memory per 1000 active conversations: {per_thousand / 1024 / 1024:.2f} MiB")
+    print("api calls:", dict(bench.api.calls.most_common()))
+
+
+async def run_single(bot: Bot, data_dir: Path, api: FakeTelegramAPI, args: argparse.Namespace, mix: List[str]) -> None:
+    dp = await create_dispatcher(bot, data_dir)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, handle_as_tasks=False, polling_timeout=1))
+    bench = LoadBench(api, dp["tickets"])
+    monitor = dp["loop_monitor"]
+    try:
+        elapsed = await bench.sessions(args.sessions, args.rate, mix)
+        # Lag of the sessions run only, the memory probe would skew it
+        lags = list(monitor.lags)
+        # The memory probe runs under tracemalloc, keep its timings out of the report
+        pushed, latencies = bench.pushed, bench.latencies
+        bench.latencies = defaultdict(list)
+        per_thousand = await bench.memory(args.active, mix) if args.active else None
+        bench.pushed, bench.latencies = pushed, latencies
+        monitor.lags.clear()
+        monitor.lags.extend(lags)
+        report(bench, args.sessions, elapsed, per_thousand, monitor)
+    finally:
+        await dp.stop_polling()
+        await polling
+
+
+async def run_workers(bot: Bot, data_dir: Path, api: FakeTelegramAPI, args: argparse.Namespace, mix: List[str]) -> None:
+    """Drive the multi-process supervisor; this process is the ingress."""
+    from app.supervisor import Supervisor
+
+    # Workers are spawned and read their settings on start
+    os.environ["API_URL"] = api.url
+    os.environ["UVLOOP"] = str(args.loop == "uvloop")
+    supervisor = Supervisor(args.workers, data_dir)
+    for index in range(args.workers):
+        supervisor.spawn(index)
+    await asyncio.to_thread(supervisor.wait_ready)
+    ingress = asyncio.create_task(supervisor.poll(bot))
+
+    db = Database(data_dir / "support.db")
+    await db.connect()
+    tickets = TicketStore(db)
+    await tickets.setup()
+    bench = LoadBench(api, tickets)
+    # Lag of the ingress loop; workers export theirs on their metrics ports
+    monitor = LoopMonitor()
+    await monitor.start()
+    try:
+        elapsed = await bench.sessions(args.sessions, args.rate, mix)
+        report(bench, args.sessions, elapsed, None, monitor)
+    finally:
+        await monitor.stop()
+        ingress.cancel()
+        await asyncio.to_thread(supervisor.stop)
+        await db.close()
+
+
+async def main(args: argparse.Namespace) -> None:
+    mix = [kind.strip() for kind in args.mix.split(",") if kind.strip()]
+    api = FakeTelegramAPI(bot_id=int(TOKEN.split(":")[0]))
+    url = await api.start()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        session = TunedSession(api=TelegramAPIServer.from_base(url))
+        bot = Bot(token=TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+        run = run_workers if args.workers > 1 else run_single
+        try:
+            await run(bot, Path(data_dir), api, args, mix)
+        finally:
+            await bot.session.close()
+            await api.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark against a fake Bot API")
+    parser.add_argument("--sessions", type=int, default=200, help="Full conversations to replay")
+    parser.add_argument("--rate", type=float, default=50.0, help="New conversations per second, 0 for all at once")
+    parser.add_argument("--mix", default="text,photo,album", help="Request kinds to pick from")
+    parser.add_argument("--active", type=int, default=1000, help="Open conversations for the memory probe, 0 to skip")
+    parser.add_argument("--workers", type=int, default=1, help="Run the multi-process supervisor with N workers")
+    parser.add_argument("--loop", choices=("asyncio", "uvloop"), default="asyncio", help="Event loop to run on")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    if args.loop == "uvloop" and loop_factory() is None:
+        parser.error("uvloop is not installed")
+    run(main(args), args.loop == "uvloop")
@@ -0,0 +1,89 @@
+"""Startup benchmark: time from process start to the first answered update.
+
+Starts the fake Bot API with a simulated round trip, queues a /start update
+and launches `python -m app.main` against it, twice with the same data
+directory: the first start sets the bot commands, the second finds them
+unchanged. Prints the bot's startup log line and the time to the answer.
+
+Usage:
+    python bench/startup.py [--latency SECONDS] [--runs N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fake_api import FakeTelegramAPI  # noqa: E402
+
+
+ROOT = Path(__file__).resolve().parent.parent
+USER_ID = 1000
+
+
+def start_update() -> dict:
+    user = {"id": USER_ID, "is_bot": False, "first_name": "Bench", "username": "bench"}
+    return {"message": {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": user,
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }}
+
+
+async def run_once(api: FakeTelegramAPI, data_dir: Path) -> float:
+    api.push_update(start_update())
+    answered = api.expect(USER_ID)
+    env = dict(
+        os.environ,
+        TOKEN="123456:bench",
+        SUPPORT_CHAT_ID="-1001",
+        FEEDBACK_CHAT_ID="-1002",
+        API_URL=api.url,
+        DATA_DIR=str(data_dir),
+        METRICS_PORT="0",
+    )
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "app.main",
+        cwd=ROOT, env=env, stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        await asyncio.wait_for(answered, 60)
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        _, stderr = await process.communicate()
+    for line in stderr.decode().splitlines():
+        if "Startup:" in line or "First update" in line:
+            print("   ", line.split(": ", 1)[-1])
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated Bot API round trip")
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        for run in range(1, args.runs + 1):
+            # A fresh server each run: a stopped bot's long poll would take the next update
+            api = FakeTelegramAPI(latency=args.latency)
+            await api.start()
+            try:
+                elapsed = await run_once(api, Path(data_dir))
+            finally:
+                await api.close()
+            calls = {method: count for method, count in api.calls.items() if method != "getUpdates"}
+            print(f"run {run}: first update answered after {elapsed:.2f}s, API calls: {calls}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
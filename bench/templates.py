@@ -0,0 +1,86 @@
+"""Microbenchmark of building a relayed request: header, keyboard and the outbox record.
+
+Compares the cached keyboards and compiled templates with building both
+from scratch, as the handlers used to, for a working set of open tickets.
+Reports time and peak transient allocation per relayed request.
+
+Usage:
+    python bench/templates.py [--requests N] [--tickets N]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Settings are read on import, so the environment goes first
+os.environ.update({"TOKEN": "123456:bench", "SUPPORT_CHAT_ID": "-1001", "FEEDBACK_CHAT_ID": "-1002"})
+
+from aiogram.methods import SendMessage  # noqa: E402
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+from app.keyboards import get_admin_keyboard  # noqa: E402
+from app.services.outbox import dump_method  # noqa: E402
+from app.texts import REQUEST_HEADER, REQUEST_WITH_BODY  # noqa: E402
+
+
+FULL_NAME = "Иван <Петров> & Co"
+BODY = "Не проходит оплата картой, пишет <b>ошибка</b> 502. Что делать?"
+
+
+def build_old(ticket_id: int) -> Dict:
+    """The previous code path: fresh keyboard and f-string header."""
+    text = f"Опять работать... \n{FULL_NAME} (ID: <code>{ticket_id}</code>)"
+    text = f"{text}:\n\n<blockquote expandable>{BODY}</blockquote>"
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🖌 Ответить", callback_data=f"reply_{ticket_id}")],
+        [InlineKeyboardButton(text="❌ Закрыть заявку", callback_data=f"close_{ticket_id}")]
+    ])
+    return dump_method(SendMessage(chat_id=-1001, text=text, reply_markup=keyboard))
+
+
+def build_new(ticket_id: int) -> Dict:
+    header = REQUEST_HEADER.render(intro="Опять работать... ", full_name=FULL_NAME, user_id=ticket_id)
+    text = REQUEST_WITH_BODY.render(header=header, body=BODY)
+    return dump_method(SendMessage(chat_id=-1001, text=text, reply_markup=get_admin_keyboard(ticket_id)))
+
+
+def measure(build: Callable[[int], Dict], requests: int, tickets: int) -> Dict[str, float]:
+    for ticket_id in range(tickets):
+        build(ticket_id)
+
+    started = time.perf_counter()
+    for i in range(requests):
+        build(i % tickets)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    peaks = 0
+    sample = min(requests, 2000)
+    for i in range(sample):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        build(i % tickets)
+        peaks += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {"us": elapsed / requests * 1e6, "bytes": peaks / sample}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--tickets", type=int, default=500, help="Open tickets the requests belong to")
+    args = parser.parse_args()
+
+    print(f"{'':10}{'us/request':>12}{'peak bytes':>12}")
+    for name, build in (("rebuilt", build_old), ("cached", build_new)):
+        result = measure(build, args.requests, args.tickets)
+        print(f"{name:10}{result['us']:12.1f}{result['bytes']:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+import datetime
+import time
+
+from aiogram.methods import CopyMessages
+from aiogram.types import Chat, Message, PhotoSize
+
+from app.middlewares.album import AlbumMiddleware
+from app.services.relay import copy_plain
+
+
+def photo(message_id, media_group_id="g"):
+    size = PhotoSize(file_id=f"file-{message_id}", file_unique_id=f"u{message_id}", width=90, height=90)
+    return Message(
+        message_id=message_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=5, type="private"),
+        photo=[size],
+        media_group_id=media_group_id,
+    )
+
+
+def feed(middleware, parts, gap=0.01):
+    """Feed parts `gap` seconds apart; returns the albums the handler got and when."""
+    albums = []
+    started = time.monotonic()
+
+    async def handler(event, data):
+        albums.append((data.get("album"), time.monotonic() - started))
+
+    async def main():
+        tasks = []
+        for part in parts:
+            tasks.append(asyncio.create_task(middleware(handler, part, {})))
+            await asyncio.sleep(gap)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return albums
+
+
+def test_parts_are_collected_into_one_copy():
+    middleware = AlbumMiddleware(quiet=0.05)
+    albums = feed(middleware, [photo(3), photo(1), photo(2)])
+
+    [(album, _)] = albums
+    assert [message.message_id for message in album] == [1, 2, 3]
+    assert not middleware.album_data
+    [method] = copy_plain(album, -100)
+    assert isinstance(method, CopyMessages)
+    assert method.message_ids == [1, 2, 3]
+
+
+def test_albums_are_kept_apart():
+    albums = feed(AlbumMiddleware(quiet=0.05), [photo(1, "a"), photo(2, "b"), photo(3, "a")])
+    assert sorted(len(album) for album, _ in albums) == [1, 2]
+
+
+def test_full_album_is_passed_on_without_waiting():
+    albums = feed(AlbumMiddleware(quiet=1.0), [photo(i) for i in range(10)], gap=0)
+    [(album, elapsed)] = albums
+    assert len(album) == 10
+    assert elapsed < 0.5
+
+
+def test_message_without_group_passes_straight_through():
+    albums = feed(AlbumMiddleware(), [photo(1, media_group_id=None)])
+    assert albums[0][0] is None
+
+
+def test_too_many_groups_are_passed_on_part_by_part():
+    middleware = AlbumMiddleware(quiet=0.05, max_groups=1)
+    albums = feed(middleware, [photo(1, "a"), photo(2, "b")])
+    assert [[message.message_id for message in album] for album, _ in albums] == [[2], [1]]
@@ -0,0 +1,94 @@
+import asyncio
+import random
+
+import pytest
+
+from app.services.analytics import Analytics, QuantileSketch
+from app.services.database import Database
+from app.services.tickets import TicketStore
+
+
+def exact(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(3, 2) for _ in range(20000)]
+    sketch = QuantileSketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.0, 0.5, 0.9, 0.99, 1.0):
+        assert sketch.quantile(q) == pytest.approx(exact(values, q), rel=0.01)
+
+
+def test_empty_sketch_and_tiny_values():
+    sketch = QuantileSketch(min_value=1e-3)
+    assert sketch.quantile(0.5) is None
+    sketch.add(0.0)
+    assert sketch.quantile(0.5) == pytest.approx(1e-3, rel=0.01)
+
+
+def test_sketch_survives_a_save():
+    sketch = QuantileSketch()
+    for value in range(1, 1001):
+        sketch.add(value)
+    loaded = QuantileSketch()
+    # JSON turns the bucket indexes into strings
+    data = sketch.to_dict()
+    loaded.load({**data, "buckets": {str(k): v for k, v in data["buckets"].items()}})
+    assert loaded.count == 1000
+    assert loaded.quantile(0.5) == sketch.quantile(0.5)
+
+
+def test_open_count_follows_closes_by_other_processes(tmp_path):
+    async def main():
+        db = Database(tmp_path / "support.db")
+        await db.connect()
+        tickets = TicketStore(db)
+        await tickets.setup()
+        first = await tickets.create(1, "A")
+        await tickets.create(2, "B")
+
+        analytics = Analytics(tmp_path / "analytics.json", refresh_interval=0.01)
+        await analytics.setup(tickets)
+        await analytics.start()
+        opened = analytics.open
+        # Closed by another worker: this process sees no ticket_closed
+        await tickets.close(first.id, "admin")
+        await asyncio.sleep(0.1)
+        refreshed = analytics.open
+        await analytics.close()
+        await db.close()
+        return opened, refreshed
+
+    assert asyncio.run(main()) == (2, 1)
+
+
+def test_merged_adds_every_workers_snapshot(tmp_path):
+    now = 7200.0 * 100
+    first = Analytics(tmp_path / "analytics-0.json", peers=[tmp_path / "analytics-1.json"])
+    second = Analytics(tmp_path / "analytics-1.json", peers=[tmp_path / "analytics-0.json"])
+    first.ticket_created(now - 3600)
+    first.ticket_created(now)
+    first.first_reply(now - 10, now)
+    # As read from the database
+    first.open = 3
+    # A day old: the first worker's newer bucket holds that slot
+    second.created.add(now - 3600 * 24)
+    second.ticket_created(now - 1800)
+    second.ticket_closed(now - 100, now)
+    second.first_reply(now - 30, now)
+    second.save()
+
+    merged = first.merged()
+    assert merged.open == 3
+    assert merged.created.total(now, 1) == 1
+    assert merged.created.total(now) == 3
+    assert merged.closed.total(now) == 1
+    assert merged.first_response.count == 2
+    assert merged.resolution.quantile(0.5) == pytest.approx(100, rel=0.01)
+    # Merging doesn't touch the worker's own aggregates
+    assert first.first_response.count == 1
+    assert first.save_interval == 5.0
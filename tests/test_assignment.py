@@ -0,0 +1,114 @@
+import asyncio
+
+from app.services.assignment import Assigner
+from app.services.database import Database
+from app.services.tickets import TicketStore
+
+
+class FakeSender:
+    def __init__(self):
+        self.texts = []
+
+    def submit(self, method, priority=None):
+        self.texts.append(method.text)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+
+async def open_assigner(path, max_load=10):
+    db = Database(path)
+    await db.connect()
+    tickets = TicketStore(db)
+    await tickets.setup()
+    assigner = Assigner(db, tickets, FakeSender(), -100, max_load=max_load, refresh_interval=0)
+    await assigner.setup()
+    return assigner
+
+
+def test_losing_a_claim_race_returns_the_winner(tmp_path):
+    async def main():
+        # Two worker processes on one database
+        first = await open_assigner(tmp_path / "support.db")
+        second = await open_assigner(tmp_path / "support.db")
+        await first.set_online(1, "Anna", True)
+        await second.set_online(2, "Boris", True)
+        for assigner in (first, second):
+            await assigner.refresh()
+        created = await first.tickets.create(10, "User")
+
+        tickets = [await first.tickets.get(created.id), await second.tickets.get(created.id)]
+        owners = await asyncio.gather(
+            first.claim(tickets[0], 1, "Anna"),
+            second.claim(tickets[1], 2, "Boris"),
+        )
+        assignee = (await first.tickets.get(created.id)).assignee
+        await first.db.close()
+        await second.db.close()
+        return owners, assignee
+
+    owners, assignee = asyncio.run(main())
+    assert owners.count(None) == 1
+    loser = owners[0] or owners[1]
+    assert loser.user_id == assignee
+    # The winner is the admin who got None
+    assert owners[assignee - 1] is None
+
+
+def test_claim_takes_a_ticket_from_an_offline_owner(tmp_path):
+    async def main():
+        assigner = await open_assigner(tmp_path / "support.db")
+        await assigner.set_online(1, "Anna", True)
+        ticket = await assigner.tickets.create(10, "User")
+        await assigner.assign_new(ticket)
+        await assigner.set_online(2, "Boris", True)
+        # Boris can't take Anna's ticket while she is online
+        blocked = await assigner.claim(await assigner.tickets.get(ticket.id), 2, "Boris")
+        await assigner.set_online(1, "Anna", False)
+        taken = await assigner.claim(await assigner.tickets.get(ticket.id), 2, "Boris")
+        assignee = (await assigner.tickets.get(ticket.id)).assignee
+        await assigner.db.close()
+        return blocked, taken, assignee
+
+    blocked, taken, assignee = asyncio.run(main())
+    assert blocked.user_id == 1
+    assert taken is None
+    assert assignee == 2
+
+
+def test_release_hands_out_the_longest_waiting_ticket(tmp_path):
+    async def main():
+        assigner = await open_assigner(tmp_path / "support.db", max_load=1)
+        await assigner.set_online(1, "Anna", True)
+        tickets = [await assigner.tickets.create(user_id, f"User {user_id}") for user_id in (10, 11, 12)]
+        admins = [await assigner.assign_new(ticket) for ticket in tickets]
+        waiting = len(assigner.waiting)
+
+        await assigner.tickets.close(tickets[0].id, "admin")
+        await assigner.release(tickets[0])
+        assignees = [(await assigner.tickets.get(ticket.id)).assignee for ticket in tickets[1:]]
+        await assigner.db.close()
+        return admins, waiting, assignees, assigner
+
+    admins, waiting, assignees, assigner = asyncio.run(main())
+    assert [admin and admin.user_id for admin in admins] == [1, None, None]
+    assert waiting == 2
+    assert assignees == [1, None]
+    assert assigner.load == {1: 1}
+    assert len(assigner.waiting) == 1
+    assert len(assigner.sender.texts) == 1
+
+
+def test_coming_online_drains_the_queue(tmp_path):
+    async def main():
+        assigner = await open_assigner(tmp_path / "support.db", max_load=2)
+        for user_id in (10, 11, 12):
+            assert await assigner.assign_new(await assigner.tickets.create(user_id, "User")) is None
+        load = await assigner.set_online(1, "Anna", True)
+        await assigner.db.close()
+        return load, assigner
+
+    load, assigner = asyncio.run(main())
+    assert load == 2
+    assert [ticket_id for _, ticket_id in assigner.waiting] == [3]
+    assert len(assigner.sender.texts) == 2
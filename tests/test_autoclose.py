@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.services.analytics import Analytics
+from app.services.autoclose import AutoCloser
+from app.services.database import Database
+from app.services.tickets import TicketStore
+
+
+class FakeSender:
+    class bot:
+        id = 1
+
+    def __init__(self):
+        self.texts = []
+
+    def submit(self, method, priority=None):
+        self.texts.append((method.chat_id, method.text))
+
+
+async def open_stores(path):
+    """Two ticket stores on one database, like two worker processes."""
+    stores = []
+    for _ in range(2):
+        db = Database(path)
+        await db.connect()
+        tickets = TicketStore(db)
+        await tickets.setup()
+        stores.append(tickets)
+    return stores
+
+
+async def close_stores(stores):
+    for tickets in stores:
+        await tickets.db.close()
+
+
+def due(wheel, key):
+    level, slot = wheel.where[key]
+    return wheel.wheels[level][slot][key]
+
+
+def closer_for(tickets, tmp_path, timeout):
+    return AutoCloser(
+        tickets,
+        FakeSender(),
+        MemoryStorage(),
+        Analytics(tmp_path / "analytics.json"),
+        timeout=timeout,
+        tick=0.05,
+        rescan_interval=0.05,
+    )
+
+
+def test_rescan_arms_tickets_from_other_workers(tmp_path):
+    async def main():
+        own, other = await open_stores(tmp_path / "support.db")
+        closer = closer_for(own, tmp_path, timeout=3600)
+        await closer.setup()
+
+        # Created and touched on another worker after the wheel was built
+        created = await other.create(7, "U")
+        armed_before = created.id in closer.wheel
+        await closer.rescan()
+        armed_after = created.id in closer.wheel
+        await close_stores([own, other])
+        return armed_before, armed_after
+
+    assert asyncio.run(main()) == (False, True)
+
+
+def test_ticket_from_another_worker_expires(tmp_path):
+    async def main():
+        own, other = await open_stores(tmp_path / "support.db")
+        closer = closer_for(own, tmp_path, timeout=0.2)
+        await closer.setup()
+        await closer.start()
+        ticket = await other.create(7, "U")
+        deadline = time.monotonic() + 3
+        while (await own.get(ticket.id)).is_open and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        closed = not (await own.get(ticket.id)).is_open
+        await closer.stop()
+        await close_stores([own, other])
+        return closed, closer.sender.texts
+
+    closed, texts = asyncio.run(main())
+    assert closed
+    assert len(texts) == 1 and texts[0][0] == 7
+
+
+def test_activity_on_another_worker_pushes_the_deadline_back(tmp_path):
+    async def main():
+        own, other = await open_stores(tmp_path / "support.db")
+        ticket = await other.create(7, "U")
+        closer = closer_for(own, tmp_path, timeout=3600)
+        await closer.setup()
+        first = due(closer.wheel, ticket.id)
+        await asyncio.sleep(0.2)
+        await other.touch(ticket.id)
+        await closer.rescan()
+        moved = due(closer.wheel, ticket.id) > first
+        await close_stores([own, other])
+        return moved
+
+    assert asyncio.run(main())
@@ -0,0 +1,116 @@
+import asyncio
+from collections import Counter
+
+from app.services.broadcast import Broadcaster, Progress, load_progress
+from app.services.database import Database
+from app.services.tickets import TicketStore
+
+
+class FakeSender:
+    """Delivers every message after `delay` seconds."""
+
+    def __init__(self, delay=0.005):
+        self.delay = delay
+        self.sent = Counter()
+
+    async def _send(self, method):
+        await asyncio.sleep(self.delay)
+        self.sent[method.chat_id] += 1
+        return True
+
+    def submit(self, method, priority=None):
+        return asyncio.ensure_future(self._send(method))
+
+
+async def open_tickets(path, users):
+    db = Database(path)
+    await db.connect()
+    tickets = TicketStore(db)
+    await tickets.setup()
+    for user_id in users:
+        await tickets.create(user_id, f"user {user_id}")
+    return tickets
+
+
+def broadcaster(tickets, sender, path):
+    return Broadcaster(tickets, sender, path, workers=4, checkpoint_interval=0.02, page_size=10)
+
+
+async def wait(broadcaster):
+    while broadcaster.running:
+        await asyncio.sleep(0.01)
+
+
+def test_checkpoint_moves_the_cursor_over_the_done_prefix(tmp_path):
+    async def main():
+        tickets = await open_tickets(tmp_path / "support.db", [])
+        state = tmp_path / "broadcast.json"
+        progress = Progress(text="hi", total=5)
+        issued = {1: True, 2: True, 3: False, 4: True, 5: False}
+        await broadcaster(tickets, FakeSender(), state)._checkpoint(progress, issued)
+        await tickets.db.close()
+        return load_progress(state), list(issued)
+
+    saved, left = asyncio.run(main())
+    assert saved.cursor == 2
+    assert saved.done == [4]
+    assert left == [3, 4, 5]
+
+
+def test_interrupted_broadcast_resumes_from_its_checkpoint(tmp_path):
+    users = range(1, 101)
+    state = tmp_path / "broadcast.json"
+
+    async def main():
+        tickets = await open_tickets(tmp_path / "support.db", users)
+        sender = FakeSender()
+        first = broadcaster(tickets, sender, state)
+        await first.start("hi")
+        await asyncio.sleep(0.1)
+        # Shutdown: the checkpoint stays for the next start
+        await first.stop()
+        interrupted = load_progress(state)
+
+        second = broadcaster(tickets, sender, state)
+        resumed = await second.resume()
+        await wait(second)
+        await tickets.db.close()
+        return sender.sent, interrupted, resumed, second.progress
+
+    sent, interrupted, resumed, progress = asyncio.run(main())
+    assert 0 < interrupted.processed < 100
+    assert resumed is not None
+    assert progress.finished
+    assert set(sent) == set(users)
+    # Only the sends in flight at the interruption go out twice
+    assert sum(sent.values()) - len(sent) <= 4
+    assert load_progress(state) is None
+
+
+def test_stop_from_another_worker(tmp_path):
+    users = range(1, 201)
+    state = tmp_path / "broadcast.json"
+
+    async def main():
+        tickets = await open_tickets(tmp_path / "support.db", users)
+        sender = FakeSender(delay=0.02)
+        running = broadcaster(tickets, sender, state)
+        other = broadcaster(tickets, FakeSender(), state)
+        await running.start("stop")
+        await asyncio.sleep(0.05)
+        assert not other.running and other.load() is not None
+
+        await other.stop(discard=True)
+        await asyncio.wait_for(wait(running), 1)
+        stopped_at = sum(sender.sent.values())
+        await asyncio.sleep(0.1)
+        # Neither worker resumes it
+        resumed = await broadcaster(tickets, FakeSender(), state).resume()
+        await tickets.db.close()
+        return sender.sent, stopped_at, running.progress, resumed
+
+    sent, stopped_at, progress, resumed = asyncio.run(main())
+    assert not progress.finished
+    assert 0 < sum(sent.values()) == stopped_at < 200
+    assert not state.exists()
+    assert resumed is None
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from app.services.digest import SEPARATOR, FeedbackDigest, pack_texts
+from app.services.files import read_lines, write_lines
+
+
+def text(entry_id, size):
+    return {"id": entry_id, "type": "text", "text": "x" * size}
+
+
+def media(entry_id, kind):
+    return {"id": entry_id, "type": kind, "file_id": f"f{entry_id}", "caption": None}
+
+
+def digest(tmp_path, text_limit=100, album_size=3):
+    return FeedbackDigest(tmp_path / "digest.log", outbox=None, chat_id=-1, text_limit=text_limit, album_size=album_size)
+
+
+def test_pack_texts_fills_messages_in_order():
+    texts = ["a" * 40, "b" * 40, "c" * 40, "d" * 90]
+    packs = pack_texts(texts, limit=100)
+    assert packs == ["a" * 40 + SEPARATOR + "b" * 40, "c" * 40, "d" * 90]
+    assert all(len(pack) <= 100 for pack in packs)
+
+
+def test_pack_texts_keeps_everything():
+    texts = [str(i) * (i % 7 + 1) for i in range(200)]
+    packs = pack_texts(texts, limit=60)
+    assert SEPARATOR.join(packs).split(SEPARATOR) == texts
+
+
+def test_complete_takes_full_messages_only(tmp_path):
+    feedback = digest(tmp_path)
+    # 40 + 40 fill one message, the third starts the next one
+    feedback._remember([text(1, 40), text(2, 40), text(3, 40)])
+    assert [entry["id"] for entry in feedback._complete()] == [1, 2]
+
+
+def test_complete_takes_full_albums_per_kind(tmp_path):
+    feedback = digest(tmp_path)
+    feedback._remember([
+        media(1, "photo"), media(2, "document"), media(3, "video"),
+        media(4, "photo"), media(5, "photo"), media(6, "document"),
+    ])
+    # Photos and videos share albums: 1, 3, 4 fill one; 5 and the documents wait
+    assert [entry["id"] for entry in feedback._complete()] == [1, 3, 4]
+
+
+def test_build_sends_a_lone_item_without_an_album(tmp_path):
+    feedback = digest(tmp_path)
+    methods = feedback.build([text(1, 10), media(2, "photo"), media(3, "audio"), media(4, "audio")])
+    assert [m.__api_method__ for m in methods] == ["sendMessage", "sendPhoto", "sendMediaGroup"]
+
+
+def test_json_lines_round_trip_skips_torn_tail(tmp_path):
+    path = tmp_path / "log"
+    write_lines(path, ['{"id": 1}', '{"id": 2}'])
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"id": 3')
+    assert list(read_lines(path)) == [{"id": 1}, {"id": 2}]
+    assert list(read_lines(tmp_path / "missing")) == []
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+class FakeOutbox:
+    """Records submitted batches; like the outbox, a repeated key sends nothing."""
+
+    def __init__(self):
+        self.batches = {}
+
+    async def submit(self, key, methods, priority=None):
+        if key in self.batches:
+            return []
+        self.batches[key] = [m.__api_method__ for m in methods]
+        return []
+
+
+def test_batch_recorded_before_a_crash_keeps_its_grouping(tmp_path):
+    # Texts 1 and 2 went out as one batch, then the process died before the rewrite
+    records = [text(1, 40), text(2, 40), text(3, 40), {"batch": "digest:1:2:2", "ids": [1, 2]}, text(4, 10)]
+    write_lines(tmp_path / "digest.log", [json.dumps(record) for record in records])
+
+    async def main():
+        outbox = FakeOutbox()
+        outbox.batches["digest:1:2:2"] = ["sendMessage"]
+        feedback = FeedbackDigest(tmp_path / "digest.log", outbox, chat_id=-1, text_limit=100)
+        await feedback.start()
+        left = [entry["id"] for entry in feedback.entries]
+        await feedback.close()
+        return outbox.batches, left
+
+    batches, left = asyncio.run(main())
+    # 1 and 2 aren't regrouped with 3 and 4 into a batch under a new key
+    assert left == [3, 4]
+    assert batches == {"digest:1:2:2": ["sendMessage"], "digest:3:4:2": ["sendMessage"]}
+    assert list(read_lines(tmp_path / "digest.log")) == []
@@ -0,0 +1,57 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from aiogram.types import FSInputFile
+
+from app.services.media import MediaCache
+
+
+class FakeMessage:
+    """answer_photo fails with `error` for cached file_ids; uploads get a new file_id."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.uploads = 0
+
+    async def answer_photo(self, photo, **kwargs):
+        if not isinstance(photo, FSInputFile):
+            if self.error is not None:
+                raise TelegramBadRequest(method=SendPhoto(chat_id=1, photo=photo), message=self.error)
+            return SimpleNamespace(photo=[SimpleNamespace(file_id=photo)])
+        self.uploads += 1
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"uploaded-{self.uploads}")])
+
+
+def cache_with_file_id(tmp_path):
+    (tmp_path / "welcome.png").write_bytes(b"png")
+    cache = MediaCache(tmp_path, tmp_path / "media_cache.json")
+    key = cache._key("welcome.png")
+    cache.cache_file.write_text(json.dumps({key: "cached"}), encoding="utf-8")
+    cache.load()
+    return cache, key
+
+
+def test_file_id_error_uploads_again(tmp_path):
+    cache, key = cache_with_file_id(tmp_path)
+    message = FakeMessage("Bad Request: wrong file identifier/HTTP URL specified")
+
+    sent = asyncio.run(cache.answer_photo(message, "welcome.png"))
+
+    assert message.uploads == 1
+    assert sent.photo[-1].file_id == "uploaded-1"
+    assert json.loads(cache.cache_file.read_text(encoding="utf-8")) == {key: "uploaded-1"}
+
+
+def test_other_bad_requests_keep_the_file_id(tmp_path):
+    cache, key = cache_with_file_id(tmp_path)
+    message = FakeMessage("Bad Request: chat not found")
+
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(cache.answer_photo(message, "welcome.png"))
+
+    assert message.uploads == 0
+    assert cache._file_ids == {key: "cached"}
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from aiogram.methods import SendMessage
+
+from app.services.outbox import Outbox, dump_method
+
+
+class FakeSender:
+    """Sends succeed at once; texts are recorded."""
+
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, method, priority=None):
+        self.sent.append(method.text)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(method.text)
+        return future
+
+
+def methods(*texts):
+    return [SendMessage(chat_id=1, text=text) for text in texts]
+
+
+def add(key, texts, sent=0):
+    return {
+        "op": "add",
+        "key": key,
+        "priority": 0,
+        "meta": {},
+        "sent": sent,
+        "methods": [dump_method(m) for m in methods(*texts)],
+    }
+
+
+def write_log(path, records, tail=""):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + tail, encoding="utf-8")
+
+
+def test_load_replays_progress_and_skips_torn_tail(tmp_path):
+    path = tmp_path / "outbox.log"
+    write_log(path, [
+        add("a", ["a1", "a2", "a3"]),
+        add("b", ["b1"]),
+        {"op": "sent", "key": "a", "sent": 2},
+        {"op": "done", "key": "b"},
+    ], tail='{"op": "add", "key": "c", "pri')
+
+    records, done = Outbox(path, FakeSender())._load()
+
+    assert list(records) == ["a"]
+    assert records["a"]["sent"] == 2
+    assert done == ["b"]
+
+
+def test_load_remembers_last_done_keys(tmp_path):
+    path = tmp_path / "outbox.log"
+    write_log(path, [{"op": "done", "key": str(i)} for i in range(5)] + [{"op": "done", "key": "1"}])
+
+    _, done = Outbox(path, FakeSender(), remember=3)._load()
+
+    # A repeated key counts as the latest
+    assert done == ["3", "4", "1"]
+
+
+def test_replay_resumes_after_sent_methods(tmp_path):
+    path = tmp_path / "outbox.log"
+    write_log(path, [add("a", ["a1", "a2", "a3"]), {"op": "sent", "key": "a", "sent": 1}])
+
+    async def main():
+        sender = FakeSender()
+        outbox = Outbox(path, sender)
+        await outbox.start()
+        await outbox.close()
+        return sender.sent
+
+    assert asyncio.run(main()) == ["a2", "a3"]
+
+
+def test_repeated_key_is_not_sent_again_after_restart(tmp_path):
+    path = tmp_path / "outbox.log"
+
+    async def first():
+        sender = FakeSender()
+        outbox = Outbox(path, sender)
+        await outbox.start()
+        futures = await outbox.submit("k", methods("hello"))
+        await asyncio.gather(*futures)
+        await outbox.close()
+        return sender.sent
+
+    async def second():
+        sender = FakeSender()
+        outbox = Outbox(path, sender)
+        await outbox.start()
+        futures = await outbox.submit("k", methods("hello"))
+        await outbox.close()
+        return futures, sender.sent
+
+    assert asyncio.run(first()) == ["hello"]
+    assert asyncio.run(second()) == ([], [])
@@ -0,0 +1,118 @@
+import asyncio
+import datetime
+
+from aiogram.methods import CopyMessage, CopyMessages, SendMediaGroup, SendMessage
+from aiogram.types import Chat, InlineKeyboardButton, InlineKeyboardMarkup, Message, MessageEntity, PhotoSize
+
+from app.services.relay import copy_plain, copy_with_header, submit_all
+from app.services.sender import Priority
+from app.texts import REQUEST_HEADER, REQUEST_WITH_BODY
+
+
+USER_CHAT = Chat(id=5, type="private")
+SUPPORT_CHAT = -100
+KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Ответить", callback_data="t_reply_1")]])
+HEADER = REQUEST_HEADER.render(intro="Новая заявка", full_name="Анна <A>", user_id=5)
+
+
+class FakeSender:
+    """Sends succeed at once; methods are recorded with their priority."""
+
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, method, priority=None):
+        self.sent.append((method, priority))
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+
+
+def compose(body):
+    return REQUEST_WITH_BODY.render(header=HEADER, body=body) if body else HEADER
+
+
+def message(message_id, **fields):
+    return Message(message_id=message_id, date=datetime.datetime.now(), chat=USER_CHAT, **fields)
+
+
+def photo(message_id, caption=None, media_group_id="g"):
+    size = PhotoSize(file_id=f"file-{message_id}", file_unique_id=f"u{message_id}", width=90, height=90)
+    return message(message_id, photo=[size], caption=caption, media_group_id=media_group_id)
+
+
+def test_text_goes_into_the_header_blockquote():
+    text = message(1, text="<Help> me", entities=[MessageEntity(type="bold", offset=7, length=2)])
+
+    [method] = copy_with_header([text], SUPPORT_CHAT, compose, KEYBOARD)
+
+    assert isinstance(method, SendMessage)
+    assert method.text == (
+        "Новая заявка\nАнна &lt;A&gt; (ID: <code>5</code>):\n\n"
+        "<blockquote expandable>&lt;Help&gt; <b>me</b></blockquote>"
+    )
+    assert method.reply_markup is KEYBOARD
+
+
+def test_long_text_is_copied_under_a_separate_header():
+    text = message(1, text="x" * 4090)
+
+    copy, header = copy_with_header([text], SUPPORT_CHAT, compose, KEYBOARD)
+
+    assert isinstance(copy, CopyMessage)
+    assert (copy.from_chat_id, copy.message_id) == (USER_CHAT.id, 1)
+    assert header.text == HEADER
+    assert header.reply_markup is KEYBOARD
+
+
+def test_caption_goes_into_the_copy():
+    [method] = copy_with_header([photo(1, caption="Скрин", media_group_id=None)], SUPPORT_CHAT, compose, KEYBOARD)
+
+    assert isinstance(method, CopyMessage)
+    assert method.caption == compose("Скрин")
+    assert method.reply_markup is KEYBOARD
+
+
+def test_album_without_keyboard_is_resent_as_one_media_group():
+    [method] = copy_with_header([photo(12), photo(11, caption="Оба экрана")], SUPPORT_CHAT, compose)
+
+    assert isinstance(method, SendMediaGroup)
+    assert [media.media for media in method.media] == ["file-11", "file-12"]
+    assert method.media[0].caption == compose("Оба экрана")
+    assert method.media[1].caption is None
+
+
+def test_album_with_keyboard_is_copied_in_one_call():
+    copy, header = copy_with_header([photo(12), photo(11, caption="Оба экрана")], SUPPORT_CHAT, compose, KEYBOARD)
+
+    assert isinstance(copy, CopyMessages)
+    assert copy.message_ids == [11, 12]
+    # Albums can't carry a keyboard: the parts keep their captions, the keyboard goes on the header
+    assert header.text == HEADER
+    assert header.reply_markup is KEYBOARD
+
+
+def test_copy_plain():
+    [single] = copy_plain([message(1, text="Готово")], 5, KEYBOARD)
+    assert isinstance(single, CopyMessage)
+    assert (single.chat_id, single.message_id, single.reply_markup) == (5, 1, KEYBOARD)
+
+    copy, note = copy_plain([photo(3), photo(2)], 5, KEYBOARD, album_note="Медиа выше")
+    assert isinstance(copy, CopyMessages)
+    assert copy.message_ids == [2, 3]
+    assert (note.text, note.reply_markup) == ("Медиа выше", KEYBOARD)
+
+    # Nothing to put on a note
+    assert len(copy_plain([photo(3), photo(2)], 5)) == 1
+
+
+def test_submit_all_queues_methods_in_order():
+    async def main():
+        sender = FakeSender()
+        methods = copy_with_header([photo(12), photo(11)], SUPPORT_CHAT, compose, KEYBOARD)
+        futures = submit_all(sender, methods, Priority.ADMIN)
+        return methods, sender.sent, await asyncio.gather(*futures)
+
+    methods, sent, results = asyncio.run(main())
+    assert sent == [(methods[0], Priority.ADMIN), (methods[1], Priority.ADMIN)]
+    assert results == [True, True]
@@ -0,0 +1,138 @@
+import asyncio
+import datetime
+from typing import Optional
+
+from aiogram.types import Chat, Message, Update, User
+
+from app.middlewares.album import AlbumMiddleware
+from app.middlewares.scheduler import UpdateScheduler
+
+
+def update(update_id: int, user_id: int, media_group_id: Optional[str] = None):
+    chat = Chat(id=user_id, type="private")
+    user = User(id=user_id, is_bot=False, first_name="U")
+    message = Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=chat,
+        from_user=user,
+        text="x",
+        media_group_id=media_group_id,
+    )
+    return Update(update_id=update_id, message=message), {"event_chat": chat, "event_from_user": user}
+
+
+def test_one_chat_in_order_chats_concurrently():
+    async def main():
+        scheduler = UpdateScheduler(concurrency=8)
+        log = []
+
+        async def handler(event, data):
+            log.append(("start", event.update_id))
+            # Earlier updates take longer: out of order if a chat ran them concurrently
+            await asyncio.sleep(0.1 if event.update_id % 10 == 1 else 0.02)
+            log.append(("end", event.update_id))
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for user_id in (1, 2):
+            for n in (1, 2, 3):
+                await scheduler(handler, *update(user_id * 10 + n, user_id))
+        await scheduler.close()
+        return log, loop.time() - started
+
+    log, elapsed = asyncio.run(main())
+    for user_id in (1, 2):
+        ids = [user_id * 10 + n for n in (1, 2, 3)]
+        events = [(kind, i) for kind, i in log if i in ids]
+        assert events == [(kind, i) for i in ids for kind in ("start", "end")]
+    # Two chats of 0.14s each ran side by side
+    assert elapsed < 0.25
+
+
+def test_album_parts_reach_the_first_part():
+    async def main():
+        scheduler = UpdateScheduler()
+        parts = []
+        all_parts = asyncio.Event()
+
+        async def handler(event, data):
+            parts.append(event.update_id)
+            if len(parts) == 3:
+                all_parts.set()
+            if event.update_id == 1:
+                # Like AlbumMiddleware: the first part waits for the others
+                await asyncio.wait_for(all_parts.wait(), 1)
+
+        for n in (1, 2, 3):
+            await scheduler(handler, *update(n, 5, media_group_id="g"))
+        await scheduler.close()
+        return parts
+
+    assert sorted(asyncio.run(main())) == [1, 2, 3]
+
+
+def test_album_parts_queue_behind_earlier_updates():
+    async def main():
+        scheduler = UpdateScheduler()
+        log = []
+
+        async def handler(event, data):
+            log.append(event.update_id)
+            await asyncio.sleep(0.02)
+
+        await scheduler(handler, *update(1, 5))
+        await scheduler(handler, *update(2, 5, media_group_id="g"))
+        await scheduler(handler, *update(3, 5, media_group_id="g"))
+        await scheduler.close()
+        return log
+
+    assert asyncio.run(main()) == [1, 2, 3]
+
+
+def test_waits_for_room_at_max_pending():
+    async def main():
+        scheduler = UpdateScheduler(max_pending=2)
+        release = asyncio.Event()
+
+        async def handler(event, data):
+            await release.wait()
+
+        await scheduler(handler, *update(1, 1))
+        await scheduler(handler, *update(2, 2))
+        third = asyncio.ensure_future(scheduler(handler, *update(3, 3)))
+        await asyncio.sleep(0.02)
+        blocked = not third.done()
+        release.set()
+        await asyncio.wait_for(third, 1)
+        await scheduler.close()
+        return blocked
+
+    assert asyncio.run(main())
+
+
+def test_late_album_part_keeps_its_place_in_the_queue():
+    async def main():
+        album = AlbumMiddleware(quiet=0.05)
+        scheduler = UpdateScheduler(collected=album.collected)
+        log = []
+
+        async def handle(message, data):
+            log.append([part.message_id for part in data.get("album", [message])])
+            await asyncio.sleep(0.1)
+
+        async def handler(event, data):
+            await album(handle, event.message, data)
+
+        await scheduler(handler, *update(1, 5, media_group_id="g"))
+        await asyncio.sleep(0.02)
+        # Still being collected: joins the album
+        await scheduler(handler, *update(2, 5, media_group_id="g"))
+        await asyncio.sleep(0.1)
+        # The album is being handled: the text goes after it, the late part after the text
+        await scheduler(handler, *update(3, 5))
+        await scheduler(handler, *update(4, 5, media_group_id="g"))
+        await scheduler.close()
+        return log
+
+    assert asyncio.run(main()) == [[1, 2], [3], [4]]
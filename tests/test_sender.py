@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.methods import SendMessage
+
+from app.services.sender import Priority, Sender, TokenBucket
+
+
+class FakeBot:
+    """Records sent texts; every call takes `delay` seconds."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def __call__(self, method):
+        self.sent.append((method.chat_id, method.text))
+        await asyncio.sleep(self.delay)
+        return method.text
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def send(sender: Sender, chat_id: int, text: str, priority: Priority = Priority.USER) -> asyncio.Future:
+    return sender.submit(SendMessage(chat_id=chat_id, text=text), priority)
+
+
+def test_bucket_delay_and_consume():
+    bucket = TokenBucket(rate=2.0, capacity=2.0)
+    now = bucket.updated
+    assert bucket.delay(1, now) == 0
+    bucket.consume(2, now)
+    assert bucket.delay(1, now) == pytest.approx(0.5)
+    assert bucket.delay(1, now + 0.5) == 0
+
+
+def test_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=3.0)
+    now = bucket.updated
+    bucket.consume(3, now)
+    assert not bucket.full(now + 1)
+    assert bucket.full(now + 100)
+    assert bucket.tokens == 3.0
+
+
+def test_bucket_pause():
+    bucket = TokenBucket(rate=100.0, capacity=100.0)
+    bucket.pause(5)
+    now = time.monotonic()
+    assert bucket.delay(1, now) > 4
+    assert not bucket.full(now)
+
+
+def test_no_busy_loop_at_concurrency_cap():
+    async def main():
+        sender = Sender(FakeBot(delay=0.3), global_rate=1000, chat_rate=1000, concurrency=2)
+        picks = 0
+        pick = sender._pick
+
+        def counting_pick():
+            nonlocal picks
+            picks += 1
+            return pick()
+
+        sender._pick = counting_pick
+        await sender.start()
+        await asyncio.gather(*(send(sender, chat_id, "x") for chat_id in range(4)))
+        await sender.close()
+        return picks
+
+    # A handful of picks per send, not one per loop iteration while waiting
+    assert run(main()) < 20
+
+
+def test_chat_order_and_priority():
+    async def main():
+        bot = FakeBot()
+        sender = Sender(bot, global_rate=1000, chat_rate=1000)
+        futures = [
+            send(sender, 1, "user 1"),
+            send(sender, 1, "bulk 1", Priority.BULK),
+            send(sender, 1, "user 2"),
+            send(sender, 1, "admin", Priority.ADMIN),
+            send(sender, 1, "bulk 2", Priority.BULK),
+        ]
+        await sender.start()
+        await asyncio.gather(*futures)
+        await sender.close()
+        return [text for _, text in bot.sent]
+
+    assert run(main()) == ["user 1", "user 2", "admin", "bulk 1", "bulk 2"]
+
+
+def test_throttled_chat_does_not_block_others():
+    async def main():
+        bot = FakeBot()
+        sender = Sender(bot, global_rate=1000, chat_rate=1000, group_rate=1 / 60)
+        await sender.start()
+        # The group bucket holds one message; the rest wait a minute each
+        for i in range(3):
+            send(sender, -100, f"group {i}")
+        await asyncio.wait_for(asyncio.gather(*(send(sender, 7, f"user {i}") for i in range(3))), 1)
+        sent = [text for _, text in bot.sent]
+        assert sender.pending == 2
+        await sender.close(timeout=0)
+        return sent
+
+    sent = run(main())
+    assert sent.count("group 0") == 1
+    assert "group 1" not in sent
+    assert [text for text in sent if text.startswith("user")] == ["user 0", "user 1", "user 2"]
+
+
+def test_sweep_drops_refilled_buckets_only():
+    async def main():
+        shared = TokenBucket(1.0, 1.0)
+        sender = Sender(FakeBot(), global_rate=1000, chat_rate=1000, buckets={"5": shared})
+        await sender.start()
+        await asyncio.gather(send(sender, 5, "a"), send(sender, 6, "b"))
+        await sender.close()
+        now = time.monotonic()
+        sender.bucket("7").pause(60)
+        sender._sweep(now + 1)
+        # "6" has refilled, "7" is paused, "5" is shared
+        return set(sender._buckets)
+
+    assert run(main()) == {"5", "7"}
+
+
+def test_retry_after_keeps_chat_order():
+    from aiogram.exceptions import TelegramRetryAfter
+
+    class FlakyBot(FakeBot):
+        failed = False
+
+        async def __call__(self, method):
+            if method.text == "first" and not self.failed:
+                self.failed = True
+                raise TelegramRetryAfter(method=method, message="flood", retry_after=0.05)
+            return await super().__call__(method)
+
+    async def main():
+        bot = FlakyBot()
+        sender = Sender(bot, global_rate=1000, chat_rate=1000)
+        await sender.start()
+        await asyncio.gather(send(sender, 1, "first"), send(sender, 1, "second"))
+        await sender.close()
+        return [text for _, text in bot.sent]
+
+    assert run(main()) == ["first", "second"]
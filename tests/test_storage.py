@@ -0,0 +1,78 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.services.database import Database
+from app.services.storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=5, user_id=5)
+WAITING = "RequestStates:waiting_for_response"
+
+
+async def open_storages(path):
+    """Two storages on one database, like two worker processes."""
+    storages = []
+    for _ in range(2):
+        db = Database(path)
+        await db.connect()
+        storage = SQLiteStorage(db, flush_interval=3600)
+        await storage.setup()
+        storages.append(storage)
+    return storages
+
+
+async def close_storages(storages):
+    for storage in storages:
+        await storage.close()
+        await storage.db.close()
+
+
+def test_clear_in_another_process_resets_cached_state(tmp_path):
+    async def main():
+        user, closer = await open_storages(tmp_path / "fsm.db")
+        await user.set_state(KEY, WAITING)
+        await user.flush()
+
+        # The ticket is closed on another worker
+        await closer.set_state(KEY, None)
+        await closer.set_data(KEY, {})
+        await closer.flush()
+
+        cached = await user.get_state(KEY)
+        await user.sync()
+        synced = await user.get_state(KEY)
+        await close_storages([user, closer])
+        return cached, synced
+
+    assert asyncio.run(main()) == (WAITING, None)
+
+
+def test_later_local_change_wins_over_older_remote_write(tmp_path):
+    async def main():
+        first, second = await open_storages(tmp_path / "fsm.db")
+        await second.set_state(KEY, "old")
+        await second.flush()
+        await asyncio.sleep(0.01)
+        await first.set_state(KEY, "new")
+
+        await first.sync()
+        await first.flush()
+        await second.sync()
+        states = await first.get_state(KEY), await second.get_state(KEY)
+        await close_storages([first, second])
+        return states
+
+    assert asyncio.run(main()) == ("new", "new")
+
+
+def test_own_writes_keep_the_cache(tmp_path):
+    async def main():
+        storage, _ = storages = await open_storages(tmp_path / "fsm.db")
+        await storage.set_state(KEY, WAITING)
+        await storage.flush()
+        await storage.sync()
+        cached = storage.key_builder.build(KEY) in storage._cache
+        await close_storages(storages)
+        return cached
+
+    assert asyncio.run(main())
@@ -0,0 +1,74 @@
+import asyncio
+import datetime
+
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import Chat, Message, User
+
+from app.middlewares.throttling import ThrottlingMiddleware
+
+
+USER = User(id=5, is_bot=False, first_name="Анна")
+
+
+def message(text, chat_type="private"):
+    return Message(
+        message_id=1,
+        date=datetime.datetime.now(),
+        chat=Chat(id=USER.id if chat_type == "private" else -100, type=chat_type),
+        from_user=USER,
+        text=text,
+    )
+
+
+def feed(middleware, texts, priority=None, chat_type="private"):
+    """Texts that got through to a handler flagged `throttle=priority`."""
+    passed = []
+
+    async def handler(event, data):
+        passed.append(event.text)
+
+    flags = {"throttle": priority} if priority else {}
+    data = {"handler": HandlerObject(callback=handler, flags=flags)}
+
+    async def main():
+        for text in texts:
+            await middleware(handler, message(text, chat_type), data)
+
+    asyncio.run(main())
+    return passed
+
+
+def test_repeats_are_dropped_but_commands_are_not():
+    middleware = ThrottlingMiddleware()
+    passed = feed(middleware, ["Помогите", "Помогите", "/start", "/start", "Помогите", "Спасибо"])
+    # A repeat is the same as the message just before it
+    assert passed == ["Помогите", "/start", "/start", "Помогите", "Спасибо"]
+
+
+def test_requests_may_repeat_the_last_message():
+    middleware = ThrottlingMiddleware()
+    assert feed(middleware, ["Помогите"], priority="low") == ["Помогите"]
+    assert feed(middleware, ["Помогите"], priority="high") == ["Помогите"]
+
+
+def test_flood_limit():
+    middleware = ThrottlingMiddleware(limit=3)
+    assert feed(middleware, [str(i) for i in range(5)]) == ["0", "1", "2"]
+
+
+def test_low_priority_runs_once_per_window():
+    middleware = ThrottlingMiddleware()
+    assert feed(middleware, ["1", "2", "3"], priority="low") == ["1"]
+    assert feed(middleware, ["4"]) == ["4"]
+
+
+def test_low_priority_is_shed_under_load():
+    middleware = ThrottlingMiddleware(shed_depth=10, load=lambda: 11)
+    assert feed(middleware, ["1"], priority="low") == []
+    assert feed(middleware, ["2"], priority="high") == ["2"]
+
+
+def test_group_chats_are_not_throttled():
+    middleware = ThrottlingMiddleware(limit=1)
+    assert feed(middleware, ["1", "1", "2"], chat_type="supergroup") == ["1", "1", "2"]
+    assert not middleware.users
@@ -0,0 +1,67 @@
+import math
+import random
+
+from app.services.timers import TimingWheel
+
+
+def test_fires_at_deadline_not_before():
+    wheel = TimingWheel(now=0, tick=1.0)
+    assert wheel.schedule("a", 10.0) == []
+    assert wheel.advance(9.5) == []
+    assert wheel.advance(10.0) == ["a"]
+    assert "a" not in wheel
+
+
+def test_past_deadline_expires_at_once():
+    wheel = TimingWheel(now=100, tick=1.0)
+    assert wheel.schedule("a", 50.0) == ["a"]
+    assert len(wheel) == 0
+
+
+def test_cancel_and_reschedule():
+    wheel = TimingWheel(now=0, tick=1.0)
+    wheel.schedule("a", 5.0)
+    wheel.schedule("b", 5.0)
+    assert wheel.cancel("a")
+    assert not wheel.cancel("a")
+    # Re-arming moves the timer, it doesn't add a second one
+    wheel.schedule("b", 20.0)
+    assert wheel.advance(10.0) == []
+    assert wheel.advance(20.0) == ["b"]
+
+
+def test_cascades_through_levels_and_beyond_the_top():
+    # Levels span 4, 16 and 64 ticks; 500 parks in the top level until it comes round
+    wheel = TimingWheel(now=0, tick=1.0, slots=4, levels=3)
+    for deadline in (3, 17, 63, 64, 65, 500):
+        wheel.schedule(deadline, float(deadline))
+    fired = {}
+    for now in range(1, 501):
+        for key in wheel.advance(float(now)):
+            fired[key] = now
+    assert fired == {3: 3, 17: 17, 63: 63, 64: 64, 65: 65, 500: 500}
+
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    tick = 0.5
+    wheel = TimingWheel(now=0, tick=tick, slots=8, levels=3)
+    deadlines = {}
+    now = 0.0
+    for _ in range(300):
+        now += rng.uniform(0, 3)
+        # Arm, re-arm and cancel timers between turns
+        for _ in range(3):
+            key = rng.randrange(50)
+            if rng.random() < 0.2:
+                wheel.cancel(key)
+                deadlines.pop(key, None)
+            else:
+                deadline = now + rng.uniform(0, 400)
+                assert wheel.schedule(key, deadline) == []
+                deadlines[key] = deadline
+        expected = {k for k, d in deadlines.items() if math.ceil(d / tick) <= int(now // tick)}
+        assert set(wheel.advance(now)) == expected
+        for key in expected:
+            del deadlines[key]
+        assert len(wheel) == len(deadlines)
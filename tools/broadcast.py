@@ -0,0 +1,89 @@
+"""Send a message to every user with an open ticket.
+
+Usage:
+    python -m tools.broadcast (TEXT | --file PATH | --resume) [--db PATH] [--state PATH] [--workers N] [--rate R]
+
+The text is HTML. Progress is checkpointed to the state file, the same one
+the bot uses: after an interruption run again with --resume, or let the bot
+pick it up on start. The bot sends within the same Telegram limit, so lower
+--rate while it is busy.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from app.main import create_bot
+from app.settings import DATA_DIR, SEND_CHAT_RATE, SEND_GLOBAL_RATE
+from app.services import Broadcaster, Database, Progress, Sender, TicketStore
+from app.services.broadcast import load_progress
+
+
+async def report(progress: Progress) -> None:
+    elapsed = max(time.time() - progress.started_at, 1e-9)
+    print(
+        f"\r{progress.processed}/{progress.total} "
+        f"sent {progress.sent}, blocked {progress.blocked}, failed {progress.failed} "
+        f"({progress.processed / elapsed:.1f}/s)",
+        end="", file=sys.stderr, flush=True,
+    )
+
+
+async def run(args: argparse.Namespace, progress: Progress) -> None:
+    db = Database(args.db)
+    await db.connect()
+    tickets = TicketStore(db)
+    await tickets.setup()
+    bot = create_bot()
+    sender = Sender(bot, global_rate=args.rate, chat_rate=SEND_CHAT_RATE, concurrency=args.workers)
+    await sender.start()
+    broadcaster = Broadcaster(tickets, sender, args.state, workers=args.workers, retries=args.retries)
+    try:
+        if not progress.total:
+            progress.total = await tickets.count_open_users()
+        await broadcaster.run(progress, report)
+        print(file=sys.stderr)
+    finally:
+        await sender.close()
+        await bot.session.close()
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message every user with an open ticket")
+    parser.add_argument("text", nargs="?", help="HTML text of the message")
+    parser.add_argument("--file", type=Path, help="Read the text from a file")
+    parser.add_argument("--resume", action="store_true", help="Continue the unfinished broadcast")
+    parser.add_argument("--db", type=Path, default=DATA_DIR / "support.db")
+    parser.add_argument("--state", type=Path, default=DATA_DIR / "broadcast.json")
+    parser.add_argument("--workers", type=int, default=16, help="Sends in flight")
+    parser.add_argument("--rate", type=float, default=SEND_GLOBAL_RATE, help="Messages per second")
+    parser.add_argument("--retries", type=int, default=3, help="Attempts per recipient after network errors")
+    args = parser.parse_args()
+    if not args.db.exists():
+        parser.error(f"No database at {args.db}")
+
+    pending = load_progress(args.state)
+    if args.resume:
+        if pending is None:
+            parser.error(f"No unfinished broadcast in {args.state}")
+        progress = pending
+    else:
+        if pending is not None:
+            parser.error(f"Unfinished broadcast in {args.state}: --resume it or delete the file")
+        if args.file is not None:
+            text = args.file.read_text(encoding="utf-8").strip()
+        elif args.text:
+            text = args.text
+        else:
+            parser.error("Give the text or --file")
+        progress = Progress(text=text, total=0)
+    try:
+        asyncio.run(run(args, progress))
+    except KeyboardInterrupt:
+        print("\nStopped, continue with --resume", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
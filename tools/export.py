@@ -0,0 +1,42 @@
+"""Export tickets or feedback from the bot database to JSONL or CSV.
+
+Usage:
+    python -m tools.export tickets|feedback [--format jsonl|csv] [--db PATH] [--out DIR] [--chunk-size BYTES]
+
+Safe to run next to the bot: the database is in WAL mode. Prints the written files.
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from app.services.database import Database
+from app.services.export import FORMATS, QUERIES, Exporter
+from app.settings import DATA_DIR
+
+
+async def run(kind: str, fmt: str, db_path: Path, out: Path, chunk_size: int) -> None:
+    db = Database(db_path)
+    await db.connect()
+    try:
+        out.mkdir(parents=True, exist_ok=True)
+        for part in await Exporter(db, chunk_size=chunk_size).export(kind, fmt, out):
+            print(part)
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export tickets or feedback")
+    parser.add_argument("kind", choices=sorted(QUERIES))
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--db", type=Path, default=DATA_DIR / "support.db")
+    parser.add_argument("--out", type=Path, default=Path("."))
+    parser.add_argument("--chunk-size", type=int, default=0, help="Split into parts of at most this many bytes")
+    args = parser.parse_args()
+    if not args.db.exists():
+        parser.error(f"No database at {args.db}")
+    asyncio.run(run(args.kind, args.format, args.db, args.out, args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Local harness for webhook mode: POSTs update JSON to a running bot.
+
+Usage:
+    python tools/webhook_harness.py [update.json ...] [--url URL] [--secret SECRET] [--count N]
+
+Without files a synthetic /start update is sent.
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from aiohttp import ClientSession
+
+
+def sample_update(update_id: int) -> Dict[str, Any]:
+    """Build a /start message update from a fake private chat."""
+    user = {"id": 100000 + update_id, "is_bot": False, "first_name": "Test", "username": f"test{update_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private", "first_name": "Test"},
+            "from": user,
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def post_updates(url: str, secret: str, updates: List[Dict[str, Any]]):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    timings = []
+    async with ClientSession() as session:
+        for update in updates:
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                body = await response.text()
+            timings.append(time.perf_counter() - started)
+            print(f"update {update['update_id']}: {response.status} {body[:80]}")
+
+    timings.sort()
+    print(
+        f"sent {len(timings)} updates, "
+        f"p50 {timings[len(timings) // 2] * 1000:.2f} ms, "
+        f"max {timings[-1] * 1000:.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path, help="JSON files with one update or a list of updates")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--count", type=int, default=1, help="number of synthetic updates without files")
+    args = parser.parse_args()
+
+    updates = []
+    for path in args.files:
+        loaded = json.loads(path.read_text(encoding="utf-8"))
+        updates.extend(loaded if isinstance(loaded, list) else [loaded])
+    if not updates:
+        updates = [sample_update(i) for i in range(1, args.count + 1)]
+
+    asyncio.run(post_updates(args.url, args.secret, updates))
+
+
+if __name__ == "__main__":
+    main()